@@ -1,23 +1,53 @@
 import logging
-from typing import Dict, List
+import secrets
+from typing import Any, Dict, List
 
 import graphene
-import sqlalchemy
-from fastapi import BackgroundTasks, FastAPI, Query, Response
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+)
 from fastapi.middleware.cors import CORSMiddleware
 from graphql.execution.executors.asyncio import AsyncioExecutor
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_ipaddr
 from starlette.requests import Request
+from starlette.responses import StreamingResponse
 
-from db import database, metadata
+from db import database
 from engines.controller import BEST, ENGINE_NAME_MAP
 from gql_query import GQLQuery, RateLimGQLApp
-from models.request import TranslationRequest
-from models.response import TranslationResponse
-from settings import DatabaseSettings, FeaturesSettings, Settings
-from translate import controller, do_translation
+from models.request import BatchTranslationRequest, TranslationRequest
+from models.response import BatchTranslationResponse, TranslationResponse
+from redis_cache import REDIS_ERRORS
+from settings import FeaturesSettings, PersistenceBackendEnum, Settings
+from translate import (
+    circuit_breaker_state,
+    coalescer,
+    controller,
+    do_batch_translation,
+    do_translation,
+    hedger,
+    hot_translations,
+    redis_cache,
+    single_flight,
+    store,
+    translation_cache,
+    usage,
+    warm_up_cache,
+    writer,
+)
+from translation_memory import (
+    TranslationMemoryFormat,
+    export_translation_memory,
+    import_translation_memory,
+)
 
 
 _logger = logging.getLogger(__name__)
@@ -74,11 +104,32 @@ async def startup():
     _logger.setLevel(level=log_level)
     # database
     if features.enable_persistence:
-        await database.connect()
-        engine = sqlalchemy.create_engine(DatabaseSettings().postgres_dsn)
-        metadata.create_all(engine)
+        await store.connect()
+        await writer.start()
+        await usage.start()
+        if translation_cache.enabled and features.translation_cache_warm_up_entries:
+            try:
+                loaded = await warm_up_cache(features.translation_cache_warm_up_entries)
+                _logger.info("preloaded %s translations into the cache", loaded)
+            except Exception:
+                # a cold cache only costs lookups, not worth failing startup over
+                _logger.warning("could not preload the cache", exc_info=True)
+    # shared cache
+    if features.enable_redis_cache and features.redis_dsn:
+        try:
+            await redis_cache.connect()
+        except REDIS_ERRORS:
+            # translations are still served from the other tiers, just without the shared cache
+            _logger.warning("could not connect to the redis cache", exc_info=True)
     # controller
-    controller.get_available_engines()
+    await controller.get_available_engines()
+    await controller.startup()
+    if features.redis_dsn and controller.breakers.enabled:
+        try:
+            await circuit_breaker_state.connect()
+        except REDIS_ERRORS:
+            # breakers still work on their own, just without being shared
+            _logger.warning("could not share circuit breakers", exc_info=True)
     _logger.info(
         f"starting up with features:\nrate limits - {features.rate_limits}\n"
         f"persistence - {features.enable_persistence}\ngql - {features.enable_gql}"
@@ -87,8 +138,13 @@ async def startup():
 
 @app.on_event("shutdown")
 async def shutdown():
+    await circuit_breaker_state.disconnect()
+    await controller.shutdown()
+    await redis_cache.disconnect()
     if features.enable_persistence:
-        await database.disconnect()
+        await writer.stop()
+        await usage.stop()
+        await store.disconnect()
 
 
 @app.post("/translate", response_model=TranslationResponse)
@@ -148,7 +204,7 @@ async def translate(
         "engine does not succeed",
     ),
 ) -> TranslationResponse:
-    return await do_translation(
+    result = await do_translation(
         background_tasks,
         response,
         source_text=source_text,
@@ -158,6 +214,35 @@ async def translate(
         with_alignment=with_alignment,
         fallback=fallback,
     )
+    if features.translation_cache_store_serialized:
+        return Response(
+            content=translation_cache.serialized(result),
+            media_type="application/json",
+            headers={"X-Translation-Source": response.headers["X-Translation-Source"]},
+        )
+    return result
+
+
+@app.post("/translate/batch", response_model=BatchTranslationResponse)
+@limiter.limit(limit_value=features.rate_limits or "")
+async def translate_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    batch_request: BatchTranslationRequest,
+) -> BatchTranslationResponse:
+    return BatchTranslationResponse(
+        translations=await do_batch_translation(
+            background_tasks,
+            response,
+            source_texts=batch_request.source_texts,
+            to_language=batch_request.to_language,
+            from_language=batch_request.from_language,
+            preferred_engine=batch_request.preferred_engine,
+            with_alignment=batch_request.with_alignment,
+            fallback=batch_request.fallback,
+        )
+    )
 
 
 if features.enable_gql:
@@ -182,3 +267,107 @@ async def get_supported_languages():
 @app.get("/available-engines", response_model=List[str])
 async def get_supported_engines():
     return list(controller.available_engines.keys())
+
+
+@app.get("/stats", response_model=Dict[str, Any])
+async def get_stats():
+    return {
+        "engines": controller.stats(),
+        "degraded_engines": controller.degraded_engines,
+        "coalescer": coalescer.stats(),
+        "hedging": hedger.stats(),
+        "single_flight": single_flight.stats(),
+        "translation_cache": translation_cache.stats(),
+        "redis_cache": redis_cache.stats(),
+        "circuit_breaker_sharing": circuit_breaker_state.stats(),
+        "persistence": writer.stats(),
+        "usage": usage.stats(),
+        **store.stats(),
+    }
+
+
+@app.get("/admin/routing", response_model=Dict[str, Any])
+async def get_routing():
+    """
+    The call statistics best routing is based on, the recent decisions which demoted an engine and the circuit
+    breakers which aren't closed
+    """
+    return controller.routing_stats()
+
+
+def require_admin_token(authorization: str = Header(None)) -> None:
+    """Admin routes exposing stored translations are only served, to requests bearing it, while ADMIN_TOKEN is set"""
+    if features.admin_token is None:
+        raise HTTPException(status_code=404, detail="admin routes are disabled")
+    if authorization is None or not secrets.compare_digest(
+        authorization.encode(), f"Bearer {features.admin_token}".encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@app.get(
+    "/admin/hot-translations",
+    response_model=List[Dict[str, Any]],
+    dependencies=[Depends(require_admin_token)],
+)
+async def get_hot_translations(
+    limit: int = Query(20, gt=0, le=1000, description="How many to list"),
+):
+    """The most used stored translations, most used first"""
+    if not features.enable_persistence:
+        return []
+    return await hot_translations(limit)
+
+
+TRANSLATION_MEMORY_MEDIA_TYPES = {
+    TranslationMemoryFormat.jsonl: "application/x-ndjson",
+    TranslationMemoryFormat.tmx: "application/x-tmx+xml",
+}
+
+
+def _check_translation_memory_available() -> None:
+    if (
+        not features.enable_persistence
+        or features.persistence_backend != PersistenceBackendEnum.POSTGRES
+    ):
+        raise HTTPException(
+            status_code=404, detail="translation memory needs postgres persistence"
+        )
+
+
+@app.get(
+    "/admin/translation-memory", dependencies=[Depends(require_admin_token)],
+)
+async def get_translation_memory(
+    format: TranslationMemoryFormat = Query(TranslationMemoryFormat.jsonl),
+    to_language: str = Query(
+        None, max_length=2, description="Only export translations into this language"
+    ),
+):
+    """Stream out the stored translations"""
+    _check_translation_memory_available()
+    return StreamingResponse(
+        export_translation_memory(database, format, to_language=to_language),
+        media_type=TRANSLATION_MEMORY_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="translations.{format.value}"'
+        },
+    )
+
+
+@app.post(
+    "/admin/translation-memory",
+    response_model=Dict[str, int],
+    dependencies=[Depends(require_admin_token)],
+)
+async def post_translation_memory(
+    request: Request,
+    format: TranslationMemoryFormat = Query(TranslationMemoryFormat.jsonl),
+):
+    """Import translations streamed in the request body, skipping those already stored"""
+    _check_translation_memory_available()
+    return await import_translation_memory(database, format, request.stream())
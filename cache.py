@@ -0,0 +1,209 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from models.response import TranslationResponse
+
+
+CacheKey = Tuple[str, str, Optional[str], bool, str, str]
+
+
+def cache_key(
+    source_text: str,
+    to_language: str,
+    from_language: Optional[str],
+    with_alignment: bool,
+    engine_name: str,
+    engine_version: str,
+) -> CacheKey:
+    """Keyed the same way as the database lookup for a previous translation"""
+    return (
+        source_text,
+        to_language,
+        from_language,
+        bool(with_alignment),
+        engine_name,
+        engine_version,
+    )
+
+
+class FrequencySketch:
+    """
+    A count-min sketch of how often keys have been requested recently. Counters are halved once enough requests have
+    been recorded so that the estimates favour recent popularity
+    """
+
+    # odd multipliers, one per row, the top bits of the product of each with the key's hash being the row's index - so
+    # the rows index independently (the low bits of a hash of the hash depend on too few of its bits)
+    SEEDS = (
+        0x9E3779B97F4A7C15,
+        0xC2B2AE3D27D4EB4F,
+        0x165667B19E3779F9,
+        0xD6E8FEB86659FD93,
+    )
+    DEPTH = len(SEEDS)
+
+    def __init__(self, width: int):
+        self.width = max(16, 1 << (width - 1).bit_length())
+        self._shift = 64 - self.width.bit_length() + 1
+        self._rows: List[List[int]] = [[0] * self.width for _ in range(self.DEPTH)]
+        self._additions = 0
+        self._sample_size = 10 * self.width
+
+    def _indexes(self, key: Hashable):
+        key_hash = hash(key) & 0xFFFFFFFFFFFFFFFF
+        for row, seed in enumerate(self.SEEDS):
+            yield row, ((key_hash * seed) & 0xFFFFFFFFFFFFFFFF) >> self._shift
+
+    def add(self, key: Hashable) -> None:
+        for row, index in self._indexes(key):
+            self._rows[row][index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._rows = [[count >> 1 for count in row] for row in self._rows]
+            self._additions //= 2
+
+    def estimate(self, key: Hashable) -> int:
+        return min(self._rows[row][index] for row, index in self._indexes(key))
+
+
+class _Entry:
+    __slots__ = ("response", "body", "size", "expires_at")
+
+    def __init__(
+        self,
+        response: TranslationResponse,
+        body: Optional[bytes],
+        size: int,
+        expires_at: Optional[float],
+    ):
+        self.response = response
+        self.body = body
+        self.size = size
+        self.expires_at = expires_at
+
+
+class TranslationCache:
+    """
+    A bounded, in-process cache of translation results sitting in front of the database.
+
+    Entries are evicted least recently used first, once either max_entries or max_bytes would be exceeded, and expire
+    after ttl_seconds. When the cache is full a new key is only admitted if it has been requested more often recently
+    than the entry it would evict, so a burst of one-off texts can't flush out the hot ones.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        store_serialized: bool = False,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.store_serialized = store_serialized
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._entries_by_response: Dict[int, _Entry] = {}
+        self._bytes = 0
+        self._sketch = FrequencySketch(width=4 * max(max_entries, 1))
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "rejections": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _is_expired(self, entry: _Entry) -> bool:
+        return entry.expires_at is not None and entry.expires_at <= time.monotonic()
+
+    def get(self, key: CacheKey) -> Optional[TranslationResponse]:
+        """The cached result for key, counting key as requested (for the hit rate and admission)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.record_miss(key)
+            return None
+        if self._is_expired(entry):
+            self._stats["expirations"] += 1
+            self._remove(key)
+            self.record_miss(key)
+            return None
+        self._sketch.add(key)
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return entry.response
+
+    def peek(self, key: CacheKey) -> Optional[TranslationResponse]:
+        """
+        The cached result for key without counting it as requested, for looking through keys only one of which will be
+        served - which is then counted by get if it is cached, or record_miss if it isn't
+        """
+        entry = self._entries.get(key)
+        if entry is None or self._is_expired(entry):
+            return None
+        return entry.response
+
+    def record_miss(self, key: CacheKey) -> None:
+        """Count a request for key served from somewhere other than the cache"""
+        if not self.enabled:
+            return
+        self._sketch.add(key)
+        self._stats["misses"] += 1
+
+    def set(self, key: CacheKey, response: TranslationResponse) -> None:
+        if self.max_entries <= 0:
+            return
+        body = response.json().encode()
+        if self.max_bytes is not None and len(body) > self.max_bytes:
+            self._stats["rejections"] += 1
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        while self._entries and self._is_full(len(body)):
+            victim_key = next(iter(self._entries))
+            if self._sketch.estimate(key) < self._sketch.estimate(victim_key):
+                self._stats["rejections"] += 1
+                return
+            self._remove(victim_key)
+            self._stats["evictions"] += 1
+
+        entry = _Entry(
+            response=response,
+            body=body if self.store_serialized else None,
+            size=len(body),
+            expires_at=None
+            if self.ttl_seconds is None
+            else time.monotonic() + self.ttl_seconds,
+        )
+        self._entries[key] = entry
+        self._entries_by_response[id(response)] = entry
+        self._bytes += entry.size
+
+    def serialized(self, response: TranslationResponse) -> bytes:
+        """The JSON body for a response, reusing the stored serialization if the response came from the cache"""
+        entry = self._entries_by_response.get(id(response))
+        if entry is not None and entry.response is response and entry.body is not None:
+            return entry.body
+        return response.json().encode()
+
+    def _is_full(self, incoming_size: int) -> bool:
+        if len(self._entries) >= self.max_entries:
+            return True
+        return (
+            self.max_bytes is not None and self._bytes + incoming_size > self.max_bytes
+        )
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        if self._entries_by_response.get(id(entry.response)) is entry:
+            del self._entries_by_response[id(entry.response)]
+        self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "entries": len(self._entries), "bytes": self._bytes}
@@ -69,4 +69,34 @@ Cors
 {{- define "multi-translate.corsOrigins" -}}
 {{ $lastIndex := sub (len .Values.config.cors.origins) 1 }}
 {{- if .Values.config.cors.origins }}[{{- range $index, $origin := .Values.config.cors.origins }}"{{ $origin }}"{{- if ne $index $lastIndex }},{{- end}}{{- end }}]{{- else -}}[]{{- end }}
-{{- end }}
\ No newline at end of file
+{{- end }}
+{{/*
+Database connection env vars, shared by the app and the migration container
+*/}}
+{{- define "multi-translate.databaseEnv" -}}
+{{- if .Values.postgresql.enabled }}
+- name: DATABASE_HOST
+  value: "{{ include "postgresql.fullname" . }}-postgresql-headless"
+- name: DATABASE_PORT
+  value: "5432"
+- name: DATABASE_USER
+  value: "{{ .Values.postgresql.postgresqlUsername }}"
+- name: DATABASE_DB
+  value: "{{ .Values.postgresql.postgresqlDatabase }}"
+{{- if .Values.postgresql.existingSecret }}
+- name: DATABASE_PASSWORD
+  valueFrom:
+    secretKeyRef:
+      name: "{{ .Values.postgresql.existingSecret }}"
+      key: "{{ .Values.postgresql.existingSecretKey }}"
+{{- else }}
+- name: DATABASE_PASSWORD
+  valueFrom:
+    secretKeyRef:
+      name: {{ include "multi-translate.fullname" . }}-postgresql
+      key: postgresql-password
+{{- end }}
+{{- end }}
+- name: POSTGRES_DSN
+  value: postgresql://$(DATABASE_USER):$(DATABASE_PASSWORD)@$(DATABASE_HOST):$(DATABASE_PORT)/$(DATABASE_DB)
+{{- end }}
@@ -0,0 +1,104 @@
+"""
+Rewrites translations stored before COMPACT_STORAGE was turned on in the compact storage format (see storage.py).
+Translations are read in batches in id order and only those whose stored form changes are updated, so this can be
+stopped and run again at any time.
+
+Run with `python compact_storage.py` once migration 0004 has been applied.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Mapping, Optional
+
+from databases import Database
+from sqlalchemy import and_, null
+
+from db import require_postgres, translations
+from settings import FeaturesSettings
+from storage import decode_translation, encode_translation
+
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+ENCODED_COLUMNS = (
+    "source_text",
+    "source_text_compressed",
+    "translated_text",
+    "translated_text_compressed",
+    "alignment",
+    "alignment_packed",
+)
+
+
+def compacted(
+    record: Mapping[str, Any], compress_min_bytes: int
+) -> Optional[Dict[str, Any]]:
+    """The new values of the record's text and alignment columns, or None if they are already compact"""
+    decoded = decode_translation(record)
+    encoded = encode_translation(
+        decoded["source_text"],
+        decoded["translated_text"],
+        decoded["alignment"] if decoded["has_alignment_info"] else None,
+        compress_min_bytes=compress_min_bytes,
+    )
+    if all(encoded[name] == record[name] for name in ENCODED_COLUMNS):
+        return None
+    return encoded
+
+
+async def compact_translations(database: Database, compress_min_bytes: int) -> int:
+    """Returns the number of translations rewritten"""
+    rewritten = 0
+    after_id = 0
+    while True:
+        records = await database.fetch_all(
+            translations.select()
+            .where(translations.c.id > after_id)
+            .order_by(translations.c.id)
+            .limit(BATCH_SIZE)
+        )
+        if not records:
+            return rewritten
+        for record in records:
+            values = compacted(record, compress_min_bytes)
+            if values is None:
+                continue
+            await database.execute(
+                translations.update().where(
+                    and_(
+                        translations.c.id == record["id"],
+                        translations.c.to_language == record["to_language"],
+                    )
+                )
+                # SQL rather than JSON nulls
+                .values(
+                    {
+                        name: null() if value is None else value
+                        for name, value in values.items()
+                    }
+                )
+            )
+            rewritten += 1
+        after_id = records[-1]["id"]
+        _logger.info("rewrote %s translations up to id %s", rewritten, after_id)
+
+
+async def main():
+    features = FeaturesSettings()
+    if not features.compact_storage:
+        _logger.info("COMPACT_STORAGE is not set, leaving translations as they are")
+        return
+    database = require_postgres()
+    await database.connect()
+    try:
+        rewritten = await compact_translations(
+            database, features.compact_storage_min_text_bytes
+        )
+    finally:
+        await database.disconnect()
+    _logger.info("rewrote %s translations in the compact format", rewritten)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,37 +1,99 @@
-import databases
+import hashlib
+from typing import Optional
+
 import sqlalchemy
 from sqlalchemy import UniqueConstraint
 
+from db_pool import InstrumentedDatabase
+from replicas import ReplicaPool
 from settings import DatabaseSettings
 
 
-database = databases.Database(DatabaseSettings().postgres_dsn)
+settings = DatabaseSettings()
+# both are None when POSTGRES_DSN isn't set, as when translations are persisted to sqlite
+database: Optional[InstrumentedDatabase] = None
+# lookups of previous translations, spread over the read replicas if there are any
+read_database: Optional[ReplicaPool] = None
+if settings.postgres_dsn is not None:
+    database = InstrumentedDatabase(settings.postgres_dsn, settings)
+    read_database = ReplicaPool(
+        primary=database,
+        replicas=[
+            InstrumentedDatabase(dsn, settings) for dsn in settings.postgres_read_dsns
+        ],
+        health_check_seconds=settings.read_replica_health_check_seconds,
+        max_lag_seconds=settings.read_replica_max_lag_seconds,
+        miss_fallback_timeout_seconds=settings.read_replica_miss_fallback_timeout_seconds,
+    )
 metadata = sqlalchemy.MetaData()
+# the schema itself is managed by the migrations in migrations/, this must be kept in step with them. The table is hash
+# partitioned by to_language
 translations = sqlalchemy.Table(
     "translation",
     metadata,
-    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, autoincrement=True),
     sqlalchemy.Column("from_was_specified", sqlalchemy.Boolean, nullable=False),
     sqlalchemy.Column(
         "from_language", sqlalchemy.String, nullable=True
     ),  # iso 639-1 2 letter code
     sqlalchemy.Column(
-        "to_language", sqlalchemy.String, nullable=False
+        "to_language", sqlalchemy.String, primary_key=True
     ),  # iso 639-1 2 letter code
-    sqlalchemy.Column("source_text", sqlalchemy.String, nullable=False),
-    sqlalchemy.Column("translated_text", sqlalchemy.String, nullable=False),
+    # texts and alignments are stored in one of two forms, see storage.py
+    sqlalchemy.Column("source_text", sqlalchemy.String, nullable=True),
+    sqlalchemy.Column("source_text_compressed", sqlalchemy.LargeBinary, nullable=True),
+    # fixed size digest of the source text, see source_text_hash
+    sqlalchemy.Column("source_text_hash", sqlalchemy.LargeBinary, nullable=False),
+    sqlalchemy.Column("translated_text", sqlalchemy.String, nullable=True),
+    sqlalchemy.Column(
+        "translated_text_compressed", sqlalchemy.LargeBinary, nullable=True
+    ),
     sqlalchemy.Column("translation_engine", sqlalchemy.String, nullable=False),
     sqlalchemy.Column("translation_engine_version", sqlalchemy.String, nullable=False),
     sqlalchemy.Column("has_alignment_info", sqlalchemy.Boolean, nullable=False),
     sqlalchemy.Column("alignment", sqlalchemy.JSON, nullable=True),
+    sqlalchemy.Column("alignment_packed", sqlalchemy.LargeBinary, nullable=True),
     sqlalchemy.Column("detection_confidence", sqlalchemy.Float, nullable=True),
+    sqlalchemy.Column(
+        "created_at",
+        sqlalchemy.DateTime(timezone=True),
+        nullable=False,
+        server_default=sqlalchemy.func.now(),
+    ),
+    # updated (in batches) when a stored translation is served, used to find translations for the retention job
+    sqlalchemy.Column(
+        "last_used_at",
+        sqlalchemy.DateTime(timezone=True),
+        nullable=False,
+        server_default=sqlalchemy.func.now(),
+    ),
+    # how many times the translation has been served from the database, see UsageTracker
+    sqlalchemy.Column(
+        "hit_count", sqlalchemy.Integer, nullable=False, server_default="0"
+    ),
+    # leads with the source text digest so it is also the index used to look up previous translations
     UniqueConstraint(
-        "from_language",
+        "source_text_hash",
         "to_language",
-        "source_text",
         "translation_engine",
         "translation_engine_version",
+        "from_language",
         "has_alignment_info",
         name="unique_translation_constraint",
     ),
 )
+
+
+def source_text_hash(source_text: str) -> bytes:
+    """
+    The key previous translations are looked up by - indexing the digest rather than the text itself keeps the index
+    compact and allows texts too long for a btree entry to be stored
+    """
+    return hashlib.sha256(source_text.encode()).digest()
+
+
+def require_postgres() -> InstrumentedDatabase:
+    """The primary database, for the tools which only work with postgres - exiting if POSTGRES_DSN isn't set"""
+    if database is None:
+        raise SystemExit("POSTGRES_DSN must be set")
+    return database
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Union
+
+import databases
+from sqlalchemy.sql import ClauseElement
+
+from settings import DatabaseSettings
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class LatencyStats:
+    """Running totals of a latency along with percentiles over the most recent window of samples"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self._recent.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        recent = sorted(self._recent)
+        return {
+            "count": self.count,
+            "total_seconds": self.total_seconds,
+            "max_seconds": self.max_seconds,
+            "p50_seconds": recent[len(recent) // 2] if recent else None,
+            "p99_seconds": recent[int(len(recent) * 0.99)] if recent else None,
+        }
+
+
+def query_kind(query: Union[ClauseElement, str]) -> str:
+    if isinstance(query, str):
+        return query.split(None, 1)[0].lower() if query.strip() else "empty"
+    return getattr(query, "__visit_name__", type(query).__name__.lower())
+
+
+class InstrumentedDatabase(databases.Database):
+    """
+    A database whose connection pool is sized and bounded from the settings, reporting how long queries wait for a
+    pooled connection and how long they then take (by kind of statement) so pool exhaustion can be told apart from
+    slow queries
+    """
+
+    def __init__(self, url: str, settings: DatabaseSettings):
+        options: Dict[str, Any] = dict(
+            min_size=settings.db_pool_min_size,
+            max_size=settings.db_pool_max_size,
+            timeout=settings.db_connect_timeout_seconds,
+            statement_cache_size=settings.db_statement_cache_size,
+        )
+        if settings.db_statement_timeout_seconds is not None:
+            # enforced by the server so an abandoned query doesn't keep running
+            options["server_settings"] = {
+                "statement_timeout": str(
+                    int(settings.db_statement_timeout_seconds * 1000)
+                )
+            }
+        super().__init__(url, **options)
+        self.max_size = settings.db_pool_max_size
+        self.acquire_timeout_seconds = settings.db_pool_acquire_timeout_seconds
+        # the pool itself is only bounded by asyncpg, this bounds waiting for it and allows the wait to be measured
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._in_use = 0
+        self._stats = {"checkouts": 0, "acquire_timeouts": 0}
+        self._pool_wait = LatencyStats()
+        self._query_latency: Dict[str, LatencyStats] = {}
+
+    async def connect(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_size)
+        await super().connect()
+
+    @asynccontextmanager
+    async def _checkout(self) -> AsyncIterator[databases.core.Connection]:
+        started = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(
+                self._slots.acquire(), timeout=self.acquire_timeout_seconds
+            )
+        except asyncio.TimeoutError as e:
+            self._stats["acquire_timeouts"] += 1
+            raise PoolTimeoutError(
+                f"no database connection available within {self.acquire_timeout_seconds}s"
+            ) from e
+        finally:
+            self._waiting -= 1
+        self._stats["checkouts"] += 1
+        self._in_use += 1
+        try:
+            async with self.connection() as connection:
+                self._pool_wait.record(time.monotonic() - started)
+                yield connection
+        finally:
+            self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def _timed(self, query: Union[ClauseElement, str]) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            kind = query_kind(query)
+            if kind not in self._query_latency:
+                self._query_latency[kind] = LatencyStats()
+            self._query_latency[kind].record(time.monotonic() - started)
+
+    async def fetch_all(self, query, values: dict = None):
+        async with self._checkout() as connection:
+            with self._timed(query):
+                return await connection.fetch_all(query, values)
+
+    async def fetch_one(self, query, values: dict = None):
+        async with self._checkout() as connection:
+            with self._timed(query):
+                return await connection.fetch_one(query, values)
+
+    async def fetch_val(self, query, values: dict = None, column: Any = 0):
+        async with self._checkout() as connection:
+            with self._timed(query):
+                return await connection.fetch_val(query, values, column=column)
+
+    async def execute(self, query, values: dict = None):
+        async with self._checkout() as connection:
+            with self._timed(query):
+                return await connection.execute(query, values)
+
+    async def execute_many(self, query, values: list):
+        async with self._checkout() as connection:
+            with self._timed(query):
+                return await connection.execute_many(query, values)
+
+    async def iterate(self, query, values: dict = None):
+        # holds the connection for as long as the caller takes to consume the records, so not timed as a query
+        async with self._checkout() as connection:
+            async for record in connection.iterate(query, values):
+                yield record
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "max_size": self.max_size,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "pool_wait": self._pool_wait.summary(),
+            "query_latency": {
+                kind: latency.summary() for kind, latency in self._query_latency.items()
+            },
+        }
@@ -4,7 +4,7 @@ from typing import Optional
 import boto3
 from botocore.exceptions import ClientError
 
-from engines.base import BaseTranslationEngine
+from engines.base import ThreadedTranslationEngine
 from errors import (
     EngineApiError,
     TranslationEngineNotConfiguredError,
@@ -14,7 +14,7 @@ from models.response import TranslationResponse
 from settings import Settings
 
 
-class AmazonEngine(BaseTranslationEngine):
+class AmazonEngine(ThreadedTranslationEngine):
     NAME = "amazon"
     # see https://docs.aws.amazon.com/translate/latest/dg/doc-history.html rolling version history
     # version below is the date of the latest change that would affect either the features or languages supported that
@@ -86,6 +86,7 @@ class AmazonEngine(BaseTranslationEngine):
                 f"{self.name_ver} not configured correctly, "
                 f"aws_secret_access_key and aws_access_key_id must be set"
             )
+        self.max_workers = settings.amazon_max_workers
         self.client = self.get_client(settings.amazon_region)
         super().__init__()
 
@@ -115,7 +116,8 @@ class AmazonEngine(BaseTranslationEngine):
         )
 
         try:
-            result = self.client.translate_text(
+            result = await self.run_blocking(
+                self.client.translate_text,
                 Text=source_text,
                 SourceLanguageCode=from_language,
                 TargetLanguageCode=to_language,
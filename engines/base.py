@@ -1,10 +1,23 @@
-from typing import Dict, List, Optional
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
 
+import httpx
+
+from engines.capabilities import LanguagePairMatrix
 from errors import (
     AlignmentNotSupportedError,
     DetectionNotSupportedError,
     UnsupportedLanguagePairError,
 )
+from models.response import TranslationResponse
+from settings import Settings
+
+
+T = TypeVar("T")
 
 
 class BaseTranslationEngine:
@@ -14,14 +27,34 @@ class BaseTranslationEngine:
     supports_alignment: bool = False
     supports_detection: bool = False
 
+    # limits on a single upstream request, engines whose api only accepts one text per request keep a batch size of 1
+    max_batch_size: int = 1
+    max_batch_characters: Optional[int] = None
+
+    _request_semaphore: Optional[asyncio.Semaphore] = None
+
     @property
     def name_ver(self):
         return f"{self.NAME} ({self.VERSION})"
 
     def __init__(self):
-        self.supported_translations: Dict[
-            str, List[str]
-        ] = self.get_supported_translations()
+        self.language_pairs = LanguagePairMatrix.from_translations(
+            self.get_supported_translations()
+        )
+
+    @property
+    def supported_translations(self) -> Dict[str, List[str]]:
+        return self.language_pairs.as_dict()
+
+    async def startup(self) -> None:
+        """Acquire any long-lived resources the engine needs to serve requests"""
+
+    async def shutdown(self) -> None:
+        """Release any long-lived resources acquired in startup"""
+
+    def stats(self) -> Dict[str, Any]:
+        """Runtime statistics about the engine, reported by the /stats endpoint"""
+        return {}
 
     def get_supported_translations(self):
         raise NotImplementedError("get supported translations must be implemented")
@@ -29,26 +62,14 @@ class BaseTranslationEngine:
     def is_language_pair_supported(
         self, from_language: Optional[str], to_language: str
     ):
-        if from_language is None:
-            if to_language in {
-                to_l
-                for list_of_to_l in self.supported_translations.values()
-                for to_l in list_of_to_l
-            }:
-                return
-        else:
-            try:
-                if to_language in self.supported_translations[from_language]:
-                    return
-            except KeyError:
-                pass
+        if self.language_pairs.supports(from_language, to_language):
+            return
         raise UnsupportedLanguagePairError(
             f"{self.name_ver} does not support the language pair {from_language} to {to_language}"
         )
 
-    async def translate(
+    def check_request(
         self,
-        source_text: str,
         from_language: Optional[str],
         to_language: str,
         with_alignment: Optional[bool] = False,
@@ -65,3 +86,214 @@ class BaseTranslationEngine:
             raise AlignmentNotSupportedError(
                 f"{self.name_ver} does not support alignment"
             )
+
+    async def translate(
+        self,
+        source_text: str,
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: Optional[bool] = False,
+    ):
+        self.check_request(
+            from_language=from_language,
+            to_language=to_language,
+            with_alignment=with_alignment,
+        )
+
+    def batches(self, source_texts: List[str]) -> Iterator[List[str]]:
+        """Split source_texts into the fewest upstream requests allowed by the engine's batch limits"""
+        batch: List[str] = []
+        batch_characters = 0
+        for source_text in source_texts:
+            if batch and (
+                len(batch) >= self.max_batch_size
+                or (
+                    self.max_batch_characters is not None
+                    and batch_characters + len(source_text) > self.max_batch_characters
+                )
+            ):
+                yield batch
+                batch, batch_characters = [], 0
+            batch.append(source_text)
+            batch_characters += len(source_text)
+        if batch:
+            yield batch
+
+    async def translate_texts(
+        self,
+        source_texts: List[str],
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: Optional[bool] = False,
+    ) -> List[TranslationResponse]:
+        """Translate a single batch of texts in one upstream request"""
+        raise NotImplementedError(
+            "translate texts must be implemented by engines with a max batch size over 1"
+        )
+
+    @property
+    def request_semaphore(self) -> asyncio.Semaphore:
+        """Bounds the upstream requests made at once by the engine's batch translations, across all of them"""
+        if self._request_semaphore is None:
+            self._request_semaphore = asyncio.Semaphore(
+                Settings().engine_max_concurrent_requests
+            )
+        return self._request_semaphore
+
+    async def _bounded(self, request: Awaitable[T]) -> T:
+        async with self.request_semaphore:
+            return await request
+
+    async def translate_batch(
+        self,
+        source_texts: List[str],
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: Optional[bool] = False,
+    ) -> List[TranslationResponse]:
+        """Translate several texts for one language pair - results are in the same order as source_texts"""
+        if self.max_batch_size == 1:
+            return list(
+                await asyncio.gather(
+                    *(
+                        self._bounded(
+                            self.translate(
+                                source_text=source_text,
+                                from_language=from_language,
+                                to_language=to_language,
+                                with_alignment=with_alignment,
+                            )
+                        )
+                        for source_text in source_texts
+                    )
+                )
+            )
+
+        self.check_request(
+            from_language=from_language,
+            to_language=to_language,
+            with_alignment=with_alignment,
+        )
+        batch_results = await asyncio.gather(
+            *(
+                self._bounded(
+                    self.translate_texts(
+                        source_texts=batch,
+                        from_language=from_language,
+                        to_language=to_language,
+                        with_alignment=with_alignment,
+                    )
+                )
+                for batch in self.batches(source_texts)
+            )
+        )
+        return [result for results in batch_results for result in results]
+
+
+class PooledHttpTranslationEngine(BaseTranslationEngine):
+    """
+    An engine which talks to its upstream api over http using a shared, keep-alive connection pool rather than a new
+    client (and connection) per request
+    """
+
+    _client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def warm_up_url(self) -> Optional[str]:
+        """A url on the upstream host which is requested at startup to open the first pooled connection"""
+        return None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            settings = Settings()
+            self._client = httpx.AsyncClient(
+                pool_limits=httpx.PoolLimits(
+                    max_keepalive=settings.upstream_pool_max_keepalive,
+                    max_connections=settings.upstream_pool_max_connections,
+                ),
+                timeout=settings.upstream_timeout_seconds,
+            )
+        return self._client
+
+    async def startup(self) -> None:
+        client = self.client
+        if self.warm_up_url is None:
+            return
+        try:
+            await client.head(self.warm_up_url)
+        except Exception:
+            # warming up is best effort, any real problem will surface on the request path
+            logging.getLogger(__name__).info(
+                "%s could not pre-warm a connection to %s",
+                self.name_ver,
+                self.warm_up_url,
+                exc_info=True,
+            )
+
+    async def shutdown(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ThreadedTranslationEngine(BaseTranslationEngine):
+    """
+    An engine whose upstream client library is synchronous - blocking calls are run on a bounded, per-engine thread
+    pool so that a slow upstream call does not stall every other request on the event loop
+    """
+
+    max_workers: int = 4
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    def __init__(self):
+        self._executor_stats_lock = threading.Lock()
+        self._executor_stats = {
+            "calls": 0,
+            "in_flight": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+        }
+        super().__init__()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=self.NAME
+            )
+        return self._executor
+
+    def _record_queue_wait(self, waited: float) -> None:
+        with self._executor_stats_lock:
+            self._executor_stats["calls"] += 1
+            self._executor_stats["queue_wait_seconds_total"] += waited
+            self._executor_stats["queue_wait_seconds_max"] = max(
+                self._executor_stats["queue_wait_seconds_max"], waited
+            )
+
+    async def run_blocking(self, func: Callable[..., T], *args, **kwargs) -> T:
+        submitted_at = time.monotonic()
+
+        def timed_call():
+            self._record_queue_wait(time.monotonic() - submitted_at)
+            return func(*args, **kwargs)
+
+        with self._executor_stats_lock:
+            self._executor_stats["in_flight"] += 1
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                self.executor, timed_call
+            )
+        finally:
+            with self._executor_stats_lock:
+                self._executor_stats["in_flight"] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._executor_stats_lock:
+            return {"max_workers": self.max_workers, **self._executor_stats}
+
+    async def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,103 @@
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """The indexes of the set bits, lowest first"""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+class LanguageTable:
+    """
+    Interns language codes (including regional ones like zh-TW) as small integers shared by every engine. Engines are
+    constructed concurrently in threads, so new codes are added under a lock
+    """
+
+    def __init__(self):
+        self._codes: List[str] = []
+        self._indexes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def intern(self, code: str) -> int:
+        try:
+            return self._indexes[code]
+        except KeyError:
+            pass
+        with self._lock:
+            # another thread may have added it since the check above
+            if code not in self._indexes:
+                # appended first so a reader finding the index can always look the code up
+                self._codes.append(code)
+                self._indexes[code] = len(self._codes) - 1
+            return self._indexes[code]
+
+    def index(self, code: Optional[str]) -> Optional[int]:
+        return self._indexes.get(code)
+
+    def code(self, index: int) -> str:
+        return self._codes[index]
+
+    def bits(self, codes: Iterable[str]) -> int:
+        bits = 0
+        for code in codes:
+            bits |= 1 << self.intern(code)
+        return bits
+
+    def codes(self, bits: int) -> List[str]:
+        return [self._codes[index] for index in iter_bits(bits)]
+
+
+language_table = LanguageTable()
+
+
+class LanguagePairMatrix:
+    """
+    The language pairs an engine supports - for each from language a bitset of the to languages, indexed by the
+    shared language table, so a pair check is a dict lookup and a bit test
+    """
+
+    def __init__(self, rows: Dict[int, int], table: LanguageTable = language_table):
+        self.rows = rows
+        self.table = table
+        # every language which can be translated to, for requests where the from language is detected
+        self.any_to = 0
+        for to_bits in rows.values():
+            self.any_to |= to_bits
+
+    @classmethod
+    def from_translations(
+        cls,
+        supported_translations: Dict[str, Iterable[str]],
+        table: LanguageTable = language_table,
+    ) -> "LanguagePairMatrix":
+        rows: Dict[int, int] = {}
+        # engines commonly map every language to the same list so only encode each distinct list once
+        encoded: Dict[int, int] = {}
+        for from_language, to_languages in supported_translations.items():
+            if id(to_languages) not in encoded:
+                encoded[id(to_languages)] = table.bits(to_languages)
+            rows[table.intern(from_language)] = encoded[id(to_languages)]
+        return cls(rows, table)
+
+    def to_bits(self, from_language: Optional[str]) -> int:
+        if from_language is None:
+            return self.any_to
+        from_index = self.table.index(from_language)
+        if from_index is None:
+            return 0
+        return self.rows.get(from_index, 0)
+
+    def supports(self, from_language: Optional[str], to_language: str) -> bool:
+        to_index = self.table.index(to_language)
+        if to_index is None:
+            return False
+        return bool(self.to_bits(from_language) >> to_index & 1)
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        return {
+            self.table.code(from_index): self.table.codes(to_bits)
+            for from_index, to_bits in self.rows.items()
+        }
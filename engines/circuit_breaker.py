@@ -0,0 +1,246 @@
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+_logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Opens once failure_rate of the calls over the last window_seconds (and at least min_calls of them) have failed or
+    taken longer than slow_call_seconds. An open breaker allows no calls for open_seconds, after which it is half
+    open and allows a single probe call - closing again if it succeeds and reopening if it fails, with another probe
+    allowed if it doesn't report back within open_seconds. Routing only checks a breaker is available, the probe is
+    claimed (acquired) when the call is actually made
+    """
+
+    def __init__(
+        self,
+        failure_rate: float,
+        min_calls: int,
+        window_seconds: float,
+        open_seconds: float,
+        slow_call_seconds: Optional[float],
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CircuitState.CLOSED
+        # wall clock times so they can be shared between replicas
+        self.open_until = 0.0
+        self._probe_started_at: Optional[float] = None
+        # when and whether the call failed
+        self._calls: Deque[Tuple[float, bool]] = deque()
+
+    def available(self, now: float) -> bool:
+        """Whether a call could be made, without claiming the probe call of a half open breaker"""
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            return now >= self.open_until
+        return not (
+            self._probe_started_at is not None
+            and now - self._probe_started_at < self.open_seconds
+        )
+
+    def acquire(self, now: float) -> bool:
+        """Claim a call which is about to be made - when half open, the single probe call"""
+        if not self.available(now):
+            return False
+        if self.state == CircuitState.OPEN:
+            self.state = CircuitState.HALF_OPEN
+        if self.state == CircuitState.HALF_OPEN:
+            self._probe_started_at = now
+        return True
+
+    def release(self) -> None:
+        """Give back the probe call of a half open breaker, which ended without saying anything about the engine"""
+        self._probe_started_at = None
+
+    def record(
+        self, now: float, seconds: Optional[float], failed: bool
+    ) -> Optional[CircuitState]:
+        """Record the outcome of a call, returning the new state if it changed"""
+        failed = failed or (
+            seconds is not None
+            and self.slow_call_seconds is not None
+            and seconds > self.slow_call_seconds
+        )
+        if self.state == CircuitState.OPEN:
+            # a call started before the breaker opened
+            return None
+        if self.state == CircuitState.HALF_OPEN:
+            if failed:
+                self.open(now + self.open_seconds)
+                return CircuitState.OPEN
+            self.close()
+            return CircuitState.CLOSED
+
+        self._calls.append((now, failed))
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+        failures = sum(call_failed for _, call_failed in self._calls)
+        if (
+            len(self._calls) >= self.min_calls
+            and failures / len(self._calls) >= self.failure_rate
+        ):
+            self.open(now + self.open_seconds)
+            return CircuitState.OPEN
+        return None
+
+    def open(self, until: float) -> None:
+        self.state = CircuitState.OPEN
+        self.open_until = until
+        self._probe_started_at = None
+        self._calls.clear()
+
+    def close(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.open_until = 0.0
+        self._probe_started_at = None
+        self._calls.clear()
+
+
+class CircuitBreakers:
+    """
+    A circuit breaker for each engine, or for each engine and language pair if per_language_pair is set. Disabled
+    (allowing every call) when failure_rate is None.
+
+    on_state_change, if set, is called with the breaker's key and when it is open until whenever a breaker opens, or
+    with None when it closes, so the state can be shared with other replicas (see open_shared)
+    """
+
+    def __init__(
+        self,
+        failure_rate: Optional[float],
+        min_calls: int,
+        window_seconds: float,
+        open_seconds: float,
+        slow_call_seconds: Optional[float],
+        per_language_pair: bool,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.per_language_pair = per_language_pair
+        self.on_state_change: Optional[Callable[[str, Optional[float]], None]] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats = {"opened": 0, "closed": 0, "rejected": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_rate is not None
+
+    def key(
+        self, engine_name: str, from_language: Optional[str], to_language: str
+    ) -> str:
+        if not self.per_language_pair:
+            return engine_name
+        return f"{engine_name}:{from_language or 'detected'}:{to_language}"
+
+    def _breaker(self, key: str) -> CircuitBreaker:
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(
+                failure_rate=self.failure_rate,
+                min_calls=self.min_calls,
+                window_seconds=self.window_seconds,
+                open_seconds=self.open_seconds,
+                slow_call_seconds=self.slow_call_seconds,
+            )
+        return self._breakers[key]
+
+    def available(
+        self, engine_name: str, from_language: Optional[str], to_language: str
+    ) -> bool:
+        """Whether the engine can be routed to - side effect free, the call is claimed by acquire once it's made"""
+        if not self.enabled:
+            return True
+        key = self.key(engine_name, from_language, to_language)
+        if key not in self._breakers:
+            return True
+        available = self._breakers[key].available(time.time())
+        if not available:
+            self._stats["rejected"] += 1
+        return available
+
+    def acquire(
+        self, engine_name: str, from_language: Optional[str], to_language: str
+    ) -> bool:
+        if not self.enabled:
+            return True
+        key = self.key(engine_name, from_language, to_language)
+        if key not in self._breakers:
+            return True
+        acquired = self._breakers[key].acquire(time.time())
+        if not acquired:
+            self._stats["rejected"] += 1
+        return acquired
+
+    def release(
+        self, engine_name: str, from_language: Optional[str], to_language: str
+    ) -> None:
+        key = self.key(engine_name, from_language, to_language)
+        if key in self._breakers:
+            self._breakers[key].release()
+
+    def record(
+        self,
+        engine_name: str,
+        from_language: Optional[str],
+        to_language: str,
+        seconds: Optional[float],
+        failed: bool,
+    ) -> None:
+        if not self.enabled:
+            return
+        key = self.key(engine_name, from_language, to_language)
+        breaker = self._breaker(key)
+        new_state = breaker.record(time.time(), seconds, failed)
+        if new_state == CircuitState.OPEN:
+            self._stats["opened"] += 1
+            _logger.warning(
+                "circuit breaker for %s opened for %ss", key, self.open_seconds
+            )
+            if self.on_state_change is not None:
+                self.on_state_change(key, breaker.open_until)
+        elif new_state == CircuitState.CLOSED:
+            self._stats["closed"] += 1
+            _logger.info("circuit breaker for %s closed", key)
+            if self.on_state_change is not None:
+                self.on_state_change(key, None)
+
+    def open_shared(self, key: str, open_until: float) -> bool:
+        """
+        Open the breaker as another replica's has been opened, unless it already is for at least as long - returning
+        whether it was opened
+        """
+        breaker = self._breaker(key)
+        if open_until <= time.time() or (
+            breaker.state == CircuitState.OPEN and breaker.open_until >= open_until
+        ):
+            return False
+        breaker.open(open_until)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "breakers": {
+                key: {"state": breaker.state.value, "open_until": breaker.open_until}
+                for key, breaker in self._breakers.items()
+                if breaker.state != CircuitState.CLOSED
+            },
+        }
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from engines.base import BaseTranslationEngine
+from models.response import TranslationResponse
+
+
+CoalesceKey = Tuple[str, Optional[str], str, bool]
+
+
+class _PendingBatch:
+    def __init__(
+        self,
+        engine: BaseTranslationEngine,
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: bool,
+    ):
+        self.engine = engine
+        self.from_language = from_language
+        self.to_language = to_language
+        self.with_alignment = with_alignment
+        self.waiters: List[Tuple[str, asyncio.Future]] = []
+        self.characters = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, source_text: str) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        self.waiters.append((source_text, future))
+        self.characters += len(source_text)
+        return future
+
+
+class TranslationCoalescer:
+    """
+    Holds concurrent single text translations for the same engine and language pair for a short window, then sends
+    them upstream together as one multi-text request and fans the results back out to the waiting callers. If the
+    multi-text request fails each text is translated on its own, so one bad text only fails its own caller
+    """
+
+    def __init__(self, window_seconds: float, max_texts: int, max_characters: int):
+        self.window_seconds = window_seconds
+        self.max_texts = max_texts
+        self.max_characters = max_characters
+        self._pending: Dict[CoalesceKey, _PendingBatch] = {}
+        self._logger = logging.getLogger(__name__)
+        self._stats = {
+            "requests": 0,
+            "upstream_batches": 0,
+            "upstream_texts": 0,
+            "retried_batches": 0,
+        }
+
+    async def translate(
+        self,
+        engine: BaseTranslationEngine,
+        source_text: str,
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: bool = False,
+    ) -> TranslationResponse:
+        if engine.max_batch_size == 1:
+            # the engine's api can't take more than one text so there is nothing to gain by waiting
+            return await engine.translate(
+                source_text=source_text,
+                from_language=from_language,
+                to_language=to_language,
+                with_alignment=with_alignment,
+            )
+
+        self._stats["requests"] += 1
+        key = (engine.NAME, from_language, to_language, bool(with_alignment))
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _PendingBatch(engine, from_language, to_language, with_alignment)
+            batch.timer = asyncio.get_event_loop().call_later(
+                self.window_seconds, self._flush, key
+            )
+            self._pending[key] = batch
+        future = batch.add(source_text)
+
+        if (
+            len(batch.waiters) >= min(self.max_texts, engine.max_batch_size)
+            or batch.characters >= self.max_characters
+        ):
+            self._flush(key)
+        return await future
+
+    def _flush(self, key: CoalesceKey) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: _PendingBatch) -> None:
+        source_texts = list(dict.fromkeys(text for text, _ in batch.waiters))
+        self._stats["upstream_batches"] += 1
+        self._stats["upstream_texts"] += len(source_texts)
+        self._logger.debug(
+            "sending %s coalesced texts to %s",
+            len(source_texts),
+            batch.engine.name_ver,
+        )
+        try:
+            results = await batch.engine.translate_batch(
+                source_texts=source_texts,
+                from_language=batch.from_language,
+                to_language=batch.to_language,
+                with_alignment=batch.with_alignment,
+            )
+        except Exception as e:
+            if len(source_texts) == 1:
+                results = [e]
+            else:
+                results = await self._send_separately(batch, source_texts)
+
+        results_by_text = dict(zip(source_texts, results))
+        for source_text, future in batch.waiters:
+            # callers which were cancelled while waiting have already given up on their result
+            if future.done():
+                continue
+            result = results_by_text[source_text]
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _send_separately(
+        self, batch: _PendingBatch, source_texts: List[str]
+    ) -> List[Union[TranslationResponse, BaseException]]:
+        """Each text's own result or the exception translating it raised"""
+        self._stats["retried_batches"] += 1
+        self._logger.info(
+            "%s coalesced texts failed together on %s, translating them separately",
+            len(source_texts),
+            batch.engine.name_ver,
+            exc_info=True,
+        )
+        return await asyncio.gather(
+            *(
+                batch.engine.translate(
+                    source_text=source_text,
+                    from_language=batch.from_language,
+                    to_language=batch.to_language,
+                    with_alignment=batch.with_alignment,
+                )
+                for source_text in source_texts
+            ),
+            return_exceptions=True,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "pending_batches": len(self._pending)}
@@ -1,22 +1,29 @@
+import asyncio
 import logging
-from typing import Dict, List, Optional, Tuple
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple, Type
 
 import yaml
 
 from engines.amazon import AmazonEngine
 from engines.base import BaseTranslationEngine
+from engines.capabilities import iter_bits, language_table
+from engines.circuit_breaker import CircuitBreakers
 from engines.deep_l import DeepLEngine
 from engines.google import GoogleEngine
+from engines.health import REQUEST_ERRORS, EngineHealthTracker
 from engines.microsoft import MicrosoftEngine
 from engines.papago import PapagoEngine
 from engines.yandex import YandexEngine
 from errors import (
     EngineApiError,
+    EngineUnavailableError,
     InvalidEngineNameError,
     InvalidLanguagePreferencesError,
     NoValidEngineConfiguredError,
     TranslationEngineNotConfiguredError,
-    UnsupportedLanguagePairError,
 )
 from settings import Settings
 
@@ -33,6 +40,8 @@ SUPPORTED_ENGINES = (
 ENGINE_NAME_MAP = {e.NAME: e for e in SUPPORTED_ENGINES}
 
 LangPref = Dict[str, Dict[str, List[str]]]
+# from language, to language, needs detection, needs alignment
+RouteKey = Tuple[Optional[str], str, bool, bool]
 
 
 def _load_language_preferences(
@@ -64,13 +73,12 @@ def _load_language_preferences(
 default_language_preferences, default_ordering = _load_language_preferences()
 
 
-def _best_engine_by_language(
-    engines: Dict[str, BaseTranslationEngine],
+def _engine_ordering(
     from_language: Optional[str],
     to_language: str,
     language_preferences: LangPref,
     base_ordering: List[str],
-) -> BaseTranslationEngine:
+) -> List[str]:
     from_l_preferences = language_preferences.get(
         from_language, language_preferences["xx"]
     )
@@ -90,14 +98,31 @@ def _best_engine_by_language(
         for engine_name in base_ordering
         if engine_name not in filled_ordering
     ]
+    return filled_ordering
+
 
+def _best_engine_by_language(
+    engines: Dict[str, BaseTranslationEngine],
+    from_language: Optional[str],
+    to_language: str,
+    language_preferences: LangPref,
+    base_ordering: List[str],
+) -> BaseTranslationEngine:
     return next(
         engines[engine_name]
-        for engine_name in filled_ordering
+        for engine_name in _engine_ordering(
+            from_language, to_language, language_preferences, base_ordering
+        )
         if engine_name in engines
     )
 
 
+def _unavailable(engine_name: str) -> EngineUnavailableError:
+    return EngineUnavailableError(
+        f"engine {engine_name} is temporarily unavailable after repeated failures"
+    )
+
+
 class EngineController:
     def __init__(self):
         self.available_engines: Dict[str, BaseTranslationEngine] = {}
@@ -105,18 +130,317 @@ class EngineController:
         self._logger = logging.getLogger(__name__)
         self._logger.setLevel(settings.log_level.value)
         self._combined_supported_languages = None
+        self.language_preferences = default_language_preferences
+        self.base_ordering = default_ordering
+        self._routes: Dict[RouteKey, Tuple[BaseTranslationEngine, ...]] = {}
+        self._engine_bits: Dict[str, int] = {}
+        self._detection_mask = self._alignment_mask = 0
+        # engines which are configured but couldn't be initialized, with the reason why
+        self.degraded_engines: Dict[str, str] = {}
+        self._init_timeout_seconds = settings.engine_init_timeout_seconds
+        self._init_retry_seconds = settings.engine_init_retry_seconds
+        self._retry_task: Optional[asyncio.Future] = None
+        self._started = False
+        self.health = EngineHealthTracker(
+            max_ewma_seconds=settings.routing_max_ewma_latency_seconds,
+            max_p95_seconds=settings.routing_max_p95_latency_seconds,
+            max_error_rate=settings.routing_max_error_rate,
+            min_samples=settings.routing_min_samples,
+            window_seconds=settings.routing_window_seconds,
+        )
+        # the most recent routing decisions which demoted an engine, for debugging
+        self.routing_decisions: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self.breakers = CircuitBreakers(
+            failure_rate=settings.circuit_breaker_failure_rate,
+            min_calls=settings.circuit_breaker_min_calls,
+            window_seconds=settings.circuit_breaker_window_seconds,
+            open_seconds=settings.circuit_breaker_open_seconds,
+            slow_call_seconds=settings.circuit_breaker_slow_call_seconds,
+            per_language_pair=settings.circuit_breaker_per_language_pair,
+        )
 
-    def get_available_engines(self):
-        for engine_cls in SUPPORTED_ENGINES:
-            try:
-                self.available_engines[engine_cls.NAME] = engine_cls()
-            except (TranslationEngineNotConfiguredError, EngineApiError):
-                self._logger.info(
-                    "could not initialize %s engine", engine_cls.NAME, exc_info=True
-                )
+    async def get_available_engines(self):
+        """
+        Initialize every engine concurrently - constructing an engine discovers its supported languages so can be
+        slow. Configured engines which fail or aren't ready in time are registered as degraded and retried in the
+        background rather than holding up startup
+        """
+        await asyncio.gather(
+            *(self._initialize_engine(engine_cls) for engine_cls in SUPPORTED_ENGINES)
+        )
         self._logger.info(
             "initialized the following engines %s", self.available_engines.keys()
         )
+        self.compile_routes()
+        if self.degraded_engines and self._retry_task is None:
+            self._retry_task = asyncio.ensure_future(self._retry_degraded_engines())
+
+    async def _initialize_engine(self, engine_cls: Type[BaseTranslationEngine]) -> bool:
+        loop = asyncio.get_event_loop()
+        try:
+            # the constructors make blocking calls so run them off the event loop, a timed out constructor can't be
+            # interrupted but is no longer waited for
+            engine = await asyncio.wait_for(
+                loop.run_in_executor(None, engine_cls),
+                timeout=self._init_timeout_seconds,
+            )
+        except TranslationEngineNotConfiguredError:
+            self._logger.info(
+                "%s engine is not configured", engine_cls.NAME, exc_info=True
+            )
+            return False
+        except asyncio.TimeoutError:
+            self._logger.warning(
+                "%s engine did not initialize within %ss",
+                engine_cls.NAME,
+                self._init_timeout_seconds,
+            )
+            self.degraded_engines[engine_cls.NAME] = "timed out"
+            return False
+        except Exception as e:
+            # the engine is configured but couldn't be reached - api errors as well as network errors
+            self._logger.warning(
+                "could not initialize %s engine", engine_cls.NAME, exc_info=True
+            )
+            self.degraded_engines[engine_cls.NAME] = (
+                e.detail if isinstance(e, EngineApiError) else repr(e)
+            )
+            return False
+        self.degraded_engines.pop(engine_cls.NAME, None)
+        self.available_engines[engine_cls.NAME] = engine
+        return True
+
+    async def _retry_degraded_engines(self):
+        while self.degraded_engines:
+            await asyncio.sleep(self._init_retry_seconds)
+            recovered = []
+            for engine_name in list(self.degraded_engines):
+                if await self._initialize_engine(ENGINE_NAME_MAP[engine_name]):
+                    recovered.append(self.available_engines[engine_name])
+            if recovered:
+                self._logger.info(
+                    "initialized the following degraded engines %s",
+                    [engine.NAME for engine in recovered],
+                )
+                if self._started:
+                    await asyncio.gather(*(engine.startup() for engine in recovered))
+                self.compile_routes()
+        self._retry_task = None
+
+    def set_language_preferences(
+        self, language_preferences: LangPref, base_ordering: List[str]
+    ):
+        self.language_preferences = language_preferences
+        self.base_ordering = base_ordering
+        self.compile_routes()
+
+    def compile_routes(self):
+        """
+        Precompute, for every supported language pair and capability requirement, the available engines able to
+        carry out the request in order of preference. Must be called again whenever the available engines or the
+        language preferences change
+        """
+        self._engine_bits = {
+            engine_name: 1 << position
+            for position, engine_name in enumerate(self.available_engines)
+        }
+        self._detection_mask = self._alignment_mask = 0
+        engines_by_pair: Dict[Tuple[Optional[int], int], int] = defaultdict(int)
+        for engine_name, engine in self.available_engines.items():
+            engine_bit = self._engine_bits[engine_name]
+            if engine.supports_detection:
+                self._detection_mask |= engine_bit
+            if engine.supports_alignment:
+                self._alignment_mask |= engine_bit
+            for from_index, to_bits in engine.language_pairs.rows.items():
+                for to_index in iter_bits(to_bits):
+                    engines_by_pair[(from_index, to_index)] |= engine_bit
+            for to_index in iter_bits(engine.language_pairs.any_to):
+                engines_by_pair[(None, to_index)] |= engine_bit
+
+        routes = {}
+        for (from_index, to_index), engines_mask in engines_by_pair.items():
+            from_language = (
+                None if from_index is None else language_table.code(from_index)
+            )
+            to_language = language_table.code(to_index)
+            for needs_alignment in (False, True):
+                key = (
+                    from_language,
+                    to_language,
+                    from_language is None,
+                    needs_alignment,
+                )
+                routes[key] = self._route(key, engines_mask)
+        self._routes = routes
+        self._combined_supported_languages = None
+        self._logger.debug("compiled %s routes", len(self._routes))
+
+    def _route(
+        self, key: RouteKey, engines_mask: int
+    ) -> Tuple[BaseTranslationEngine, ...]:
+        from_language, to_language, needs_detection, needs_alignment = key
+        if needs_detection:
+            engines_mask &= self._detection_mask
+        if needs_alignment:
+            engines_mask &= self._alignment_mask
+        return tuple(
+            self.available_engines[engine_name]
+            for engine_name in _engine_ordering(
+                from_language,
+                to_language,
+                self.language_preferences,
+                self.base_ordering,
+            )
+            if self._engine_bits.get(engine_name, 0) & engines_mask
+        )
+
+    def _uncompiled_route(self, key: RouteKey) -> Tuple[BaseTranslationEngine, ...]:
+        if self._engine_bits.keys() != self.available_engines.keys():
+            # the available engines were changed without recompiling
+            self.compile_routes()
+            if key in self._routes:
+                return self._routes[key]
+        from_language, to_language, _, _ = key
+        engines_mask = 0
+        for engine_name, engine_instance in self.available_engines.items():
+            if engine_instance.language_pairs.supports(from_language, to_language):
+                engines_mask |= self._engine_bits[engine_name]
+        return self._route(key, engines_mask)
+
+    async def startup(self):
+        self._started = True
+        await asyncio.gather(
+            *(engine.startup() for engine in self.available_engines.values())
+        )
+
+    async def shutdown(self):
+        if self._retry_task is not None:
+            self._retry_task.cancel()
+            self._retry_task = None
+        await asyncio.gather(
+            *(engine.shutdown() for engine in self.available_engines.values())
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: engine.stats() for name, engine in self.available_engines.items()}
+
+    def routing_stats(self) -> Dict[str, Any]:
+        return {
+            "adaptive": self.health.enabled,
+            **self.health.stats(),
+            "recent_demotions": list(self.routing_decisions),
+            "circuit_breakers": {
+                "enabled": self.breakers.enabled,
+                **self.breakers.stats(),
+            },
+        }
+
+    @contextmanager
+    def measure(
+        self,
+        engine_name: str,
+        from_language: Optional[str],
+        to_language: str,
+        timed: bool = True,
+    ) -> Iterator[None]:
+        """
+        Record the call made to the engine in the block for routing and the circuit breakers - untimed calls (e.g. of
+        a whole batch) only count towards errors, and errors in the request rather than the engine aren't counted
+        """
+        if not self.breakers.acquire(engine_name, from_language, to_language):
+            # another request claimed the probe call since the engine was routed to
+            raise _unavailable(engine_name)
+        started = time.monotonic()
+        try:
+            yield
+        except REQUEST_ERRORS:
+            self.breakers.release(engine_name, from_language, to_language)
+            raise
+        except asyncio.CancelledError:
+            # e.g. the slower call of a hedge, which took at least this long - a slow sample for the latency hedging
+            # is based on, and a slow call for the breaker if it is already over the threshold
+            elapsed = time.monotonic() - started
+            if timed:
+                self.health.record(
+                    engine_name, from_language, to_language, elapsed, failed=False
+                )
+            if (
+                timed
+                and self.breakers.slow_call_seconds is not None
+                and elapsed > self.breakers.slow_call_seconds
+            ):
+                self.breakers.record(
+                    engine_name, from_language, to_language, elapsed, failed=False
+                )
+            else:
+                self.breakers.release(engine_name, from_language, to_language)
+            raise
+        except Exception:
+            self._record(engine_name, from_language, to_language, None, failed=True)
+            raise
+        self._record(
+            engine_name,
+            from_language,
+            to_language,
+            time.monotonic() - started if timed else None,
+            failed=False,
+        )
+
+    def _record(
+        self,
+        engine_name: str,
+        from_language: Optional[str],
+        to_language: str,
+        seconds: Optional[float],
+        failed: bool,
+    ) -> None:
+        self.health.record(engine_name, from_language, to_language, seconds, failed)
+        self.breakers.record(engine_name, from_language, to_language, seconds, failed)
+
+    def get_ranked(
+        self,
+        needs_detection: bool,
+        needs_alignment: bool,
+        from_language: Optional[str],
+        to_language: str,
+        exclude_engines: List[str],
+    ) -> List[BaseTranslationEngine]:
+        """
+        All of the engines able to carry out the request, best first - in order of preference, other than engines
+        currently outside the routing thresholds coming last. Engines whose circuit breaker is open are left out
+        """
+        key = (from_language, to_language, needs_detection, needs_alignment)
+        route = self._routes.get(key)
+        if route is None:
+            # not a combination which is compiled up front (e.g. an unsupported language), worked out on demand
+            route = self._uncompiled_route(key)
+        ranked = [
+            engine_instance
+            for engine_instance in route
+            if engine_instance.NAME not in exclude_engines
+            and self.breakers.available(
+                engine_instance.NAME, from_language, to_language
+            )
+        ]
+        if not self.health.enabled:
+            return ranked
+        ranked, demoted = self.health.rank(ranked, from_language, to_language)
+        if demoted:
+            self._logger.debug(
+                "demoted %s for %s to %s", demoted, from_language, to_language
+            )
+            self.routing_decisions.append(
+                {
+                    "from_language": from_language,
+                    "to_language": to_language,
+                    "needs_detection": needs_detection,
+                    "needs_alignment": needs_alignment,
+                    "ranked": [engine.NAME for engine in ranked],
+                    "demoted": demoted,
+                }
+            )
+        return ranked
 
     def get_best(
         self,
@@ -126,29 +450,15 @@ class EngineController:
         to_language: str,
         exclude_engines: List[str],
     ):
-        engine_candidates: Dict[str, BaseTranslationEngine] = {}
-        for engine_name, engine_instance in self.available_engines.items():
-            if engine_name in exclude_engines:
-                continue
-            if needs_detection and not engine_instance.supports_detection:
-                continue
-            if needs_alignment and not engine_instance.supports_alignment:
-                continue
-            try:
-                engine_instance.is_language_pair_supported(
-                    from_language=from_language, to_language=to_language
-                )
-            except UnsupportedLanguagePairError:
-                continue
-            engine_candidates[engine_name] = engine_instance
-        if len(engine_candidates):
-            return _best_engine_by_language(
-                engine_candidates,
-                from_language,
-                to_language,
-                language_preferences=default_language_preferences,
-                base_ordering=default_ordering,
-            )
+        ranked = self.get_ranked(
+            needs_detection,
+            needs_alignment,
+            from_language,
+            to_language,
+            exclude_engines,
+        )
+        if ranked:
+            return ranked[0]
         raise NoValidEngineConfiguredError(
             "no configured engine could carry out the request"
         )
@@ -161,7 +471,13 @@ class EngineController:
         from_language: Optional[str],
         to_language: str,
         exclude_engines: Optional[List[str]] = None,
+        fallback: bool = False,
     ):
+        """
+        The engine named, or the best engine able to carry out the request. An engine named which can't be used - not
+        configured, degraded or with its circuit breaker open - is replaced by the best other engine if fallback is
+        allowed
+        """
         if name == BEST:
             return self.get_best(
                 needs_detection,
@@ -170,33 +486,71 @@ class EngineController:
                 to_language,
                 exclude_engines or [],
             )
-        try:
-            return self.available_engines[name]
-        except KeyError:
-            pass
-
-        try:
-            return ENGINE_NAME_MAP[name]()
-        except KeyError:
+        if name not in ENGINE_NAME_MAP and name not in self.available_engines:
             raise InvalidEngineNameError(
                 f"engine {name} not supported try one of {ENGINE_NAME_MAP.keys()}"
             )
+        if name in self.available_engines and self.breakers.available(
+            name, from_language, to_language
+        ):
+            return self.available_engines[name]
+        if fallback:
+            return self.get_best(
+                needs_detection,
+                needs_alignment,
+                from_language,
+                to_language,
+                (exclude_engines or []) + [name],
+            )
+        if name in self.available_engines:
+            raise _unavailable(name)
+        if name in self.degraded_engines:
+            raise EngineApiError(
+                f"engine {name} could not be initialized ({self.degraded_engines[name]}), it is being retried"
+            )
+        raise TranslationEngineNotConfiguredError(f"engine {name} is not configured")
+
+    def get_fallback_chain(
+        self,
+        name: str,
+        needs_detection: bool,
+        needs_alignment: bool,
+        from_language: Optional[str],
+        to_language: str,
+        fallback: bool,
+    ) -> List[BaseTranslationEngine]:
+        """
+        The engines a request could be carried out by, in the order they would be tried - the requested one and, if
+        fallback is allowed, every other engine able to carry out the request best first
+        """
+        engine = self.get_engine(
+            name,
+            needs_detection,
+            needs_alignment,
+            from_language,
+            to_language,
+            fallback=fallback,
+        )
+        if not fallback:
+            return [engine]
+        return [engine] + self.get_ranked(
+            needs_detection,
+            needs_alignment,
+            from_language,
+            to_language,
+            exclude_engines=[engine.NAME],
+        )
 
     @property
     def combined_supported_languages(self):
         if self._combined_supported_languages is not None:
             return self._combined_supported_languages
-        combined_supported_languages = {}
+        combined_rows: Dict[int, int] = defaultdict(int)
         for engine in self.available_engines.values():
-            for from_language, to_languages in engine.supported_translations.items():
-                if from_language not in combined_supported_languages:
-                    combined_supported_languages[from_language] = list(to_languages)
-                else:
-                    combined_supported_languages[from_language] = list(
-                        set(
-                            list(to_languages)
-                            + list(combined_supported_languages[from_language])
-                        )
-                    )
-        self._combined_supported_languages = combined_supported_languages
+            for from_index, to_bits in engine.language_pairs.rows.items():
+                combined_rows[from_index] |= to_bits
+        self._combined_supported_languages = {
+            language_table.code(from_index): language_table.codes(to_bits)
+            for from_index, to_bits in combined_rows.items()
+        }
         return self._combined_supported_languages
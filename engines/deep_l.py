@@ -1,10 +1,10 @@
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 from urllib.parse import urljoin
 
 import httpx
 
-from engines.base import BaseTranslationEngine
+from engines.base import PooledHttpTranslationEngine
 from errors import (
     DetectionError,
     EngineApiError,
@@ -22,12 +22,16 @@ def convert_upper_language_country_combo(lang_country_combo: str) -> str:
     return f"{split_code[0].casefold()}-{split_code[1]}"
 
 
-class DeepLEngine(BaseTranslationEngine):
+class DeepLEngine(PooledHttpTranslationEngine):
     NAME = "deepl"
     VERSION = "2"
 
     supports_detection = True
 
+    # see https://www.deepl.com/docs-api/translating-text/request/
+    max_batch_size = 50
+    max_batch_characters = 30000
+
     def __init__(self):
         settings = Settings()
         self._logger = logging.getLogger(__name__)
@@ -41,6 +45,10 @@ class DeepLEngine(BaseTranslationEngine):
 
         super().__init__()
 
+    @property
+    def warm_up_url(self) -> Optional[str]:
+        return str(self.endpoint)
+
     def handle_api_error(self, response: httpx.Response):
         # todo: use this approach of using response instead of response json for other engines
         if response.status_code >= 500:
@@ -61,6 +69,7 @@ class DeepLEngine(BaseTranslationEngine):
             languages_supported_url,
             params={"auth_key": self.auth_key},
             headers={"User-Agent": "MultiTranslate", "Accept": "*/*"},
+            timeout=Settings().engine_init_timeout_seconds,
         )
         self.handle_api_error(response)
         response_json = response.json()
@@ -78,44 +87,77 @@ class DeepLEngine(BaseTranslationEngine):
         to_language: str,
         with_alignment: Optional[bool] = False,
     ) -> TranslationResponse:
-        await super().translate(
-            source_text=source_text,
+        (result,) = await self.translate_batch(
+            source_texts=[source_text],
             to_language=to_language,
             from_language=from_language,
             with_alignment=with_alignment,
         )
+        return result
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                urljoin(str(self.endpoint), "translate"),
-                data={
-                    "text": source_text,
-                    "target_lang": to_language,
-                    "auth_key": self.auth_key,
-                    **({"source_lang": from_language} if from_language else {}),
-                },
-                headers={"User-Agent": "MultiTranslate"},
-            )
+    async def translate_texts(
+        self,
+        source_texts: List[str],
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: Optional[bool] = False,
+    ) -> List[TranslationResponse]:
+        response = await self.client.post(
+            urljoin(str(self.endpoint), "translate"),
+            data={
+                # sent as repeated text parameters
+                "text": source_texts,
+                "target_lang": to_language,
+                "auth_key": self.auth_key,
+                **({"source_lang": from_language} if from_language else {}),
+            },
+            headers={"User-Agent": "MultiTranslate"},
+        )
         self.handle_api_error(response)
         response_json = response.json()
         self._logger.debug("%s got response: %s", self.name_ver, response_json)
 
+        try:
+            translations = response_json["translations"]
+        except KeyError as e:
+            raise TranslationError(
+                f"{self.name_ver} engine could not translate the given text"
+            ) from e
+        if len(translations) != len(source_texts):
+            raise TranslationError(
+                f"{self.name_ver} engine returned {len(translations)} results for {len(source_texts)} texts"
+            )
+        return [
+            self.parse_translation(
+                translation,
+                source_text=source_text,
+                from_language=from_language,
+                to_language=to_language,
+            )
+            for source_text, translation in zip(source_texts, translations)
+        ]
+
+    def parse_translation(
+        self,
+        translation: Dict,
+        source_text: str,
+        from_language: Optional[str],
+        to_language: str,
+    ) -> TranslationResponse:
         detected_language = None
         if from_language is None:
             try:
                 detected_language = convert_upper_language_country_combo(
-                    lang_country_combo=response_json["translations"][0][
-                        "detected_source_language"
-                    ]
+                    lang_country_combo=translation["detected_source_language"]
                 )
-            except (KeyError, IndexError) as e:
+            except KeyError as e:
                 raise DetectionError(
                     f"{self.name_ver} engine could not detect which language the source text is in"
                 ) from e
 
         try:
-            translated_text = response_json["translations"][0]["text"]
-        except AttributeError as e:
+            translated_text = translation["text"]
+        except KeyError as e:
             raise TranslationError(
                 f"{self.name_ver} engine could not translate the given text"
             ) from e
@@ -3,7 +3,7 @@ import logging
 from pathlib import Path
 from typing import Dict, List, Optional
 
-from engines.base import BaseTranslationEngine
+from engines.base import ThreadedTranslationEngine
 from errors import (
     AlignmentNotSupportedError,
     DetectionError,
@@ -38,16 +38,21 @@ def bcp_47_to_iso_639(bcp_47_code: str):
     )
 
 
-class GoogleEngine(BaseTranslationEngine):
+class GoogleEngine(ThreadedTranslationEngine):
     NAME = "google"
     VERSION = "3"
 
     supports_detection = True
 
+    # see https://cloud.google.com/translate/quotas#content
+    max_batch_size = 1024
+    max_batch_characters = 30000
+
     def __init__(self):
         settings = Settings()
         self._logger = logging.getLogger(__name__)
         self._logger.setLevel(settings.log_level.value)
+        self.max_workers = settings.google_max_workers
         # todo: use endpoint with client options kwarg in initialization of client
         self.endpoint = settings.google_endpoint
         if settings.google_svc_account_json_path is None:
@@ -75,7 +80,7 @@ class GoogleEngine(BaseTranslationEngine):
     def get_supported_translations(self) -> Dict[str, List[str]]:
         try:
             supported_languages: SupportedLanguages = self.client.get_supported_languages(
-                parent=self.parent
+                parent=self.parent, timeout=Settings().engine_init_timeout_seconds
             )
         except GoogleAPICallError as e:
             raise EngineApiError(
@@ -93,16 +98,26 @@ class GoogleEngine(BaseTranslationEngine):
         from_language: Optional[str] = None,
         with_alignment: Optional[bool] = False,
     ) -> TranslationResponse:
-        await super().translate(
-            source_text=source_text,
+        (result,) = await self.translate_batch(
+            source_texts=[source_text],
             to_language=to_language,
             from_language=from_language,
             with_alignment=with_alignment,
         )
+        return result
+
+    async def translate_texts(
+        self,
+        source_texts: List[str],
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: Optional[bool] = False,
+    ) -> List[TranslationResponse]:
         # todo: support other mime types
         try:
-            translated_text: TranslateTextResponse = self.client.translate_text(
-                contents=[source_text],
+            translated_text: TranslateTextResponse = await self.run_blocking(
+                self.client.translate_text,
+                contents=source_texts,
                 target_language_code=to_language,
                 source_language_code=from_language,
                 parent=self.parent,
@@ -113,7 +128,27 @@ class GoogleEngine(BaseTranslationEngine):
                 f"{self.name_ver} had a problem making translate api request"
             ) from e
         translations: List[Translation] = translated_text.translations
-        translation = translations[0]
+        if len(translations) != len(source_texts):
+            raise TranslationError(
+                f"{self.name_ver} engine returned {len(translations)} results for {len(source_texts)} texts"
+            )
+        return [
+            self.parse_translation(
+                translation,
+                source_text=source_text,
+                from_language=from_language,
+                to_language=to_language,
+            )
+            for source_text, translation in zip(source_texts, translations)
+        ]
+
+    def parse_translation(
+        self,
+        translation: Translation,
+        source_text: str,
+        from_language: Optional[str],
+        to_language: str,
+    ) -> TranslationResponse:
         self._logger.debug("%s got response: %s", self.name_ver, translation)
 
         detected_language_confidence = detected_language = None
@@ -0,0 +1,236 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from engines.base import BaseTranslationEngine
+from errors import (
+    AlignmentNotSupportedError,
+    DetectionNotSupportedError,
+    InvalidISO6391CodeError,
+    UnsupportedLanguagePairError,
+)
+
+
+# errors in the request rather than the engine, which say nothing about the engine's health
+REQUEST_ERRORS = (
+    AlignmentNotSupportedError,
+    DetectionNotSupportedError,
+    InvalidISO6391CodeError,
+    UnsupportedLanguagePairError,
+)
+# engine name, from language, to language
+PairKey = Tuple[str, Optional[str], str]
+
+
+class CallStats:
+    """
+    Latency and errors of the calls made to an engine over the last window_seconds - an exponentially weighted moving
+    average and 95th percentile of the latency of successful calls, and the proportion of calls which failed
+    """
+
+    def __init__(
+        self, window_seconds: float, max_samples: int = 1000, ewma_weight: float = 0.2
+    ):
+        self.window_seconds = window_seconds
+        self.ewma_weight = ewma_weight
+        self.ewma_seconds: Optional[float] = None
+        # when, latency (None for calls which failed or weren't timed) and whether the call failed
+        self._samples: Deque[Tuple[float, Optional[float], bool]] = deque(
+            maxlen=max_samples
+        )
+
+    def record(self, now: float, seconds: Optional[float], failed: bool) -> None:
+        self._samples.append((now, None if failed else seconds, failed))
+        if seconds is not None and not failed:
+            self.ewma_seconds = (
+                seconds
+                if self.ewma_seconds is None
+                else self.ewma_weight * seconds
+                + (1 - self.ewma_weight) * self.ewma_seconds
+            )
+
+    def latencies(self, now: float) -> List[float]:
+        """The latencies of the successful timed calls in the window, sorted"""
+        while self._samples and self._samples[0][0] < now - self.window_seconds:
+            self._samples.popleft()
+        return sorted(seconds for _, seconds, _ in self._samples if seconds is not None)
+
+    def summary(self, now: float) -> Dict[str, Any]:
+        latencies = self.latencies(now)
+        if not latencies:
+            # an old average would otherwise keep an engine which has since recovered demoted
+            self.ewma_seconds = None
+        failures = sum(failed for _, _, failed in self._samples)
+        return {
+            "calls": len(self._samples),
+            "error_rate": failures / len(self._samples) if self._samples else None,
+            "ewma_seconds": self.ewma_seconds,
+            "p95_seconds": latencies[int(len(latencies) * 0.95)] if latencies else None,
+        }
+
+
+class EngineHealthTracker:
+    """
+    Keeps rolling call statistics for each engine and each engine and language pair, used by best routing to demote
+    engines outside any of the thresholds to the end of the preference order. An engine is judged on its calls for
+    the language pair once there have been min_samples of them, otherwise on all of its calls. Statistics only cover
+    the last window_seconds, so a demoted engine which is no longer called is routed to again once its calls age out
+    """
+
+    # how long a verdict is reused for, so percentiles aren't recomputed on every request
+    VERDICT_TTL_SECONDS = 1.0
+
+    def __init__(
+        self,
+        max_ewma_seconds: Optional[float],
+        max_p95_seconds: Optional[float],
+        max_error_rate: Optional[float],
+        min_samples: int,
+        window_seconds: float,
+    ):
+        self.max_ewma_seconds = max_ewma_seconds
+        self.max_p95_seconds = max_p95_seconds
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.window_seconds = window_seconds
+        self._engines: Dict[str, CallStats] = {}
+        self._pairs: Dict[PairKey, CallStats] = {}
+        self._verdicts: Dict[PairKey, Tuple[float, Optional[str]]] = {}
+        self._percentiles: Dict[PairKey, Tuple[float, Optional[float]]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return any(
+            threshold is not None
+            for threshold in (
+                self.max_ewma_seconds,
+                self.max_p95_seconds,
+                self.max_error_rate,
+            )
+        )
+
+    def record(
+        self,
+        engine_name: str,
+        from_language: Optional[str],
+        to_language: str,
+        seconds: Optional[float],
+        failed: bool,
+    ) -> None:
+        now = time.monotonic()
+        pair = (engine_name, from_language, to_language)
+        if engine_name not in self._engines:
+            self._engines[engine_name] = CallStats(self.window_seconds)
+        if pair not in self._pairs:
+            self._pairs[pair] = CallStats(self.window_seconds)
+        self._engines[engine_name].record(now, seconds, failed)
+        self._pairs[pair].record(now, seconds, failed)
+
+    def demotion_reason(
+        self, engine_name: str, from_language: Optional[str], to_language: str
+    ) -> Optional[str]:
+        """Why the engine is currently outside the thresholds for the language pair, or None if it isn't"""
+        now = time.monotonic()
+        pair = (engine_name, from_language, to_language)
+        verdict = self._verdicts.get(pair)
+        if verdict is not None and now - verdict[0] < self.VERDICT_TTL_SECONDS:
+            return verdict[1]
+
+        reason = None
+        for stats in (self._pairs.get(pair), self._engines.get(engine_name)):
+            if stats is None:
+                continue
+            summary = stats.summary(now)
+            if summary["calls"] >= self.min_samples:
+                reason = self._violation(summary)
+                break
+        self._verdicts[pair] = (now, reason)
+        return reason
+
+    def latency_percentile(
+        self,
+        engine_name: str,
+        from_language: Optional[str],
+        to_language: str,
+        percentile: float,
+    ) -> Optional[float]:
+        """
+        The percentile of the engine's recent successful call latencies for the language pair, or None until there
+        have been min_samples of them
+        """
+        now = time.monotonic()
+        pair = (engine_name, from_language, to_language)
+        cached = self._percentiles.get(pair)
+        if cached is not None and now - cached[0] < self.VERDICT_TTL_SECONDS:
+            return cached[1]
+        stats = self._pairs.get(pair)
+        latencies = [] if stats is None else stats.latencies(now)
+        latency = (
+            latencies[min(int(len(latencies) * percentile), len(latencies) - 1)]
+            if len(latencies) >= self.min_samples
+            else None
+        )
+        self._percentiles[pair] = (now, latency)
+        return latency
+
+    def _violation(self, summary: Dict[str, Any]) -> Optional[str]:
+        if (
+            self.max_error_rate is not None
+            and summary["error_rate"] > self.max_error_rate
+        ):
+            return f"error rate {summary['error_rate']:.0%} is over {self.max_error_rate:.0%}"
+        if (
+            self.max_ewma_seconds is not None
+            and summary["ewma_seconds"] is not None
+            and summary["ewma_seconds"] > self.max_ewma_seconds
+        ):
+            return f"average latency {summary['ewma_seconds']:.3f}s is over {self.max_ewma_seconds}s"
+        if (
+            self.max_p95_seconds is not None
+            and summary["p95_seconds"] is not None
+            and summary["p95_seconds"] > self.max_p95_seconds
+        ):
+            return f"p95 latency {summary['p95_seconds']:.3f}s is over {self.max_p95_seconds}s"
+        return None
+
+    def rank(
+        self,
+        engines: List[BaseTranslationEngine],
+        from_language: Optional[str],
+        to_language: str,
+    ) -> Tuple[List[BaseTranslationEngine], Dict[str, str]]:
+        """
+        The engines, which are in order of preference, with those outside the thresholds moved to the end (still in
+        order of preference) along with the reasons they were
+        """
+        demoted: Dict[str, str] = {}
+        for engine in engines:
+            reason = self.demotion_reason(engine.NAME, from_language, to_language)
+            if reason is not None:
+                demoted[engine.NAME] = reason
+        if not demoted:
+            return engines, demoted
+        return (
+            [engine for engine in engines if engine.NAME not in demoted]
+            + [engine for engine in engines if engine.NAME in demoted],
+            demoted,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "engines": {
+                engine_name: stats.summary(now)
+                for engine_name, stats in self._engines.items()
+            },
+            "pairs": {
+                f"{engine_name} {from_language or 'detected'}-{to_language}": stats.summary(
+                    now
+                )
+                for (
+                    engine_name,
+                    from_language,
+                    to_language,
+                ), stats in self._pairs.items()
+            },
+        }
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+def _ignore_outcome(task: asyncio.Future) -> None:
+    # the outcome of a call which lost the race isn't used, retrieving its exception keeps it from being logged
+    if not task.cancelled():
+        task.exception()
+
+
+class Hedger:
+    """
+    Races a slow upstream call against a second one - if the first call hasn't completed within the delay it is given
+    (e.g. a high percentile of the engine's recent latency), the same request is also sent to another engine and
+    whichever succeeds first is used, the other being cancelled.
+
+    Hedging is limited to max_fraction of calls by a budget which every call adds max_fraction to (up to burst) and
+    every hedge spends one of
+    """
+
+    def __init__(self, max_fraction: float, burst: float = 10.0):
+        self.max_fraction = max_fraction
+        self.burst = burst
+        self._budget = burst
+        self._logger = logging.getLogger(__name__)
+        self._stats = {
+            "requests": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "over_budget": 0,
+        }
+
+    async def race(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        hedge: Callable[[], Awaitable[T]],
+        delay: Optional[float],
+    ) -> Tuple[T, bool]:
+        """
+        The result of the first of the calls to succeed, and whether it was the hedge. A delay of None means the call
+        isn't hedged. If every call made fails, the primary's exception is raised
+        """
+        self._stats["requests"] += 1
+        self._budget = min(self.burst, self._budget + self.max_fraction)
+        primary_task = asyncio.ensure_future(primary())
+        if delay is None:
+            return await primary_task, False
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        except asyncio.CancelledError:
+            primary_task.cancel()
+            raise
+        if done:
+            return primary_task.result(), False
+        if self._budget < 1:
+            self._stats["over_budget"] += 1
+            return await primary_task, False
+
+        self._budget -= 1
+        self._stats["hedged"] += 1
+        self._logger.debug("hedging a call which has taken over %ss", delay)
+        hedge_task = asyncio.ensure_future(hedge())
+        pending = {primary_task, hedge_task}
+        winner: Optional[asyncio.Future] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in (primary_task, hedge_task):
+                    if task in done and task.exception() is None:
+                        winner = task
+                        won = task is hedge_task
+                        if won:
+                            self._stats["hedge_wins"] += 1
+                        return task.result(), won
+        finally:
+            for task in (primary_task, hedge_task):
+                if task is not winner:
+                    task.cancel()
+                    task.add_done_callback(_ignore_outcome)
+        raise primary_task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self._stats["requests"]
+        return {
+            **self._stats,
+            "hedge_rate": self._stats["hedged"] / requests if requests else None,
+            "hedge_win_rate": self._stats["hedge_wins"] / self._stats["hedged"]
+            if self._stats["hedged"]
+            else None,
+        }
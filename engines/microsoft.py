@@ -5,7 +5,7 @@ from urllib.parse import urljoin
 
 import httpx
 
-from engines.base import BaseTranslationEngine
+from engines.base import PooledHttpTranslationEngine
 from errors import (
     AlignmentError,
     AlignmentNotSupportedError,
@@ -67,13 +67,17 @@ def _is_alignment_supported(to_language: str, from_language: Optional[str]):
     return False
 
 
-class MicrosoftEngine(BaseTranslationEngine):
+class MicrosoftEngine(PooledHttpTranslationEngine):
     NAME = "microsoft"
     VERSION = "3.0"
 
     supports_alignment = True
     supports_detection = True
 
+    # see https://docs.microsoft.com/en-us/azure/cognitive-services/translator/reference/v3-0-translate#request-body
+    max_batch_size = 100
+    max_batch_characters = 10000
+
     def __init__(self):
         settings = Settings()
         self._logger = logging.getLogger(__name__)
@@ -92,6 +96,10 @@ class MicrosoftEngine(BaseTranslationEngine):
         self.virtual_network_on = settings.microsoft_translator_using_virtual_network
         super().__init__()
 
+    @property
+    def warm_up_url(self) -> Optional[str]:
+        return None if self.endpoint is None else str(self.endpoint)
+
     def handle_api_error(self, response_json: Dict):
         if "error" in response_json:
             raise EngineApiError(
@@ -103,24 +111,22 @@ class MicrosoftEngine(BaseTranslationEngine):
         response = httpx.get(
             urljoin("https://api.cognitive.microsofttranslator.com/", "languages"),
             params={"api-version": self.VERSION},
+            timeout=Settings().engine_init_timeout_seconds,
         )
         response_json = response.json()
         self.handle_api_error(response_json)
         all_translations = response_json["translation"].keys()
         return {c: all_translations for c in all_translations}
 
-    async def translate(
+    def check_request(
         self,
-        source_text: str,
+        from_language: Optional[str],
         to_language: str,
-        from_language: Optional[str] = None,
         with_alignment: Optional[bool] = False,
-    ) -> TranslationResponse:
-        # todo: handle lists of source text
-        await super().translate(
-            source_text=source_text,
-            to_language=to_language,
+    ):
+        super().check_request(
             from_language=from_language,
+            to_language=to_language,
             with_alignment=with_alignment,
         )
         if with_alignment:
@@ -138,6 +144,29 @@ class MicrosoftEngine(BaseTranslationEngine):
                     from_language,
                     to_language,
                 )
+
+    async def translate(
+        self,
+        source_text: str,
+        to_language: str,
+        from_language: Optional[str] = None,
+        with_alignment: Optional[bool] = False,
+    ) -> TranslationResponse:
+        (result,) = await self.translate_batch(
+            source_texts=[source_text],
+            to_language=to_language,
+            from_language=from_language,
+            with_alignment=with_alignment,
+        )
+        return result
+
+    async def translate_texts(
+        self,
+        source_texts: List[str],
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: Optional[bool] = False,
+    ) -> List[TranslationResponse]:
         from_dict = {} if from_language is None else {"from": from_language}
         alignment_dict = {"includeAlignment": str(with_alignment).casefold()}
         translate_url = urljoin(
@@ -148,43 +177,62 @@ class MicrosoftEngine(BaseTranslationEngine):
         )
         self._logger.debug("making request to %s", translate_url)
 
-        async with httpx.AsyncClient() as client:
-
-            response = await client.post(
-                translate_url,
-                json=[{"text": source_text}],
-                params={
-                    "api-version": self.VERSION,
-                    "to": to_language,
-                    **from_dict,
-                    **alignment_dict,
-                },
-                headers={
-                    "Ocp-Apim-Subscription-Key": self.subscription_key,
-                    "Content-type": "application/json",
-                    "X-ClientTraceId": str(uuid.uuid4()),
-                    **self.region_headers,
-                },
-            )
+        response = await self.client.post(
+            translate_url,
+            json=[{"text": source_text} for source_text in source_texts],
+            params={
+                "api-version": self.VERSION,
+                "to": to_language,
+                **from_dict,
+                **alignment_dict,
+            },
+            headers={
+                "Ocp-Apim-Subscription-Key": self.subscription_key,
+                "Content-type": "application/json",
+                "X-ClientTraceId": str(uuid.uuid4()),
+                **self.region_headers,
+            },
+        )
         response_json = response.json()
         self._logger.debug("%s got response: %s", self.name_ver, response_json)
         self.handle_api_error(response_json)
 
+        if len(response_json) != len(source_texts):
+            raise TranslationError(
+                f"{self.name_ver} engine returned {len(response_json)} results for {len(source_texts)} texts"
+            )
+        return [
+            self.parse_result(
+                result_json,
+                source_text=source_text,
+                from_language=from_language,
+                to_language=to_language,
+                with_alignment=with_alignment,
+            )
+            for source_text, result_json in zip(source_texts, response_json)
+        ]
+
+    def parse_result(
+        self,
+        result_json: Dict,
+        source_text: str,
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: Optional[bool],
+    ) -> TranslationResponse:
         detected_language_confidence = detected_language = None
 
         if from_language is None:
             try:
-                detected_language = response_json[0]["detectedLanguage"]["language"]
-                detected_language_confidence = response_json[0]["detectedLanguage"][
-                    "score"
-                ]
+                detected_language = result_json["detectedLanguage"]["language"]
+                detected_language_confidence = result_json["detectedLanguage"]["score"]
             except KeyError as e:
                 raise DetectionError(
                     f"{self.name_ver} engine could not detect which language the source text is in"
                 ) from e
 
         try:
-            translated_text = response_json[0]["translations"][0]["text"]
+            translated_text = result_json["translations"][0]["text"]
         except (KeyError, IndexError) as e:
             raise TranslationError(
                 f"{self.name_ver} engine could not translate the given text"
@@ -194,7 +242,7 @@ class MicrosoftEngine(BaseTranslationEngine):
         if with_alignment:
 
             try:
-                alignment_raw = response_json[0]["translations"][0]["alignment"]
+                alignment_raw = result_json["translations"][0]["alignment"]
             except KeyError:
                 raise AlignmentError(
                     f"{self.name_ver} engine could not retrieve alignment information"
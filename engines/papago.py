@@ -1,9 +1,7 @@
 import logging
 from typing import Dict, Optional
 
-import httpx
-
-from engines.base import BaseTranslationEngine
+from engines.base import PooledHttpTranslationEngine
 from errors import (
     EngineApiError,
     TranslationEngineNotConfiguredError,
@@ -13,7 +11,7 @@ from models.response import TranslationResponse
 from settings import Settings
 
 
-class PapagoEngine(BaseTranslationEngine):
+class PapagoEngine(PooledHttpTranslationEngine):
     NAME = "papago"
     VERSION = "1"
 
@@ -39,6 +37,10 @@ class PapagoEngine(BaseTranslationEngine):
         self.endpoint = settings.papago_endpoint
         super().__init__()
 
+    @property
+    def warm_up_url(self) -> Optional[str]:
+        return str(self.endpoint)
+
     def get_supported_translations(self):
         #
         """
@@ -113,16 +115,11 @@ class PapagoEngine(BaseTranslationEngine):
             from_language=from_language,
             with_alignment=with_alignment,
         )
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.endpoint,
-                json={
-                    "text": source_text,
-                    "source": from_language,
-                    "target": to_language,
-                },
-                headers={**self.headers, "Content-type": "application/json",},
-            )
+        response = await self.client.post(
+            self.endpoint,
+            json={"text": source_text, "source": from_language, "target": to_language,},
+            headers={**self.headers, "Content-type": "application/json",},
+        )
         response_json = response.json()
         self._logger.debug("%s got response: %s", self.name_ver, response_json)
         self.handle_api_error(response_json)
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+import pytest
+
+from engines.base import BaseTranslationEngine, ThreadedTranslationEngine
+from errors import UnsupportedLanguagePairError
+from models.response import TranslationResponse
+
+
+class FakeThreadedEngine(ThreadedTranslationEngine):
+    NAME = "fake"
+    max_workers = 2
+
+    def get_supported_translations(self):
+        return {"en": ["es"]}
+
+
+def test_run_blocking_does_not_block_the_event_loop():
+    engine = FakeThreadedEngine()
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker_task = asyncio.ensure_future(ticker())
+        result = await engine.run_blocking(lambda: time.sleep(0.2) or "done")
+        ticker_task.cancel()
+        await engine.shutdown()
+        return result, ticks
+
+    result, ticks = asyncio.run(run())
+
+    assert result == "done"
+    assert ticks > 5
+    assert engine.stats()["calls"] == 1
+    assert engine.stats()["in_flight"] == 0
+
+
+def test_run_blocking_propagates_exceptions():
+    engine = FakeThreadedEngine()
+
+    def fail():
+        raise ValueError("upstream problem")
+
+    async def run():
+        try:
+            await engine.run_blocking(fail)
+        finally:
+            await engine.shutdown()
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert engine.stats()["in_flight"] == 0
+
+
+class FakeBatchEngine(BaseTranslationEngine):
+    NAME = "fakebatch"
+    max_batch_size = 3
+    max_batch_characters = 10
+
+    def __init__(self):
+        self.requests = []
+        super().__init__()
+
+    def get_supported_translations(self):
+        return {"en": ["es"]}
+
+    async def translate_texts(
+        self, source_texts, from_language, to_language, with_alignment=False
+    ):
+        self.requests.append(source_texts)
+        return [
+            TranslationResponse(
+                engine=self.NAME,
+                engine_version=self.VERSION,
+                source_text=source_text,
+                from_language=from_language,
+                to_language=to_language,
+                detected_language_confidence=None,
+                translated_text=source_text.upper(),
+                alignment=None,
+            )
+            for source_text in source_texts
+        ]
+
+
+def test_batches_respects_size_and_character_limits():
+    engine = FakeBatchEngine()
+    texts = ["a", "b", "c", "d", "eeeeeeeee", "ffffffffffff", "g"]
+    assert list(engine.batches(texts)) == [
+        ["a", "b", "c"],
+        ["d", "eeeeeeeee"],
+        ["ffffffffffff"],
+        ["g"],
+    ]
+
+
+def test_translate_batch_returns_results_in_order():
+    engine = FakeBatchEngine()
+    texts = ["one", "two", "three", "four"]
+    results = asyncio.run(
+        engine.translate_batch(texts, from_language="en", to_language="es")
+    )
+
+    assert [r.translated_text for r in results] == ["ONE", "TWO", "THREE", "FOUR"]
+    assert engine.requests == [["one", "two"], ["three", "four"]]
+
+
+def test_translate_batch_checks_the_language_pair():
+    engine = FakeBatchEngine()
+    with pytest.raises(UnsupportedLanguagePairError):
+        asyncio.run(
+            engine.translate_batch(["one"], from_language="es", to_language="en")
+        )
+
+
+class CountingEngine(BaseTranslationEngine):
+    NAME = "counting"
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        super().__init__()
+
+    def get_supported_translations(self):
+        return {"en": ["es"]}
+
+    async def translate(
+        self, source_text, from_language, to_language, with_alignment=False
+    ):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return source_text.upper()
+
+
+def test_translate_batch_bounds_concurrent_upstream_requests(monkeypatch):
+    monkeypatch.setenv("ENGINE_MAX_CONCURRENT_REQUESTS", "3")
+    engine = CountingEngine()
+
+    async def run():
+        # two batches at once share the engine's bound
+        return await asyncio.gather(
+            engine.translate_batch(
+                [f"a{i}" for i in range(10)], from_language="en", to_language="es"
+            ),
+            engine.translate_batch(
+                [f"b{i}" for i in range(10)], from_language="en", to_language="es"
+            ),
+        )
+
+    first, second = asyncio.run(run())
+
+    assert first == [f"A{i}" for i in range(10)]
+    assert second == [f"B{i}" for i in range(10)]
+    assert engine.max_in_flight == 3
@@ -0,0 +1,65 @@
+import sys
+import threading
+
+from engines.capabilities import LanguagePairMatrix, LanguageTable, iter_bits
+
+
+def test_iter_bits():
+    assert list(iter_bits(0)) == []
+    assert list(iter_bits(0b101001)) == [0, 3, 5]
+
+
+def test_language_pair_matrix_supports():
+    table = LanguageTable()
+    to_languages = ["en", "es", "zh-TW"]
+    matrix = LanguagePairMatrix.from_translations(
+        {"en": to_languages, "zh-TW": to_languages, "fr": ["en"]}, table
+    )
+
+    assert matrix.supports("en", "zh-TW")
+    assert matrix.supports("zh-TW", "es")
+    assert matrix.supports("fr", "en")
+    assert not matrix.supports("fr", "es")
+    # languages no engine has ever mentioned
+    assert not matrix.supports("xx", "en")
+    assert not matrix.supports("en", "xx")
+    # from language detected
+    assert matrix.supports(None, "zh-TW")
+    assert not matrix.supports(None, "fr")
+
+
+def test_language_pair_matrix_shares_table():
+    table = LanguageTable()
+    first = LanguagePairMatrix.from_translations({"en": ["es"]}, table)
+    second = LanguagePairMatrix.from_translations({"es": ["en", "de"]}, table)
+
+    assert first.rows == {table.index("en"): 1 << table.index("es")}
+    assert second.as_dict() == {"es": ["en", "de"]}
+    assert first.as_dict() == {"en": ["es"]}
+
+
+def test_language_table_interns_concurrently():
+    # engines are constructed in executor threads, each interning the codes it supports
+    codes = [f"l{number}" for number in range(200)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(20):
+            table = LanguageTable()
+            barrier = threading.Barrier(6)
+
+            def intern_all():
+                barrier.wait()
+                for code in codes:
+                    table.intern(code)
+
+            threads = [threading.Thread(target=intern_all) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert sorted(table.index(code) for code in codes) == list(range(200))
+            assert [table.code(table.index(code)) for code in codes] == codes
+    finally:
+        sys.setswitchinterval(switch_interval)
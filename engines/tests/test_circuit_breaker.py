@@ -0,0 +1,194 @@
+import pytest
+
+from engines.circuit_breaker import CircuitBreaker, CircuitBreakers, CircuitState
+from engines.controller import BEST
+from engines.tests.test_controller import fake_controller
+from errors import EngineApiError, EngineUnavailableError
+
+
+def breaker(**settings) -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_rate=settings.get("failure_rate", 0.5),
+        min_calls=settings.get("min_calls", 4),
+        window_seconds=10.0,
+        open_seconds=30.0,
+        slow_call_seconds=settings.get("slow_call_seconds"),
+    )
+
+
+def breakers(**settings) -> CircuitBreakers:
+    return CircuitBreakers(
+        failure_rate=settings.get("failure_rate", 0.5),
+        min_calls=settings.get("min_calls", 2),
+        window_seconds=10.0,
+        open_seconds=30.0,
+        slow_call_seconds=None,
+        per_language_pair=settings.get("per_language_pair", False),
+    )
+
+
+def test_opens_at_the_failure_rate_once_there_are_enough_calls():
+    circuit = breaker()
+    assert circuit.record(0, None, failed=True) is None
+    assert circuit.record(0, None, failed=True) is None
+    assert circuit.record(0, 0.1, failed=False) is None
+    assert circuit.record(0, None, failed=True) == CircuitState.OPEN
+    assert not circuit.available(29)
+    assert not circuit.acquire(29)
+
+
+def test_failures_age_out_of_the_window():
+    circuit = breaker()
+    for _ in range(3):
+        circuit.record(0, None, failed=True)
+    assert circuit.record(11, None, failed=True) is None
+    assert circuit.available(11)
+
+
+def test_slow_calls_count_as_failures():
+    circuit = breaker(min_calls=2, slow_call_seconds=1.0)
+    circuit.record(0, 0.5, failed=False)
+    assert circuit.record(0, 2.0, failed=False) == CircuitState.OPEN
+
+
+def test_checking_availability_does_not_claim_the_probe():
+    circuit = breaker(min_calls=1)
+    circuit.record(0, None, failed=True)
+    for _ in range(3):
+        assert circuit.available(30)
+    assert circuit.state == CircuitState.OPEN
+    assert circuit.acquire(30)
+    assert circuit.state == CircuitState.HALF_OPEN
+    assert not circuit.available(31)
+
+
+def test_half_open_allows_a_single_probe():
+    circuit = breaker(min_calls=1)
+    circuit.record(0, None, failed=True)
+    assert circuit.acquire(30)
+    assert not circuit.acquire(31)
+    assert circuit.record(31, None, failed=True) == CircuitState.OPEN
+    assert not circuit.acquire(60)
+
+    assert circuit.acquire(61)
+    assert circuit.record(61, 0.1, failed=False) == CircuitState.CLOSED
+    assert circuit.acquire(61)
+
+
+def test_probe_which_never_reports_back_is_retried():
+    circuit = breaker(min_calls=1)
+    circuit.record(0, None, failed=True)
+    assert circuit.acquire(30)
+    assert not circuit.acquire(59)
+    assert circuit.acquire(60)
+
+
+def test_released_probe_can_be_claimed_again():
+    circuit = breaker(min_calls=1)
+    circuit.record(0, None, failed=True)
+    assert circuit.acquire(30)
+    circuit.release()
+    assert circuit.acquire(31)
+
+
+def test_keyed_by_language_pair():
+    circuits = breakers(per_language_pair=True)
+    for _ in range(2):
+        circuits.record("first", "en", "es", None, failed=True)
+    assert not circuits.available("first", "en", "es")
+    assert circuits.available("first", "en", "fr")
+    assert circuits.available("second", "en", "es")
+    assert list(circuits.stats()["breakers"]) == ["first:en:es"]
+
+
+def test_state_changes_are_reported():
+    changes = []
+    circuits = breakers(min_calls=1)
+    circuits.on_state_change = lambda key, open_until: changes.append(
+        (key, open_until is None)
+    )
+    circuits.record("first", "en", "es", None, failed=True)
+    circuits._breakers["first"].open_until = 0
+    assert circuits.acquire("first", "en", "es")
+    circuits.record("first", "en", "es", 0.1, failed=False)
+    assert changes == [("first", False), ("first", True)]
+
+
+def test_open_shared():
+    circuits = breakers()
+    assert not circuits.open_shared("first", 0)
+    assert circuits.available("first", "en", "es")
+    assert circuits.open_shared("first", 2e9)
+    assert not circuits.open_shared("first", 1e9)
+    assert not circuits.available("first", "en", "es")
+
+
+def open_first(controller):
+    controller.breakers = breakers()
+    for _ in range(2):
+        with pytest.raises(EngineApiError):
+            with controller.measure("first", "en", "es"):
+                raise EngineApiError("unavailable")
+
+
+def test_open_engines_are_skipped_by_best_routing():
+    controller = fake_controller()
+    open_first(controller)
+    best = controller.get_best(
+        needs_detection=False,
+        needs_alignment=False,
+        from_language="en",
+        to_language="es",
+        exclude_engines=[],
+    )
+    assert best.NAME == "second"
+
+
+def test_open_engine_asked_for_by_name():
+    controller = fake_controller()
+    open_first(controller)
+    with pytest.raises(EngineUnavailableError):
+        controller.get_engine(
+            "first",
+            needs_detection=False,
+            needs_alignment=False,
+            from_language="en",
+            to_language="es",
+        )
+    chain = controller.get_fallback_chain(
+        name="first",
+        needs_detection=False,
+        needs_alignment=False,
+        from_language="en",
+        to_language="es",
+        fallback=True,
+    )
+    assert [e.NAME for e in chain] == ["second"]
+
+
+def test_half_open_engine_is_probed_and_recovers():
+    controller = fake_controller()
+    open_first(controller)
+    controller.breakers._breakers["first"].open_until = 0
+
+    def rank():
+        return controller.get_fallback_chain(
+            name=BEST,
+            needs_detection=False,
+            needs_alignment=False,
+            from_language="en",
+            to_language="es",
+            fallback=True,
+        )
+
+    # routing (e.g. of requests served from the cache) doesn't use up the probe
+    for _ in range(3):
+        assert [e.NAME for e in rank()] == ["first", "second"]
+    with controller.measure("first", "en", "es"):
+        # the probe is in flight
+        assert [e.NAME for e in rank()] == ["second"]
+        with pytest.raises(EngineUnavailableError):
+            with controller.measure("first", "en", "es"):
+                pass
+    assert controller.breakers._breakers["first"].state == CircuitState.CLOSED
+    assert [e.NAME for e in rank()] == ["first", "second"]
@@ -0,0 +1,128 @@
+import asyncio
+
+from engines.coalescer import TranslationCoalescer
+from engines.tests.test_base import FakeBatchEngine
+from errors import EngineApiError
+
+
+class FailingBatchEngine(FakeBatchEngine):
+    async def translate(
+        self, source_text, from_language, to_language, with_alignment=False
+    ):
+        (result,) = await self.translate_texts(
+            [source_text], from_language, to_language, with_alignment
+        )
+        return result
+
+    async def translate_texts(
+        self, source_texts, from_language, to_language, with_alignment=False
+    ):
+        self.requests.append(source_texts)
+        raise EngineApiError("upstream is down")
+
+
+class BadTextEngine(FailingBatchEngine):
+    """Fails any request including the text "bad", as an api rejecting a single invalid text would"""
+
+    async def translate_texts(
+        self, source_texts, from_language, to_language, with_alignment=False
+    ):
+        if "bad" in source_texts:
+            self.requests.append(source_texts)
+            raise EngineApiError("invalid text")
+        return await FakeBatchEngine.translate_texts(
+            self, source_texts, from_language, to_language, with_alignment
+        )
+
+
+def translate_concurrently(coalescer, engine, texts):
+    async def run():
+        return await asyncio.gather(
+            *(
+                coalescer.translate(
+                    engine, source_text=text, from_language="en", to_language="es"
+                )
+                for text in texts
+            ),
+            return_exceptions=True,
+        )
+
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_are_sent_as_one_batch():
+    engine = FakeBatchEngine()
+    coalescer = TranslationCoalescer(
+        window_seconds=0.01, max_texts=50, max_characters=1000
+    )
+
+    results = translate_concurrently(coalescer, engine, ["a", "b", "a"])
+
+    assert [r.translated_text for r in results] == ["A", "B", "A"]
+    assert engine.requests == [["a", "b"]]
+    assert coalescer.stats()["upstream_batches"] == 1
+
+
+def test_batch_is_flushed_when_max_texts_reached():
+    engine = FakeBatchEngine()
+    coalescer = TranslationCoalescer(
+        window_seconds=10, max_texts=2, max_characters=1000
+    )
+
+    results = translate_concurrently(coalescer, engine, ["a", "b", "c", "d"])
+
+    assert [r.translated_text for r in results] == ["A", "B", "C", "D"]
+    assert engine.requests == [["a", "b"], ["c", "d"]]
+
+
+def test_errors_are_raised_for_every_waiting_request():
+    engine = FailingBatchEngine()
+    coalescer = TranslationCoalescer(
+        window_seconds=0.01, max_texts=50, max_characters=1000
+    )
+
+    results = translate_concurrently(coalescer, engine, ["a", "b"])
+
+    assert all(isinstance(r, EngineApiError) for r in results)
+    # the batch and then each text on its own
+    assert engine.requests == [["a", "b"], ["a"], ["b"]]
+
+
+def test_one_bad_text_only_fails_its_own_request():
+    engine = BadTextEngine()
+    coalescer = TranslationCoalescer(
+        window_seconds=0.01, max_texts=50, max_characters=1000
+    )
+
+    results = translate_concurrently(coalescer, engine, ["a", "bad", "b"])
+
+    assert isinstance(results[1], EngineApiError)
+    assert [results[i].translated_text for i in (0, 2)] == ["A", "B"]
+    assert engine.requests == [["a", "bad", "b"], ["a"], ["bad"], ["b"]]
+    assert coalescer.stats()["retried_batches"] == 1
+
+
+def test_a_failed_single_text_batch_is_not_retried():
+    engine = FailingBatchEngine()
+    coalescer = TranslationCoalescer(
+        window_seconds=0.01, max_texts=50, max_characters=1000
+    )
+
+    results = translate_concurrently(coalescer, engine, ["a", "a"])
+
+    assert all(isinstance(r, EngineApiError) for r in results)
+    assert engine.requests == [["a"]]
+    assert coalescer.stats()["retried_batches"] == 0
+
+
+def test_engines_without_batching_are_called_directly():
+    engine = FakeBatchEngine()
+    engine.max_batch_size = 1
+    coalescer = TranslationCoalescer(
+        window_seconds=0.01, max_texts=50, max_characters=1000
+    )
+
+    translate_concurrently(coalescer, engine, ["a"])
+
+    assert engine.requests == []
+    assert coalescer.stats()["requests"] == 0
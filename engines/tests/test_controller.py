@@ -1,17 +1,27 @@
+import asyncio
+import time
 from itertools import product
 
 import pytablewriter
 import pytest
 import yaml
 
+from engines.base import BaseTranslationEngine
 from engines.controller import (
     ENGINE_NAME_MAP,
+    EngineController,
     _best_engine_by_language,
     _load_language_preferences,
     default_language_preferences,
     default_ordering,
 )
-from errors import InvalidLanguagePreferencesError
+from errors import (
+    EngineApiError,
+    InvalidEngineNameError,
+    InvalidLanguagePreferencesError,
+    NoValidEngineConfiguredError,
+    TranslationEngineNotConfiguredError,
+)
 
 
 def test_load_language_preferences_with_non_existent_file():
@@ -231,3 +241,197 @@ def test_best_md_table():
     except FileNotFoundError:
         with open("default_preferred.md", "w") as f:
             writer.dump(f)
+
+
+class FakeEngine(BaseTranslationEngine):
+    def __init__(self, name, supported_translations, supports_detection=True):
+        self.NAME = name
+        self.supports_detection = supports_detection
+        self._supported_translations = supported_translations
+        super().__init__()
+
+    def get_supported_translations(self):
+        return self._supported_translations
+
+
+def fake_controller():
+    controller = EngineController()
+    controller.available_engines = {
+        "first": FakeEngine("first", {"en": ["es"]}, supports_detection=False),
+        "second": FakeEngine("second", {"en": ["es", "fr"], "fr": ["en"]}),
+    }
+    controller.set_language_preferences(
+        {"xx": {"xx": ["first", "second"]}}, ["first", "second"]
+    )
+    return controller
+
+
+def test_compiled_routes_are_in_preference_order():
+    controller = fake_controller()
+    ranked = controller.get_ranked(
+        needs_detection=False,
+        needs_alignment=False,
+        from_language="en",
+        to_language="es",
+        exclude_engines=[],
+    )
+    assert [e.NAME for e in ranked] == ["first", "second"]
+
+
+def test_compiled_routes_filter_by_capability_and_exclusions():
+    controller = fake_controller()
+    best = controller.get_best(
+        needs_detection=True,
+        needs_alignment=False,
+        from_language=None,
+        to_language="es",
+        exclude_engines=[],
+    )
+    assert best.NAME == "second"
+
+    with pytest.raises(NoValidEngineConfiguredError):
+        controller.get_best(
+            needs_detection=False,
+            needs_alignment=False,
+            from_language="en",
+            to_language="es",
+            exclude_engines=["first", "second"],
+        )
+
+
+def test_compiled_routes_are_rebuilt_when_preferences_change():
+    controller = fake_controller()
+    controller.set_language_preferences(
+        {"xx": {"xx": ["second", "first"]}}, ["second", "first"]
+    )
+    best = controller.get_best(
+        needs_detection=False,
+        needs_alignment=False,
+        from_language="en",
+        to_language="es",
+        exclude_engines=[],
+    )
+    assert best.NAME == "second"
+
+
+def test_routes_for_unsupported_pairs_are_empty():
+    controller = fake_controller()
+    assert (
+        controller.get_ranked(
+            needs_detection=False,
+            needs_alignment=False,
+            from_language="es",
+            to_language="fr",
+            exclude_engines=[],
+        )
+        == []
+    )
+
+
+class QuickEngine(BaseTranslationEngine):
+    NAME = "quick"
+
+    def get_supported_translations(self):
+        return {"en": ["es"]}
+
+
+class SlowEngine(BaseTranslationEngine):
+    NAME = "slow"
+
+    def get_supported_translations(self):
+        time.sleep(0.5)
+        return {"en": ["es"]}
+
+
+class FlakyEngine(BaseTranslationEngine):
+    NAME = "flaky"
+    attempts = 0
+
+    def get_supported_translations(self):
+        FlakyEngine.attempts += 1
+        if FlakyEngine.attempts == 1:
+            raise EngineApiError("unavailable")
+        return {"en": ["fr"]}
+
+
+class UnconfiguredEngine(BaseTranslationEngine):
+    NAME = "unconfigured"
+
+    def __init__(self):
+        raise TranslationEngineNotConfiguredError("not configured")
+
+
+def test_engines_are_initialized_concurrently_and_degraded_ones_retried(monkeypatch,):
+    engine_classes = (QuickEngine, SlowEngine, FlakyEngine, UnconfiguredEngine)
+    monkeypatch.setattr("engines.controller.SUPPORTED_ENGINES", engine_classes)
+    monkeypatch.setattr(
+        "engines.controller.ENGINE_NAME_MAP", {e.NAME: e for e in engine_classes}
+    )
+    FlakyEngine.attempts = 0
+
+    async def run():
+        controller = EngineController()
+        controller._init_timeout_seconds = 0.1
+        controller._init_retry_seconds = 0.01
+        await controller.get_available_engines()
+        assert list(controller.available_engines) == ["quick"]
+        assert controller.degraded_engines == {
+            "slow": "timed out",
+            "flaky": "unavailable",
+        }
+
+        # the slow engine keeps timing out, the flaky one recovers and is routed to
+        await asyncio.sleep(0.3)
+        assert set(controller.available_engines) == {"quick", "flaky"}
+        assert list(controller.degraded_engines) == ["slow"]
+        assert "fr" in controller.combined_supported_languages["en"]
+        await controller.shutdown()
+
+    asyncio.run(run())
+
+
+def test_fallback_chain():
+    controller = fake_controller()
+    chain = controller.get_fallback_chain(
+        name="second",
+        needs_detection=False,
+        needs_alignment=False,
+        from_language="en",
+        to_language="es",
+        fallback=True,
+    )
+    assert [e.NAME for e in chain] == ["second", "first"]
+
+    chain = controller.get_fallback_chain(
+        name="second",
+        needs_detection=False,
+        needs_alignment=False,
+        from_language="en",
+        to_language="es",
+        fallback=False,
+    )
+    assert [e.NAME for e in chain] == ["second"]
+
+
+def test_engine_which_is_not_available_is_not_built_per_request():
+    controller = fake_controller()
+    controller.degraded_engines = {"google": "timed out"}
+
+    def get_engine(name, fallback=False):
+        return controller.get_engine(
+            name,
+            needs_detection=False,
+            needs_alignment=False,
+            from_language="en",
+            to_language="es",
+            fallback=fallback,
+        )
+
+    with pytest.raises(EngineApiError):
+        get_engine("google")
+    with pytest.raises(TranslationEngineNotConfiguredError):
+        get_engine("deepl")
+    with pytest.raises(InvalidEngineNameError):
+        get_engine("nonexistent")
+    assert get_engine("google", fallback=True).NAME == "first"
+    assert get_engine("deepl", fallback=True).NAME == "first"
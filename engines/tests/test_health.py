@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import pytest
+
+from engines.health import CallStats, EngineHealthTracker
+from engines.tests.test_controller import fake_controller
+from errors import EngineApiError, UnsupportedLanguagePairError
+
+
+def tracker(**thresholds) -> EngineHealthTracker:
+    return EngineHealthTracker(
+        max_ewma_seconds=thresholds.get("max_ewma_seconds"),
+        max_p95_seconds=thresholds.get("max_p95_seconds"),
+        max_error_rate=thresholds.get("max_error_rate"),
+        min_samples=thresholds.get("min_samples", 5),
+        window_seconds=60.0,
+    )
+
+
+def test_call_stats_summary():
+    stats = CallStats(window_seconds=10)
+    for seconds in [0.1] * 19 + [1.0]:
+        stats.record(0, seconds, failed=False)
+    stats.record(0, None, failed=True)
+    summary = stats.summary(now=1)
+    assert summary["calls"] == 21
+    assert summary["error_rate"] == pytest.approx(1 / 21)
+    assert summary["p95_seconds"] == 1.0
+    assert 0.1 < summary["ewma_seconds"] < 1.0
+
+
+def test_call_stats_age_out():
+    stats = CallStats(window_seconds=10)
+    stats.record(0, 1.0, failed=False)
+    assert stats.summary(now=11) == {
+        "calls": 0,
+        "error_rate": None,
+        "ewma_seconds": None,
+        "p95_seconds": None,
+    }
+
+
+def test_not_enabled_without_thresholds():
+    assert not tracker().enabled
+    assert tracker(max_error_rate=0.1).enabled
+
+
+def test_demoted_for_error_rate_once_there_are_enough_calls():
+    health = tracker(max_error_rate=0.2)
+    for _ in range(4):
+        health.record("first", "en", "es", None, failed=True)
+    assert health.demotion_reason("first", "en", "es") is None
+
+    health.VERDICT_TTL_SECONDS = 0
+    health.record("first", "en", "es", None, failed=True)
+    assert "error rate" in health.demotion_reason("first", "en", "es")
+
+
+def test_judged_on_the_engine_until_the_pair_has_enough_calls():
+    health = tracker(max_ewma_seconds=0.5)
+    health.VERDICT_TTL_SECONDS = 0
+    for _ in range(5):
+        health.record("first", "en", "fr", 1.0, failed=False)
+    assert "latency" in health.demotion_reason("first", "en", "es")
+
+    for _ in range(5):
+        health.record("first", "en", "es", 0.1, failed=False)
+    assert health.demotion_reason("first", "en", "es") is None
+
+
+def test_latency_percentile_needs_enough_samples():
+    health = tracker(min_samples=5)
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        health.record("first", "en", "es", seconds, failed=False)
+    assert health.latency_percentile("first", "en", "es", 0.95) is None
+
+    health.VERDICT_TTL_SECONDS = 0
+    health.record("first", "en", "es", 1.0, failed=False)
+    assert health.latency_percentile("first", "en", "es", 0.95) == 1.0
+    assert health.latency_percentile("first", "en", "es", 0.5) == 0.3
+    assert health.latency_percentile("first", "en", "fr", 0.5) is None
+
+
+def test_measure_ignores_request_errors():
+    controller = fake_controller()
+    controller.health = tracker(max_error_rate=0.2)
+    with pytest.raises(UnsupportedLanguagePairError):
+        with controller.measure("first", "en", "es"):
+            raise UnsupportedLanguagePairError("unsupported")
+    with pytest.raises(EngineApiError):
+        with controller.measure("first", "en", "es"):
+            raise EngineApiError("unavailable")
+    with controller.measure("first", "en", "es", timed=False):
+        pass
+    summary = controller.health.stats()["engines"]["first"]
+    assert summary["calls"] == 2
+    assert summary["error_rate"] == 0.5
+    assert summary["ewma_seconds"] is None
+
+
+def test_cancelled_call_is_a_slow_sample():
+    controller = fake_controller()
+    controller.health = tracker(max_error_rate=0.2)
+
+    async def cancelled_call():
+        async def call():
+            with controller.measure("first", "en", "es"):
+                await asyncio.sleep(1.0)
+
+        task = asyncio.ensure_future(call())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled_call())
+    [latency] = controller.health._engines["first"].latencies(time.monotonic())
+    assert 0.05 <= latency < 1.0
+    summary = controller.health.stats()["engines"]["first"]
+    assert summary["calls"] == 1
+    assert summary["error_rate"] == 0.0
+
+
+def test_best_routing_demotes_unhealthy_engines():
+    controller = fake_controller()
+    controller.health = tracker(max_p95_seconds=0.5)
+    for _ in range(5):
+        controller.health.record("first", "en", "es", 2.0, failed=False)
+    ranked = controller.get_ranked(
+        needs_detection=False,
+        needs_alignment=False,
+        from_language="en",
+        to_language="es",
+        exclude_engines=[],
+    )
+    assert [e.NAME for e in ranked] == ["second", "first"]
+    (decision,) = controller.routing_stats()["recent_demotions"]
+    assert "p95 latency" in decision["demoted"]["first"]
+
+    # an engine asked for by name is still used
+    chain = controller.get_fallback_chain(
+        name="first",
+        needs_detection=False,
+        needs_alignment=False,
+        from_language="en",
+        to_language="es",
+        fallback=True,
+    )
+    assert [e.NAME for e in chain] == ["first", "second"]
@@ -0,0 +1,110 @@
+import asyncio
+import gc
+
+import pytest
+
+from engines.hedging import Hedger
+from errors import EngineApiError
+
+
+def call(result, seconds=0.0, cancelled=None):
+    async def run():
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(result)
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return run
+
+
+def race(hedger, primary, hedge, delay):
+    return asyncio.run(hedger.race(primary, hedge, delay))
+
+
+def test_fast_calls_are_not_hedged():
+    hedger = Hedger(max_fraction=1.0)
+    assert race(hedger, call("primary"), call("hedge"), 0.1) == ("primary", False)
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_slow_call_loses_to_the_hedge_and_is_cancelled():
+    hedger = Hedger(max_fraction=1.0)
+    cancelled = []
+    assert race(hedger, call("primary", 1.0, cancelled), call("hedge", 0.01), 0.01) == (
+        "hedge",
+        True,
+    )
+    assert cancelled == ["primary"]
+    stats = hedger.stats()
+    assert stats["hedge_rate"] == 1.0
+    assert stats["hedge_win_rate"] == 1.0
+
+
+def test_failed_hedge_waits_for_the_primary():
+    hedger = Hedger(max_fraction=1.0)
+    assert race(hedger, call("primary", 0.05), call(EngineApiError("down")), 0.01) == (
+        "primary",
+        False,
+    )
+
+
+def test_primary_error_is_raised_when_both_fail():
+    hedger = Hedger(max_fraction=1.0)
+    with pytest.raises(EngineApiError) as e:
+        race(
+            hedger,
+            call(EngineApiError("primary down"), 0.05),
+            call(EngineApiError("hedge down")),
+            0.01,
+        )
+    assert e.value.detail == "primary down"
+
+
+def test_error_of_the_losing_call_is_retrieved():
+    hedger = Hedger(max_fraction=1.0)
+    unretrieved = []
+
+    async def run():
+        asyncio.get_event_loop().set_exception_handler(
+            lambda loop, context: unretrieved.append(context)
+        )
+        answered = asyncio.Event()
+
+        async def primary():
+            await answered.wait()
+            return "primary"
+
+        async def hedge():
+            # both calls complete together, the primary being used
+            answered.set()
+            raise EngineApiError("hedge down")
+
+        result = await hedger.race(primary, hedge, 0.01)
+        gc.collect()
+        return result
+
+    assert asyncio.run(run()) == ("primary", False)
+    gc.collect()
+    assert unretrieved == []
+
+
+def test_hedging_is_limited_to_the_budget():
+    hedger = Hedger(max_fraction=0.5, burst=1.0)
+    results = [
+        race(hedger, call("primary", 0.02), call("hedge"), 0.01) for _ in range(4)
+    ]
+    assert [won for _, won in results] == [True, False, True, False]
+    assert hedger.stats()["over_budget"] == 2
+
+
+def test_no_delay_is_not_hedged():
+    hedger = Hedger(max_fraction=1.0)
+    assert race(hedger, call("primary", 0.02), call("hedge"), None) == (
+        "primary",
+        False,
+    )
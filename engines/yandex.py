@@ -1,10 +1,10 @@
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 from urllib.parse import urljoin
 
 import httpx
 
-from engines.base import BaseTranslationEngine
+from engines.base import PooledHttpTranslationEngine
 from errors import (
     DetectionError,
     EngineApiError,
@@ -15,12 +15,16 @@ from models.response import TranslationResponse
 from settings import Settings
 
 
-class YandexEngine(BaseTranslationEngine):
+class YandexEngine(PooledHttpTranslationEngine):
     NAME = "yandex"
     VERSION = "2"
 
     supports_detection = True
 
+    # see https://cloud.yandex.com/docs/translate/concepts/limits
+    max_batch_size = 100
+    max_batch_characters = 10000
+
     def __init__(self):
         settings = Settings()
         self._logger = logging.getLogger(__name__)
@@ -34,6 +38,10 @@ class YandexEngine(BaseTranslationEngine):
             )
         super().__init__()
 
+    @property
+    def warm_up_url(self) -> Optional[str]:
+        return str(self.endpoint)
+
     def handle_api_error(self, response: httpx.Response):
         if response.status_code >= 500:
             raise EngineApiError(
@@ -51,6 +59,7 @@ class YandexEngine(BaseTranslationEngine):
             urljoin(str(self.endpoint), "languages"),
             headers={"Authorization": f"Bearer {self.token}"},
             json={"folderId": self.folder_id} if self.folder_id else {},
+            timeout=Settings().engine_init_timeout_seconds,
         )
         self.handle_api_error(response)
         response_json = response.json()
@@ -65,42 +74,74 @@ class YandexEngine(BaseTranslationEngine):
         to_language: str,
         with_alignment: Optional[bool] = False,
     ) -> TranslationResponse:
-        await super().translate(
-            source_text=source_text,
+        (result,) = await self.translate_batch(
+            source_texts=[source_text],
             to_language=to_language,
             from_language=from_language,
             with_alignment=with_alignment,
         )
+        return result
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                urljoin(str(self.endpoint), "translate"),
-                json={
-                    "texts": [source_text],
-                    "targetLanguageCode": to_language,
-                    **({"folderId": self.folder_id} if self.folder_id else {}),
-                    **({"sourceLanguageCode": from_language} if from_language else {}),
-                },
-                headers={"Authorization": f"Bearer {self.token}"},
-            )
+    async def translate_texts(
+        self,
+        source_texts: List[str],
+        from_language: Optional[str],
+        to_language: str,
+        with_alignment: Optional[bool] = False,
+    ) -> List[TranslationResponse]:
+        response = await self.client.post(
+            urljoin(str(self.endpoint), "translate"),
+            json={
+                "texts": source_texts,
+                "targetLanguageCode": to_language,
+                **({"folderId": self.folder_id} if self.folder_id else {}),
+                **({"sourceLanguageCode": from_language} if from_language else {}),
+            },
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
         self.handle_api_error(response)
         response_json = response.json()
         self._logger.debug("%s got response: %s", self.name_ver, response_json)
 
+        try:
+            translations = response_json["translations"]
+        except KeyError as e:
+            raise TranslationError(
+                f"{self.name_ver} engine could not translate the given text"
+            ) from e
+        if len(translations) != len(source_texts):
+            raise TranslationError(
+                f"{self.name_ver} engine returned {len(translations)} results for {len(source_texts)} texts"
+            )
+        return [
+            self.parse_translation(
+                translation,
+                source_text=source_text,
+                from_language=from_language,
+                to_language=to_language,
+            )
+            for source_text, translation in zip(source_texts, translations)
+        ]
+
+    def parse_translation(
+        self,
+        translation: Dict,
+        source_text: str,
+        from_language: Optional[str],
+        to_language: str,
+    ) -> TranslationResponse:
         detected_language = None
         if from_language is None:
             try:
-                detected_language = response_json["translations"][0][
-                    "detectedLanguageCode"
-                ]
-            except (KeyError, IndexError) as e:
+                detected_language = translation["detectedLanguageCode"]
+            except KeyError as e:
                 raise DetectionError(
                     f"{self.name_ver} engine could not detect which language the source text is in"
                 ) from e
 
         try:
-            translated_text = response_json["translations"][0]["text"]
-        except (AttributeError, IndexError) as e:
+            translated_text = translation["text"]
+        except KeyError as e:
             raise TranslationError(
                 f"{self.name_ver} engine could not translate the given text"
             ) from e
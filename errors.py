@@ -52,5 +52,13 @@ class NoValidEngineConfiguredError(BaseMultiTranslateError):
     """No valid engine is configured"""
 
 
+class EngineUnavailableError(BaseMultiTranslateError):
+    """The engine's circuit breaker is open"""
+
+
 class InvalidLanguagePreferencesError(BaseMultiTranslateError):
     """Invalid language preferences"""
+
+
+class TranslationMemoryError(BaseMultiTranslateError):
+    """A translation memory which could not be imported"""
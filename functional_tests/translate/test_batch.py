@@ -0,0 +1,38 @@
+from urllib.parse import urljoin
+
+import httpx
+
+from functional_tests.translate.test_translate import translate_url
+
+
+def translate_batch_url() -> str:
+    return urljoin(translate_url() + "/", "batch")
+
+
+def test_translate_batch():
+    request_data = {
+        "from_language": "en",
+        "to_language": "es",
+        "source_texts": ["hello", "goodbye", "hello"],
+        "preferred_engine": "google",
+    }
+    resp = httpx.post(translate_batch_url(), json=request_data)
+    assert resp.status_code == 200
+    result = resp.json()
+    assert [t["source_text"] for t in result["translations"]] == [
+        "hello",
+        "goodbye",
+        "hello",
+    ]
+    assert [t["translated_text"] for t in result["translations"]] == [
+        "Hola",
+        "Adiós",
+        "Hola",
+    ]
+
+
+def test_translate_batch_requires_texts():
+    resp = httpx.post(
+        translate_batch_url(), json={"to_language": "es", "source_texts": []}
+    )
+    assert resp.status_code == 422
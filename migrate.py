@@ -0,0 +1,134 @@
+"""
+Versioned schema migrations. Each file in migrations/ named <version>_<description>.sql is applied once, in version
+order, with the applied versions recorded in the schema_migrations table.
+
+Run with `python migrate.py` before starting the application, the application itself only checks the schema is up to
+date.
+"""
+import asyncio
+import logging
+import re
+from pathlib import Path
+from typing import List, NamedTuple
+
+from databases import Database
+
+from db import require_postgres
+
+
+_logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+# held while migrating so concurrent migrators (e.g. several pods rolling out at once) apply each migration only once
+MIGRATION_LOCK_ID = 4_727_318_012
+
+CREATE_SCHEMA_MIGRATIONS = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+)
+"""
+
+
+class SchemaVersionError(Exception):
+    pass
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: Path
+
+
+def available_migrations(migrations_dir: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for path in migrations_dir.iterdir():
+        match = MIGRATION_FILE_PATTERN.match(path.name)
+        if match is not None:
+            migrations.append(Migration(int(match[1]), match[2], path))
+    migrations.sort()
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise SchemaVersionError(f"duplicate migration versions in {migrations_dir}")
+    return migrations
+
+
+async def migrate(database: Database) -> List[Migration]:
+    """Apply the migrations which haven't been applied yet, each in its own transaction, returning them"""
+    applied = []
+    async with database.connection() as connection:
+        # migrations can contain several statements which asyncpg only runs outside of a prepared statement
+        raw_connection = connection.raw_connection
+        await raw_connection.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            await raw_connection.execute(CREATE_SCHEMA_MIGRATIONS)
+            applied_versions = {
+                record["version"]
+                for record in await raw_connection.fetch(
+                    "SELECT version FROM schema_migrations"
+                )
+            }
+            for migration in available_migrations():
+                if migration.version in applied_versions:
+                    continue
+                _logger.info("applying migration %s", migration.path.name)
+                async with raw_connection.transaction():
+                    await raw_connection.execute(migration.path.read_text())
+                    await raw_connection.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                        migration.version,
+                        migration.name,
+                    )
+                applied.append(migration)
+        finally:
+            await raw_connection.execute(
+                "SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID
+            )
+    return applied
+
+
+async def check_schema_version(database: Database) -> int:
+    """Raise if migrations are outstanding, otherwise return the schema version"""
+    expected_version = available_migrations()[-1].version
+    has_migrations_table = await database.fetch_val(
+        "SELECT to_regclass('schema_migrations') IS NOT NULL"
+    )
+    version = (
+        await database.fetch_val("SELECT max(version) FROM schema_migrations")
+        if has_migrations_table
+        else None
+    )
+    if version is None or version < expected_version:
+        raise SchemaVersionError(
+            f"database schema is at version {version}, expected {expected_version}"
+            f" - run `python migrate.py`"
+        )
+    if version > expected_version:
+        # a rollback to an earlier release, migrations are additive so this is tolerated
+        _logger.warning(
+            "database schema is at version %s, newer than expected %s",
+            version,
+            expected_version,
+        )
+    return version
+
+
+async def main():
+    database = require_postgres()
+    await database.connect()
+    try:
+        applied = await migrate(database)
+    finally:
+        await database.disconnect()
+    _logger.info(
+        "applied %s migrations, schema is at version %s",
+        len(applied),
+        available_migrations()[-1].version,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
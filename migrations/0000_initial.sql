@@ -0,0 +1,23 @@
+-- The translation table as it was originally created by the application at startup
+CREATE TABLE IF NOT EXISTS translation (
+    id SERIAL NOT NULL,
+    from_was_specified BOOLEAN NOT NULL,
+    from_language VARCHAR,
+    to_language VARCHAR NOT NULL,
+    source_text VARCHAR NOT NULL,
+    translated_text VARCHAR NOT NULL,
+    translation_engine VARCHAR NOT NULL,
+    translation_engine_version VARCHAR NOT NULL,
+    has_alignment_info BOOLEAN NOT NULL,
+    alignment JSON,
+    detection_confidence FLOAT,
+    PRIMARY KEY (id),
+    CONSTRAINT unique_translation_constraint UNIQUE (
+        from_language,
+        to_language,
+        source_text,
+        translation_engine,
+        translation_engine_version,
+        has_alignment_info
+    )
+);
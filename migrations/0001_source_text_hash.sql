@@ -0,0 +1,22 @@
+-- Look previous translations up by a fixed size digest of the source text rather than the text itself. The unique
+-- constraint (which is also the lookup index) is rebuilt over the digest, so long texts no longer exceed the maximum
+-- btree entry size.
+ALTER TABLE translation ADD COLUMN IF NOT EXISTS source_text_hash BYTEA;
+
+UPDATE translation
+SET source_text_hash = sha256(convert_to(source_text, 'UTF8'))
+WHERE source_text_hash IS NULL;
+
+ALTER TABLE translation ALTER COLUMN source_text_hash SET NOT NULL;
+
+ALTER TABLE translation DROP CONSTRAINT IF EXISTS unique_translation_constraint;
+
+ALTER TABLE translation
+    ADD CONSTRAINT unique_translation_constraint UNIQUE (
+        source_text_hash,
+        to_language,
+        translation_engine,
+        translation_engine_version,
+        from_language,
+        has_alignment_info
+    );
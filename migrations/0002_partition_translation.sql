@@ -0,0 +1,83 @@
+-- Hash partition the translation table by to_language, which every lookup filters on, so a lookup only touches one
+-- partition and vacuuming and index maintenance work on a partition at a time. Adds created_at and last_used_at for
+-- the retention job (retention.py) along with an archive table it moves cold translations to.
+-- Requires postgres 11 or later. Existing translations are copied so this locks the table for the duration.
+CREATE TABLE translation_partitioned (
+    id INTEGER NOT NULL DEFAULT nextval('translation_id_seq'),
+    from_was_specified BOOLEAN NOT NULL,
+    from_language VARCHAR,
+    to_language VARCHAR NOT NULL,
+    source_text VARCHAR NOT NULL,
+    source_text_hash BYTEA NOT NULL,
+    translated_text VARCHAR NOT NULL,
+    translation_engine VARCHAR NOT NULL,
+    translation_engine_version VARCHAR NOT NULL,
+    has_alignment_info BOOLEAN NOT NULL,
+    alignment JSON,
+    detection_confidence FLOAT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    last_used_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    -- unique constraints on a partitioned table have to include the partition key
+    PRIMARY KEY (id, to_language),
+    CONSTRAINT unique_translation_constraint_partitioned UNIQUE (
+        source_text_hash,
+        to_language,
+        translation_engine,
+        translation_engine_version,
+        from_language,
+        has_alignment_info
+    )
+) PARTITION BY HASH (to_language);
+
+DO $$
+BEGIN
+    FOR remainder IN 0..15 LOOP
+        EXECUTE format(
+            'CREATE TABLE translation_p%s PARTITION OF translation_partitioned FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+            remainder,
+            remainder
+        );
+    END LOOP;
+END
+$$;
+
+INSERT INTO translation_partitioned (
+    id,
+    from_was_specified,
+    from_language,
+    to_language,
+    source_text,
+    source_text_hash,
+    translated_text,
+    translation_engine,
+    translation_engine_version,
+    has_alignment_info,
+    alignment,
+    detection_confidence
+)
+SELECT
+    id,
+    from_was_specified,
+    from_language,
+    to_language,
+    source_text,
+    source_text_hash,
+    translated_text,
+    translation_engine,
+    translation_engine_version,
+    has_alignment_info,
+    alignment,
+    detection_confidence
+FROM translation;
+
+ALTER SEQUENCE translation_id_seq OWNED BY translation_partitioned.id;
+DROP TABLE translation;
+ALTER TABLE translation_partitioned RENAME TO translation;
+ALTER TABLE translation
+    RENAME CONSTRAINT unique_translation_constraint_partitioned TO unique_translation_constraint;
+
+-- later migrations adding columns to translation must add them here too
+CREATE TABLE translation_archive (
+    LIKE translation,
+    archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
@@ -0,0 +1,5 @@
+-- Count how often each stored translation is served so the hottest can be preloaded into a new replica's cache
+ALTER TABLE translation ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE translation_archive ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX translation_hit_count_index ON translation (hit_count DESC);
@@ -0,0 +1,20 @@
+-- Columns for the compact storage format (see storage.py): compressed texts and packed alignment offsets. A row keeps
+-- each text in exactly one of its two columns. Existing rows are left as they are and can be rewritten in the compact
+-- format afterwards with `python compact_storage.py`.
+ALTER TABLE translation
+    ADD COLUMN source_text_compressed BYTEA,
+    ADD COLUMN translated_text_compressed BYTEA,
+    ADD COLUMN alignment_packed BYTEA,
+    ALTER COLUMN source_text DROP NOT NULL,
+    ALTER COLUMN translated_text DROP NOT NULL,
+    ADD CONSTRAINT translation_source_text_stored
+        CHECK ((source_text IS NULL) <> (source_text_compressed IS NULL)),
+    ADD CONSTRAINT translation_translated_text_stored
+        CHECK ((translated_text IS NULL) <> (translated_text_compressed IS NULL));
+
+ALTER TABLE translation_archive
+    ADD COLUMN source_text_compressed BYTEA,
+    ADD COLUMN translated_text_compressed BYTEA,
+    ADD COLUMN alignment_packed BYTEA,
+    ALTER COLUMN source_text DROP NOT NULL,
+    ALTER COLUMN translated_text DROP NOT NULL;
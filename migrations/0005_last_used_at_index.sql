@@ -0,0 +1,2 @@
+-- Lets retention.py find the translations which haven't been used recently without scanning every partition
+CREATE INDEX translation_last_used_at_index ON translation (last_used_at);
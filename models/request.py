@@ -1,5 +1,5 @@
 from fastapi import Query
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist, constr
 
 from engines.controller import BEST, ENGINE_NAME_MAP
 from settings import FeaturesSettings
@@ -38,3 +38,38 @@ class TranslationRequest(BaseModel):
         description="Whether to fallback to the best available engine if the preferred "
         "engine does not succeed",
     )
+
+
+class BatchTranslationRequest(BaseModel):
+    source_texts: conlist(
+        constr(max_length=features.max_source_text_length),
+        min_items=1,
+        max_items=features.max_batch_texts,
+    ) = Query(
+        ...,
+        description="The texts to be translated, all from and to the same languages",
+    )
+    to_language: str = Query(
+        ...,
+        max_length=2,
+        description="The ISO-639-1 code of the language to translate the texts to",
+    )
+    from_language: str = Query(
+        None,
+        max_length=2,
+        description="The ISO-639-1 code of the language to translate the texts from - if not"
+        "specified then detection will be attempted",
+    )
+    preferred_engine: str = Query(
+        BEST,
+        description=f"Which translation engine to use. Choices are "
+        f"{', '.join(list(ENGINE_NAME_MAP.keys()))} and {BEST}",
+    )
+    with_alignment: bool = Query(
+        False, description="Whether to return word alignment information or not"
+    )
+    fallback: bool = Query(
+        False,
+        description="Whether to fallback to the best available engine if the preferred "
+        "engine does not succeed",
+    )
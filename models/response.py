@@ -57,3 +57,7 @@ class TranslationResponse(BaseModel):
                 ],
             }
         }
+
+
+class BatchTranslationResponse(BaseModel):
+    translations: List[TranslationResponse]
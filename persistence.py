@@ -0,0 +1,264 @@
+"""
+The stores previous translations are persisted to. Postgres is the default, an embedded SQLite database on local disk
+can be used instead by single node deployments which can't run postgres. The migration, retention, compaction and
+translation memory tools only support postgres.
+"""
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, TypeVar
+
+import asyncpg
+import sqlalchemy
+from sqlalchemy.dialects.postgresql import Insert, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql import ClauseElement
+
+from db import translations
+from db_pool import InstrumentedDatabase, LatencyStats, query_kind
+from migrate import check_schema_version
+from replicas import ReplicaPool
+
+
+_logger = logging.getLogger(__name__)
+
+Row = Dict[str, Any]
+T = TypeVar("T")
+
+# errors caused by the values of a row (e.g. a NUL character postgres can't store) rather than the store, which fail
+# every batch the row is written in
+ROW_ERRORS = (
+    asyncpg.DataError,
+    asyncpg.IntegrityConstraintViolationError,
+    sqlalchemy.exc.DataError,
+    sqlalchemy.exc.IntegrityError,
+)
+
+
+def insert_translations(rows: List[Row]) -> Insert:
+    """
+    A multi-row insert which skips rows already stored (e.g. by another replica translating the same text at the same
+    time), returning the ids of the rows actually inserted
+    """
+    return (
+        insert(translations)
+        .values(rows)
+        .on_conflict_do_nothing(constraint="unique_translation_constraint")
+        .returning(translations.c.id)
+    )
+
+
+class TranslationStore(ABC):
+    """Where previous translations are looked up and new ones written, queried with sqlalchemy core statements"""
+
+    @abstractmethod
+    async def connect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def disconnect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def fetch_all(
+        self,
+        query: ClauseElement,
+        is_miss: Callable[
+            [List[Mapping[str, Any]]], bool
+        ] = lambda records: not records,
+    ) -> List[Mapping[str, Any]]:
+        """
+        A lookup of previous translations - is_miss tells whether the result is worth checking again somewhere more up
+        to date if the store has replicas
+        """
+
+    @abstractmethod
+    async def execute(self, statement: ClauseElement) -> None:
+        ...
+
+    @abstractmethod
+    async def insert_translations(self, rows: List[Row]) -> int:
+        """Insert the rows, skipping any already stored, returning how many were inserted"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class PostgresTranslationStore(TranslationStore):
+    """
+    Writes go to the primary, lookups are spread over the read replicas if there are any. The databases are None when
+    POSTGRES_DSN isn't set, which is only an error once the store is connected
+    """
+
+    def __init__(
+        self,
+        database: Optional[InstrumentedDatabase],
+        read_database: Optional[ReplicaPool],
+    ):
+        self.database = database
+        self.read_database = read_database
+
+    async def connect(self) -> None:
+        if self.database is None:
+            raise ValueError(
+                "POSTGRES_DSN must be set to persist translations to postgres"
+            )
+        await self.database.connect()
+        # the schema is created and migrated by migrate.py, not on every worker's startup
+        await check_schema_version(self.database)
+        await self.read_database.connect()
+
+    async def disconnect(self) -> None:
+        await self.read_database.disconnect()
+        await self.database.disconnect()
+
+    async def fetch_all(
+        self,
+        query: ClauseElement,
+        is_miss: Callable[
+            [List[Mapping[str, Any]]], bool
+        ] = lambda records: not records,
+    ) -> List[Mapping[str, Any]]:
+        return await self.read_database.fetch_all(query, is_miss)
+
+    async def execute(self, statement: ClauseElement) -> None:
+        await self.database.execute(statement)
+
+    async def insert_translations(self, rows: List[Row]) -> int:
+        return len(await self.database.fetch_all(insert_translations(rows)))
+
+    def stats(self) -> Dict[str, Any]:
+        if self.database is None:
+            return {}
+        return {
+            "database": self.database.stats(),
+            "read_replicas": self.read_database.stats(),
+        }
+
+
+# kept in step with db.translations, other than ids being sqlite rowids as there are no partitions
+SQLITE_SCHEMA = [
+    "PRAGMA journal_mode = WAL",
+    # with WAL only checkpoints sync to disk - a power loss can lose the latest writes but not corrupt the database
+    "PRAGMA synchronous = NORMAL",
+    """
+    CREATE TABLE IF NOT EXISTS translation (
+        id INTEGER PRIMARY KEY,
+        from_was_specified BOOLEAN NOT NULL,
+        from_language VARCHAR,
+        to_language VARCHAR NOT NULL,
+        source_text VARCHAR,
+        source_text_compressed BLOB,
+        source_text_hash BLOB NOT NULL,
+        translated_text VARCHAR,
+        translated_text_compressed BLOB,
+        translation_engine VARCHAR NOT NULL,
+        translation_engine_version VARCHAR NOT NULL,
+        has_alignment_info BOOLEAN NOT NULL,
+        alignment JSON,
+        alignment_packed BLOB,
+        detection_confidence FLOAT,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_used_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        hit_count INTEGER NOT NULL DEFAULT 0,
+        CONSTRAINT unique_translation_constraint UNIQUE (
+            source_text_hash,
+            to_language,
+            translation_engine,
+            translation_engine_version,
+            from_language,
+            has_alignment_info
+        )
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS translation_hit_count_index ON translation (hit_count DESC)",
+]
+
+
+class SQLiteTranslationStore(TranslationStore):
+    """
+    Translations in a SQLite database at path, created if it doesn't exist. The sqlite driver is synchronous, so
+    statements (a write can be a batch of hundreds of rows) run on a single thread off the event loop, which also
+    serializes them on the one connection
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._engine: Optional[Engine] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._query_latency: Dict[str, LatencyStats] = {}
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    async def connect(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        # a single connection, only ever used from the executor's thread
+        self._engine = sqlalchemy.create_engine(
+            f"sqlite:///{self.path}",
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+        await self._run(self._create_schema)
+        _logger.info("storing translations in %s", self.path)
+
+    def _create_schema(self) -> None:
+        with self._engine.connect() as connection:
+            for statement in SQLITE_SCHEMA:
+                connection.execute(statement)
+
+    async def disconnect(self) -> None:
+        if self._engine is not None:
+            await self._run(self._engine.dispose)
+            self._engine = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _execute(self, statement: ClauseElement, *multiparams):
+        started = time.monotonic()
+        try:
+            return self._engine.execute(statement, *multiparams)
+        finally:
+            kind = query_kind(statement)
+            if kind not in self._query_latency:
+                self._query_latency[kind] = LatencyStats()
+            self._query_latency[kind].record(time.monotonic() - started)
+
+    async def fetch_all(
+        self,
+        query: ClauseElement,
+        is_miss: Callable[
+            [List[Mapping[str, Any]]], bool
+        ] = lambda records: not records,
+    ) -> List[Mapping[str, Any]]:
+        return await self._run(lambda: self._execute(query).fetchall())
+
+    async def execute(self, statement: ClauseElement) -> None:
+        await self._run(self._execute, statement)
+
+    async def insert_translations(self, rows: List[Row]) -> int:
+        return await self._run(
+            lambda: self._execute(
+                translations.insert().prefix_with("OR IGNORE"), rows
+            ).rowcount
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "database": {
+                "path": str(self.path),
+                "query_latency": {
+                    kind: latency.summary()
+                    # copied as the executor's thread may be adding a kind
+                    for kind, latency in list(self._query_latency.items())
+                },
+            }
+        }
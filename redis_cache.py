@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import aioredis
+
+from cache import CacheKey
+from engines.circuit_breaker import CircuitBreakers
+from models.response import TranslationResponse
+
+
+_logger = logging.getLogger(__name__)
+
+REDIS_ERRORS = (aioredis.RedisError, OSError, asyncio.TimeoutError)
+# hash of circuit breaker keys to when they're open until
+CIRCUIT_BREAKERS_KEY = "mt:circuit-breakers"
+
+
+def redis_key(key: CacheKey, prefix: str = "mt") -> str:
+    """A compact key - the engine name and version followed by a hash of the normalized request"""
+    source_text, to_language, from_language, with_alignment, name, version = key
+    digest = hashlib.blake2b(
+        json.dumps(
+            [source_text, to_language, from_language, with_alignment],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode(),
+        digest_size=16,
+    ).hexdigest()
+    return f"{prefix}:{name}:{version}:{digest}"
+
+
+class RedisTranslationCache:
+    """
+    A translation cache shared by every replica, sitting between the in-process cache and the database. Redis being
+    unavailable is never fatal - errors are logged, counted and treated as cache misses, as are values which can't be
+    read (e.g. written by a version with a different response model)
+    """
+
+    def __init__(self, dsn: Optional[str], ttl_seconds: int):
+        self.dsn = dsn
+        self.ttl_seconds = ttl_seconds
+        self._redis: Optional[aioredis.Redis] = None
+        self._stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    async def connect(self) -> None:
+        self._redis = await aioredis.create_redis_pool(self.dsn)
+
+    async def disconnect(self) -> None:
+        if self._redis is not None:
+            self._redis.close()
+            await self._redis.wait_closed()
+            self._redis = None
+
+    async def get(self, key: CacheKey) -> Optional[TranslationResponse]:
+        (result,) = await self.get_many([key])
+        return result
+
+    async def get_many(
+        self, keys: Sequence[CacheKey]
+    ) -> List[Optional[TranslationResponse]]:
+        """Looks up all of the keys in a single round trip"""
+        if not keys:
+            return []
+        try:
+            values = await self._redis.mget(*(redis_key(key) for key in keys))
+        except REDIS_ERRORS:
+            self._stats["errors"] += 1
+            _logger.warning("could not read from the redis cache", exc_info=True)
+            return [None] * len(keys)
+
+        results: List[Optional[TranslationResponse]] = []
+        for value in values:
+            if value is None:
+                self._stats["misses"] += 1
+                results.append(None)
+                continue
+            try:
+                # pydantic's ValidationError is a ValueError
+                results.append(TranslationResponse.parse_raw(value))
+            except ValueError:
+                self._stats["errors"] += 1
+                self._stats["misses"] += 1
+                _logger.warning("could not read a redis cache entry", exc_info=True)
+                results.append(None)
+            else:
+                self._stats["hits"] += 1
+        return results
+
+    async def set(self, key: CacheKey, response: TranslationResponse) -> None:
+        await self.set_many([(key, response)])
+
+    async def set_many(
+        self, items: Sequence[Tuple[CacheKey, TranslationResponse]]
+    ) -> None:
+        """Writes all of the items in a single pipelined round trip"""
+        if not items:
+            return
+        pipeline = self._redis.pipeline()
+        for key, response in items:
+            pipeline.set(redis_key(key), response.json(), expire=self.ttl_seconds)
+        try:
+            await pipeline.execute()
+        except REDIS_ERRORS:
+            self._stats["errors"] += 1
+            _logger.warning("could not write to the redis cache", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "enabled": self.enabled}
+
+
+class RedisCircuitBreakerState:
+    """
+    Shares circuit breakers between replicas - a breaker opening is written to a redis hash of when each breaker is
+    open until, which is read every sync_seconds to open the same breakers locally. A breaker closing removes it, the
+    replicas it was shared with keep theirs open until it's due to be half open. Redis being unavailable is never
+    fatal, breakers just aren't shared
+    """
+
+    def __init__(
+        self, breakers: CircuitBreakers, dsn: Optional[str], sync_seconds: float
+    ):
+        self.breakers = breakers
+        self.dsn = dsn
+        self.sync_seconds = sync_seconds
+        self._redis: Optional[aioredis.Redis] = None
+        self._task: Optional[asyncio.Future] = None
+        self._writes: Set[asyncio.Future] = set()
+        self._stats = {"published": 0, "received": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    async def connect(self) -> None:
+        self._redis = await aioredis.create_redis_pool(self.dsn)
+        self.breakers.on_state_change = self._state_changed
+        self._task = asyncio.ensure_future(self._sync_periodically())
+
+    async def disconnect(self) -> None:
+        self.breakers.on_state_change = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writes:
+            await asyncio.gather(*self._writes)
+        if self._redis is not None:
+            self._redis.close()
+            await self._redis.wait_closed()
+            self._redis = None
+
+    def _state_changed(self, key: str, open_until: Optional[float]) -> None:
+        # called as calls are recorded, so written in the background
+        write = asyncio.ensure_future(self._write(key, open_until))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    async def _write(self, key: str, open_until: Optional[float]) -> None:
+        try:
+            if open_until is None:
+                await self._redis.hdel(CIRCUIT_BREAKERS_KEY, key)
+            else:
+                await self._redis.hset(CIRCUIT_BREAKERS_KEY, key, repr(open_until))
+                self._stats["published"] += 1
+        except REDIS_ERRORS:
+            self._stats["errors"] += 1
+            _logger.warning("could not share a circuit breaker", exc_info=True)
+
+    async def sync(self) -> None:
+        """Open the breakers which other replicas have opened"""
+        try:
+            shared = await self._redis.hgetall(CIRCUIT_BREAKERS_KEY, encoding="utf-8")
+        except REDIS_ERRORS:
+            self._stats["errors"] += 1
+            _logger.warning("could not read shared circuit breakers", exc_info=True)
+            return
+        for key, open_until in shared.items():
+            try:
+                opened = self.breakers.open_shared(key, float(open_until))
+            except ValueError:
+                self._stats["errors"] += 1
+                _logger.warning(
+                    "invalid shared circuit breaker %s: %r", key, open_until
+                )
+                continue
+            if opened:
+                self._stats["received"] += 1
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            await self.sync()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "enabled": self.enabled}
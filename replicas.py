@@ -0,0 +1,168 @@
+import asyncio
+import itertools
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from databases.backends.postgres import Record
+from sqlalchemy.sql import ClauseElement
+
+from db_pool import InstrumentedDatabase
+
+
+_logger = logging.getLogger(__name__)
+
+# 0 when the replica has replayed everything it has received - otherwise an idle primary would look like lag
+REPLICATION_LAG_QUERY = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class _Replica:
+    def __init__(self, name: str, database: InstrumentedDatabase):
+        self.name = name
+        self.database = database
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.stats = {"reads": 0, "errors": 0}
+
+
+class ReplicaPool:
+    """
+    Spreads reads round robin over the healthy read replicas, falling back to the primary when there are none.
+
+    Replicas are health checked every health_check_seconds and only used while reachable and no more than
+    max_lag_seconds behind. As a replica may not have caught up with a recent write, a read considered a miss is
+    repeated on the primary, waiting at most miss_fallback_timeout_seconds before settling for the replica's result.
+    """
+
+    def __init__(
+        self,
+        primary: InstrumentedDatabase,
+        replicas: List[InstrumentedDatabase],
+        health_check_seconds: float,
+        max_lag_seconds: float,
+        miss_fallback_timeout_seconds: float,
+    ):
+        self.primary = primary
+        self.health_check_seconds = health_check_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.miss_fallback_timeout_seconds = miss_fallback_timeout_seconds
+        self._replicas = [
+            _Replica(f"replica-{position}", replica)
+            for position, replica in enumerate(replicas)
+        ]
+        self._round_robin = itertools.cycle(self._replicas)
+        self._task: Optional[asyncio.Future] = None
+        self._stats = {"primary_reads": 0, "miss_fallbacks": 0, "miss_timeouts": 0}
+
+    async def connect(self) -> None:
+        if not self._replicas:
+            return
+        await asyncio.gather(*(self._connect(replica) for replica in self._replicas))
+        await self._check_health()
+        self._task = asyncio.ensure_future(self._run_health_checks())
+
+    async def _connect(self, replica: _Replica) -> None:
+        try:
+            await replica.database.connect()
+        except Exception:
+            # retried by the health checks
+            _logger.warning("could not connect to %s", replica.name, exc_info=True)
+
+    async def disconnect(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for replica in self._replicas:
+            if replica.database.is_connected:
+                await replica.database.disconnect()
+
+    async def _run_health_checks(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_seconds)
+            await self._check_health()
+
+    async def _check_health(self) -> None:
+        await asyncio.gather(*(self._check(replica) for replica in self._replicas))
+
+    async def _check(self, replica: _Replica) -> None:
+        try:
+            if not replica.database.is_connected:
+                await replica.database.connect()
+            lag_seconds = await asyncio.wait_for(
+                replica.database.fetch_val(REPLICATION_LAG_QUERY),
+                timeout=self.health_check_seconds,
+            )
+            replica.lag_seconds = float(lag_seconds)
+        except Exception:
+            replica.lag_seconds = None
+            self._set_health(replica, False, "it could not be reached")
+            return
+        self._set_health(
+            replica,
+            replica.lag_seconds <= self.max_lag_seconds,
+            f"it is {replica.lag_seconds}s behind",
+        )
+
+    def _set_health(self, replica: _Replica, healthy: bool, reason: str) -> None:
+        if replica.healthy and not healthy:
+            _logger.warning("not reading from %s since %s", replica.name, reason)
+        elif healthy and not replica.healthy:
+            _logger.info("reading from %s", replica.name)
+        replica.healthy = healthy
+
+    def _choose(self) -> Optional[_Replica]:
+        for _ in range(len(self._replicas)):
+            replica = next(self._round_robin)
+            if replica.healthy:
+                return replica
+        return None
+
+    async def fetch_all(
+        self,
+        query: ClauseElement,
+        is_miss: Callable[[List[Record]], bool] = lambda records: not records,
+    ) -> List[Record]:
+        replica = self._choose()
+        if replica is None:
+            self._stats["primary_reads"] += 1
+            return await self.primary.fetch_all(query)
+
+        try:
+            records = await replica.database.fetch_all(query)
+        except Exception:
+            replica.stats["errors"] += 1
+            self._set_health(replica, False, "a read failed")
+            _logger.debug("read from %s failed", replica.name, exc_info=True)
+            self._stats["primary_reads"] += 1
+            return await self.primary.fetch_all(query)
+        replica.stats["reads"] += 1
+        if not is_miss(records):
+            return records
+
+        self._stats["miss_fallbacks"] += 1
+        try:
+            return await asyncio.wait_for(
+                self.primary.fetch_all(query),
+                timeout=self.miss_fallback_timeout_seconds,
+            )
+        except asyncio.TimeoutError:
+            self._stats["miss_timeouts"] += 1
+            return records
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "replicas": {
+                replica.name: {
+                    **replica.stats,
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag_seconds,
+                    "pool": replica.database.stats(),
+                }
+                for replica in self._replicas
+            },
+        }
@@ -0,0 +1,99 @@
+"""
+Removes translations which haven't been used for RETENTION_DAYS, moving them to the translation_archive table if
+RETENTION_ARCHIVE is set. Each partition is processed in turn, RETENTION_BATCH_SIZE translations at a time, so each
+statement only locks a bounded number of rows and its transaction stays short however many translations are removed.
+
+Run periodically with `python retention.py` (the helm chart can run it as a cron job).
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from databases import Database
+
+from db import require_postgres, translations
+from settings import DatabaseSettings
+
+
+_logger = logging.getLogger(__name__)
+
+ARCHIVED_COLUMNS = ", ".join(column.name for column in translations.columns)
+# each removes a batch of up to :batch_size of the partition's cold translations (found by the last_used_at index),
+# returning how many were removed
+ARCHIVE_COLD_TRANSLATIONS = """
+WITH cold AS (
+    DELETE FROM {partition} WHERE ctid IN (
+        SELECT ctid FROM {partition} WHERE last_used_at < :cutoff LIMIT :batch_size
+    ) RETURNING *
+), archived AS (
+    INSERT INTO translation_archive ({columns}) SELECT {columns} FROM cold RETURNING 1
+)
+SELECT count(*) FROM archived
+"""
+DELETE_COLD_TRANSLATIONS = """
+WITH cold AS (
+    DELETE FROM {partition} WHERE ctid IN (
+        SELECT ctid FROM {partition} WHERE last_used_at < :cutoff LIMIT :batch_size
+    ) RETURNING 1
+)
+SELECT count(*) FROM cold
+"""
+
+
+async def partitions(database: Database) -> List[str]:
+    records = await database.fetch_all(
+        "SELECT inhrelid::regclass::text AS name FROM pg_inherits"
+        " WHERE inhparent = 'translation'::regclass ORDER BY 1"
+    )
+    return [record["name"] for record in records]
+
+
+async def remove_cold_translations(
+    database: Database, retention_days: int, archive: bool, batch_size: int
+) -> Dict[str, int]:
+    """Returns the number of translations removed from each partition"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    statement = ARCHIVE_COLD_TRANSLATIONS if archive else DELETE_COLD_TRANSLATIONS
+    removed = {}
+    for partition in await partitions(database):
+        removed[partition] = 0
+        while True:
+            # each batch is its own statement and transaction
+            batch_removed = await database.fetch_val(
+                statement.format(partition=partition, columns=ARCHIVED_COLUMNS),
+                values={"cutoff": cutoff, "batch_size": batch_size},
+            )
+            removed[partition] += batch_removed
+            if batch_removed < batch_size:
+                break
+        _logger.info(
+            "%s %s translations from %s",
+            "archived" if archive else "deleted",
+            removed[partition],
+            partition,
+        )
+    return removed
+
+
+async def main():
+    settings = DatabaseSettings()
+    if settings.retention_days is None:
+        _logger.info("RETENTION_DAYS is not set, keeping all translations")
+        return
+    database = require_postgres()
+    await database.connect()
+    try:
+        await remove_cold_translations(
+            database,
+            settings.retention_days,
+            settings.retention_archive,
+            settings.retention_batch_size,
+        )
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
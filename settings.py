@@ -1,6 +1,6 @@
 from enum import Enum
 from pathlib import Path
-from typing import Optional, Sequence
+from typing import List, Optional, Sequence
 
 import pydantic
 
@@ -14,27 +14,122 @@ class LogLevelEnum(Enum):
     NOTSET = "NOTSET"
 
 
+class PersistenceBackendEnum(Enum):
+    POSTGRES = "postgres"
+    SQLITE = "sqlite"
+
+
 class FeaturesSettings(pydantic.BaseSettings):
     enable_persistence: bool = True
+    # where translations are persisted, see persistence.py
+    persistence_backend: PersistenceBackendEnum = PersistenceBackendEnum.POSTGRES
+    sqlite_path: Path = Path("translations.sqlite3")
     enable_gql: bool = True
     # string as specified here https://limits.readthedocs.io/en/stable/string-notation.html
     # e.g. "10/minute;25/hour"
     rate_limits: Optional[str] = None
     redis_dsn: Optional[str] = None
     max_source_text_length: Optional[int] = None
+    # maximum number of texts in a single /translate/batch request
+    max_batch_texts: int = 1000
+    # in-process cache of translation results in front of the database, disabled while max entries is 0
+    translation_cache_max_entries: int = 0
+    translation_cache_max_bytes: Optional[int] = None
+    translation_cache_ttl_seconds: Optional[float] = 3600
+    # keep the serialized json response body of cached translations to skip re-serializing them on each hit
+    translation_cache_store_serialized: bool = False
+    # how many of the most used stored translations are preloaded into the cache at startup
+    translation_cache_warm_up_entries: int = 1000
+    # cache translations in redis (at redis_dsn) so that they are shared by all replicas
+    enable_redis_cache: bool = False
+    redis_cache_ttl_seconds: int = 60 * 60 * 24
+    # how often engine circuit breakers opened by other replicas are read from redis (at redis_dsn)
+    circuit_breaker_sync_seconds: float = 1.0
+    # hold concurrent requests for the same engine and language pair for up to coalesce_window_ms, or until one of the
+    # size limits is hit, and send them upstream as one multi-text request
+    enable_coalescing: bool = False
+    coalesce_window_ms: float = 5.0
+    coalesce_max_texts: int = 50
+    coalesce_max_characters: int = 5000
+    # when an engine hasn't answered within hedge_latency_percentile of its recent latencies for the language pair (once
+    # there have been routing_min_samples of them), also send the request to the next engine in the fallback chain and
+    # use whichever answers first - so only requests with fallback are hedged, at most hedge_max_fraction of them
+    enable_hedging: bool = False
+    hedge_latency_percentile: float = 0.95
+    hedge_max_fraction: float = 0.05
+    write_behind_max_queue_size: int = 10000
+    write_behind_batch_size: int = 500
+    write_behind_flush_interval_seconds: float = 1.0
+    # how often last_used_at is updated for stored translations which have been served
+    last_used_flush_interval_seconds: float = 60.0
+    last_used_max_pending: int = 100000
+    # store texts of at least compact_storage_min_text_bytes compressed and alignments as offsets, see storage.py
+    compact_storage: bool = False
+    compact_storage_min_text_bytes: int = 256
+    # bearer token the admin routes exposing stored translations (/admin/translation-memory and
+    # /admin/hot-translations) require, which aren't served at all while it is unset
+    admin_token: Optional[str] = None
     cors_enabled: bool = False
     cors_origins: Sequence[str] = ()
     cors_origin_regex: str = None
 
 
 class DatabaseSettings(pydantic.BaseSettings):
-    postgres_dsn: pydantic.PostgresDsn
+    # required unless translations aren't persisted to postgres (see FeaturesSettings.persistence_backend)
+    postgres_dsn: Optional[pydantic.PostgresDsn] = None
     db_connect_timeout_seconds: int = 10
+    # connection pool, the same settings are used for each read replica's pool
+    db_pool_min_size: int = 10
+    db_pool_max_size: int = 10
+    db_pool_acquire_timeout_seconds: float = 5.0
+    db_statement_timeout_seconds: Optional[float] = None
+    # prepared statements cached per connection, 0 disables the cache (required behind pgbouncer)
+    db_statement_cache_size: int = 100
+    # optional read replicas which previous translations are looked up from, writes always go to postgres_dsn
+    postgres_read_dsns: List[pydantic.PostgresDsn] = []
+    read_replica_health_check_seconds: float = 5.0
+    read_replica_max_lag_seconds: float = 10.0
+    # how long to wait for the primary when a lookup misses on a replica, in case the replica hadn't caught up
+    read_replica_miss_fallback_timeout_seconds: float = 0.5
+    # translations not used for this many days are removed by retention.py, None keeps them forever
+    retention_days: Optional[int] = None
+    # whether removed translations are moved to the translation_archive table or deleted
+    retention_archive: bool = True
+    # how many translations retention.py removes in each statement
+    retention_batch_size: int = 10000
 
 
 class Settings(pydantic.BaseSettings):
     # logging
     log_level: LogLevelEnum = LogLevelEnum.INFO
+    # upstream http connection pools (shared by the engines using httpx)
+    upstream_pool_max_connections: int = 100
+    upstream_pool_max_keepalive: int = 20
+    upstream_timeout_seconds: float = 5.0
+    # engines are initialized (including discovering their supported languages) concurrently at startup, any not
+    # ready within the timeout are registered as degraded and retried in the background
+    engine_init_timeout_seconds: float = 10.0
+    engine_init_retry_seconds: float = 30.0
+    # upstream requests each engine makes at once for batch translations (which the engines able to batch also
+    # translate single texts through), further requests wait for one to finish
+    engine_max_concurrent_requests: int = 50
+    # best routing demotes engines whose recent calls are outside any of these thresholds below the engines which
+    # aren't, judged once there have been routing_min_samples calls in the last routing_window_seconds
+    routing_max_ewma_latency_seconds: Optional[float] = None
+    routing_max_p95_latency_seconds: Optional[float] = None
+    routing_max_error_rate: Optional[float] = None
+    routing_min_samples: int = 20
+    routing_window_seconds: float = 60.0
+    # engines are skipped for circuit_breaker_open_seconds once circuit_breaker_failure_rate of their calls in the last
+    # circuit_breaker_window_seconds (and at least circuit_breaker_min_calls) have failed or taken longer than
+    # circuit_breaker_slow_call_seconds, then tried with a single probe call. Disabled while the failure rate is None
+    circuit_breaker_failure_rate: Optional[float] = None
+    circuit_breaker_min_calls: int = 10
+    circuit_breaker_window_seconds: float = 30.0
+    circuit_breaker_open_seconds: float = 30.0
+    circuit_breaker_slow_call_seconds: Optional[float] = None
+    # a breaker for each engine and language pair rather than for each engine
+    circuit_breaker_per_language_pair: bool = False
     # microsoft
     microsoft_translator_subscription_key: Optional[str] = None
     microsoft_translator_endpoint: Optional[pydantic.HttpUrl] = None
@@ -45,6 +140,8 @@ class Settings(pydantic.BaseSettings):
     google_parent_path: Optional[
         Path
     ] = None  # path of the project/location to apply the calls to
+    # size of the thread pool used for the blocking google client calls
+    google_max_workers: int = 10
     google_endpoint: Optional[pydantic.HttpUrl] = pydantic.parse_obj_as(
         pydantic.HttpUrl, "https://translation.googleapis.com"
     )
@@ -65,6 +162,8 @@ class Settings(pydantic.BaseSettings):
     papago_client_secret: Optional[str] = None
     # amazon
     amazon_region: Optional[str] = None
+    # size of the thread pool used for the blocking boto3 client calls
+    amazon_max_workers: int = 10
     aws_access_key_id: Optional[str] = None
     aws_secret_access_key: Optional[str] = None
     # ibm watson
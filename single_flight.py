@@ -0,0 +1,39 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls for the same key - the first caller (the leader) does the work and any callers
+    arriving while it is in flight (followers) await the leader's result or exception instead of repeating it
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is None:
+            self._stats["leaders"] += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self._stats["followers"] += 1
+        # the work runs in its own task and each caller is shielded from it, so a cancelled caller (leader or
+        # follower) neither cancels the work nor the result for everyone else
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # mark the exception as retrieved in case every caller was cancelled before it was raised
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "in_flight": len(self._in_flight)}
@@ -0,0 +1,150 @@
+"""
+The compact storage format for translations. With it, texts of at least compress_min_bytes are stored zlib compressed
+in source_text_compressed and translated_text_compressed instead of source_text and translated_text. Alignments are
+stored in alignment_packed as their offsets, with the text slices cut from the texts again on read, instead of as JSON.
+
+Rows in either format are read the same way, so compact storage can be turned on without rewriting existing rows -
+compact_storage.py does that separately.
+"""
+import struct
+import zlib
+from typing import Any, Dict, Mapping, Optional
+
+from db import source_text_hash
+from models.response import Alignment, TranslationResponse
+
+
+COMPRESSION_LEVEL = 6
+# src start, src end, dest start, dest end of each alignment section
+_OFFSETS = struct.Struct("<4I")
+
+
+def _section(
+    offsets: tuple, source_text: str, translated_text: str
+) -> Dict[str, Dict[str, str]]:
+    # the ends are inclusive, see engines.microsoft.parse_alignment_string
+    src_start, src_end, dest_start, dest_end = offsets
+    return {
+        "src": {
+            "start": str(src_start),
+            "end": str(src_end),
+            "text": source_text[src_start : src_end + 1],
+        },
+        "dest": {
+            "start": str(dest_start),
+            "end": str(dest_end),
+            "text": translated_text[dest_start : dest_end + 1],
+        },
+    }
+
+
+def pack_alignment(
+    alignment: Alignment, source_text: str, translated_text: str
+) -> Optional[bytes]:
+    """The alignment's offsets, or None if the alignment could not be rebuilt exactly from them"""
+    packed = bytearray()
+    for section in alignment:
+        try:
+            offsets = (
+                int(section["src"]["start"]),
+                int(section["src"]["end"]),
+                int(section["dest"]["start"]),
+                int(section["dest"]["end"]),
+            )
+            packed += _OFFSETS.pack(*offsets)
+        except (KeyError, TypeError, ValueError, struct.error):
+            return None
+        if _section(offsets, source_text, translated_text) != section:
+            return None
+    return bytes(packed)
+
+
+def unpack_alignment(
+    packed: bytes, source_text: str, translated_text: str
+) -> Alignment:
+    return [
+        _section(offsets, source_text, translated_text)
+        for offsets in _OFFSETS.iter_unpack(packed)
+    ]
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode(), COMPRESSION_LEVEL)
+
+
+def decompress_text(compressed: bytes) -> str:
+    return zlib.decompress(compressed).decode()
+
+
+def encode_translation(
+    source_text: str,
+    translated_text: str,
+    alignment: Optional[Alignment],
+    compress_min_bytes: int,
+) -> Dict[str, Any]:
+    """The values of the text and alignment columns of a translation in the compact format"""
+    columns: Dict[str, Any] = {
+        "source_text": source_text,
+        "source_text_compressed": None,
+        "translated_text": translated_text,
+        "translated_text_compressed": None,
+        "alignment": alignment,
+        "alignment_packed": None,
+    }
+    for name, text in (
+        ("source_text", source_text),
+        ("translated_text", translated_text),
+    ):
+        if len(text.encode()) >= compress_min_bytes:
+            columns[name], columns[f"{name}_compressed"] = None, compress_text(text)
+    if alignment is not None:
+        packed = pack_alignment(alignment, source_text, translated_text)
+        if packed is not None:
+            columns["alignment"], columns["alignment_packed"] = None, packed
+    return columns
+
+
+def translation_row(
+    translation_result: TranslationResponse,
+    from_was_specified: bool,
+    compress_min_bytes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """The translation as a row of db.translations, in the compact format if compress_min_bytes is given"""
+    row = dict(
+        from_was_specified=from_was_specified,
+        from_language=translation_result.from_language,
+        to_language=translation_result.to_language,
+        source_text=translation_result.source_text,
+        source_text_hash=source_text_hash(translation_result.source_text),
+        translated_text=translation_result.translated_text,
+        translation_engine=translation_result.engine,
+        translation_engine_version=translation_result.engine_version,
+        has_alignment_info=translation_result.alignment is not None,
+        alignment=translation_result.alignment,
+        detection_confidence=translation_result.detected_language_confidence,
+    )
+    if compress_min_bytes is not None:
+        row.update(
+            encode_translation(
+                translation_result.source_text,
+                translation_result.translated_text,
+                translation_result.alignment,
+                compress_min_bytes=compress_min_bytes,
+            )
+        )
+    return row
+
+
+def decode_translation(record: Mapping[str, Any]) -> Dict[str, Any]:
+    """The record with source_text, translated_text and alignment as they were before being encoded"""
+    decoded = dict(record)
+    for name in ("source_text", "translated_text"):
+        if decoded[name] is None:
+            decoded[name] = decompress_text(decoded[f"{name}_compressed"])
+    if decoded["alignment_packed"] is not None:
+        decoded["alignment"] = unpack_alignment(
+            decoded["alignment_packed"],
+            decoded["source_text"],
+            decoded["translated_text"],
+        )
+    return decoded
@@ -0,0 +1,148 @@
+import time
+
+from cache import FrequencySketch, TranslationCache, cache_key
+from models.response import TranslationResponse
+
+
+def key(source_text):
+    return cache_key(
+        source_text,
+        to_language="es",
+        from_language="en",
+        with_alignment=False,
+        engine_name="fake",
+        engine_version="1",
+    )
+
+
+def response(source_text, translated_text=None):
+    return TranslationResponse(
+        engine="fake",
+        engine_version="1",
+        detected_language_confidence=None,
+        from_language="en",
+        to_language="es",
+        source_text=source_text,
+        translated_text=translated_text or source_text.upper(),
+        alignment=None,
+    )
+
+
+def requested(cache, source_text, times=1):
+    for _ in range(times):
+        cache.get(key(source_text))
+
+
+def test_sketch_estimates_request_counts_and_ages_them():
+    sketch = FrequencySketch(width=16)
+    hot, other = 1, 2
+    for _ in range(6):
+        sketch.add(hot)
+    assert sketch.estimate(hot) == 6
+    assert sketch.estimate(other) == 0
+
+    # counters are halved once 10 * width requests have been recorded
+    for _ in range(10 * sketch.width - 6):
+        sketch.add(other)
+    assert sketch.estimate(hot) == 3
+
+
+def test_least_recently_used_is_evicted():
+    cache = TranslationCache(max_entries=2)
+    for source_text in ("a", "b", "c"):
+        requested(cache, source_text)
+        cache.set(key(source_text), response(source_text))
+        # a is read again before c arrives, so b is the least recently used
+        if source_text == "b":
+            cache.get(key("a"))
+
+    assert cache.get(key("b")) is None
+    assert cache.get(key("a")).translated_text == "A"
+    assert cache.get(key("c")).translated_text == "C"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_key_requested_less_than_the_victim_is_not_admitted():
+    cache = TranslationCache(max_entries=1)
+    requested(cache, "hot", times=5)
+    cache.set(key("hot"), response("hot"))
+
+    requested(cache, "one-off")
+    cache.set(key("one-off"), response("one-off"))
+
+    assert cache.peek(key("one-off")) is None
+    assert cache.peek(key("hot")) is not None
+    assert cache.stats()["rejections"] == 1
+
+
+def test_key_requested_more_than_the_victim_is_admitted():
+    cache = TranslationCache(max_entries=1)
+    requested(cache, "old")
+    cache.set(key("old"), response("old"))
+
+    requested(cache, "popular", times=3)
+    cache.set(key("popular"), response("popular"))
+
+    assert cache.peek(key("old")) is None
+    assert cache.peek(key("popular")) is not None
+
+
+def test_entries_expire():
+    cache = TranslationCache(max_entries=10, ttl_seconds=0.05)
+    cache.set(key("a"), response("a"))
+    assert cache.get(key("a")) is not None
+
+    time.sleep(0.06)
+
+    assert cache.peek(key("a")) is None
+    assert cache.get(key("a")) is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0
+    assert stats["bytes"] == 0
+
+
+def test_bytes_are_accounted_for_and_bounded():
+    size = len(response("a").json().encode())
+    cache = TranslationCache(max_entries=10, max_bytes=2 * size)
+    for source_text in ("a", "b"):
+        cache.set(key(source_text), response(source_text))
+    assert cache.stats()["bytes"] == 2 * size
+
+    # replacing an entry doesn't count it twice
+    cache.set(key("a"), response("a"))
+    assert cache.stats()["bytes"] == 2 * size
+
+    requested(cache, "c")
+    cache.set(key("c"), response("c"))
+    assert cache.stats() == {
+        **cache.stats(),
+        "entries": 2,
+        "bytes": 2 * size,
+        "evictions": 1,
+    }
+
+    cache.set(key("big"), response("big", "x" * 2 * size))
+    assert cache.peek(key("big")) is None
+    assert cache.stats()["rejections"] == 1
+
+
+def test_peek_does_not_count_as_a_request():
+    cache = TranslationCache(max_entries=10)
+    cache.set(key("a"), response("a"))
+
+    assert cache.peek(key("a")).translated_text == "A"
+    assert cache.peek(key("b")) is None
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+    cache.record_miss(key("b"))
+    assert cache.stats()["misses"] == 1
+
+
+def test_serialized_body_is_reused_for_cached_responses():
+    cache = TranslationCache(max_entries=10, store_serialized=True)
+    cache.set(key("a"), response("a"))
+    cached = cache.get(key("a"))
+
+    assert cache.serialized(cached) is cache.serialized(cached)
+    assert cache.serialized(response("b")) == response("b").json().encode()
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+
+import pytest
+import sqlalchemy
+
+from db import source_text_hash, translations
+from persistence import SQLiteTranslationStore, TranslationStore
+
+
+def row(source_text, translated_text, to_language="es"):
+    return {
+        "from_was_specified": True,
+        "from_language": "en",
+        "to_language": to_language,
+        "source_text": source_text,
+        "source_text_hash": source_text_hash(source_text),
+        "translated_text": translated_text,
+        "translation_engine": "fake",
+        "translation_engine_version": "1",
+        "has_alignment_info": False,
+    }
+
+
+def with_store(path, test):
+    async def run():
+        store = SQLiteTranslationStore(path)
+        await store.connect()
+        try:
+            return await test(store)
+        finally:
+            await store.disconnect()
+
+    return asyncio.run(run())
+
+
+def test_store_must_implement_every_method():
+    class PartialStore(TranslationStore):
+        async def connect(self):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+def test_inserted_translations_are_looked_up(tmp_path):
+    async def test(store):
+        inserted = await store.insert_translations(
+            [row("hello", "hola"), row("bye", "adiós")]
+        )
+        records = await store.fetch_all(
+            translations.select().where(
+                translations.c.source_text_hash == source_text_hash("hello")
+            )
+        )
+        return inserted, records
+
+    inserted, records = with_store(tmp_path / "translations.sqlite3", test)
+
+    assert inserted == 2
+    assert [record["translated_text"] for record in records] == ["hola"]
+    assert records[0]["hit_count"] == 0
+
+
+def test_translations_already_stored_are_skipped(tmp_path):
+    async def test(store):
+        await store.insert_translations([row("hello", "hola")])
+        return await store.insert_translations(
+            [row("hello", "hola"), row("hello", "bonjour", to_language="fr")]
+        )
+
+    assert with_store(tmp_path / "translations.sqlite3", test) == 1
+
+
+def test_translations_are_kept_across_connections(tmp_path):
+    path = tmp_path / "translations.sqlite3"
+
+    async def insert(store):
+        await store.insert_translations([row("hello", "hola")])
+
+    async def count(store):
+        return await store.fetch_all(
+            sqlalchemy.select([sqlalchemy.func.count()]).select_from(translations)
+        )
+
+    with_store(path, insert)
+
+    assert with_store(path, count)[0][0] == 1
+
+
+def test_statements_are_executed_and_timed(tmp_path):
+    async def test(store):
+        await store.insert_translations([row("hello", "hola")])
+        await store.execute(
+            translations.update().values(hit_count=translations.c.hit_count + 1)
+        )
+        records = await store.fetch_all(translations.select())
+        return records, store.stats()
+
+    records, stats = with_store(tmp_path / "translations.sqlite3", test)
+
+    assert records[0]["hit_count"] == 1
+    assert set(stats["database"]["query_latency"]) >= {"insert", "update", "select"}
+
+
+def test_statements_run_off_the_event_loop(tmp_path):
+    threads = []
+
+    async def test(store):
+        execute = store._execute
+
+        def recording_execute(*args):
+            threads.append(threading.get_ident())
+            return execute(*args)
+
+        store._execute = recording_execute
+        await store.insert_translations([row("hello", "hola")])
+        await store.fetch_all(translations.select())
+
+    with_store(tmp_path / "translations.sqlite3", test)
+
+    assert len(threads) == 2
+    assert threading.get_ident() not in threads
@@ -0,0 +1,200 @@
+import asyncio
+
+from cache import cache_key
+from engines.circuit_breaker import CircuitBreakers
+from models.response import TranslationResponse
+from redis_cache import (
+    CIRCUIT_BREAKERS_KEY,
+    RedisCircuitBreakerState,
+    RedisTranslationCache,
+    redis_key,
+)
+
+
+class FakeRedis:
+    """The few aioredis commands used, against dicts - failing every command once down is set"""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionRefusedError("redis is down")
+
+    async def mget(self, *keys):
+        self._check()
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            def set(self, key, value, expire=None):
+                self.commands.append((key, value.encode()))
+
+            async def execute(self):
+                redis._check()
+                redis.values.update(self.commands)
+
+        return Pipeline()
+
+    async def hset(self, name, key, value):
+        self._check()
+        self.hashes.setdefault(name, {})[key] = value
+
+    async def hdel(self, name, key):
+        self._check()
+        self.hashes.get(name, {}).pop(key, None)
+
+    async def hgetall(self, name, encoding=None):
+        self._check()
+        return dict(self.hashes.get(name, {}))
+
+
+def key(source_text):
+    return cache_key(
+        source_text,
+        to_language="es",
+        from_language="en",
+        with_alignment=False,
+        engine_name="fake",
+        engine_version="1",
+    )
+
+
+def response(source_text):
+    return TranslationResponse(
+        engine="fake",
+        engine_version="1",
+        detected_language_confidence=None,
+        from_language="en",
+        to_language="es",
+        source_text=source_text,
+        translated_text=source_text.upper(),
+        alignment=None,
+    )
+
+
+def redis_cache(redis):
+    cache = RedisTranslationCache(dsn="redis://fake", ttl_seconds=60)
+    cache._redis = redis
+    return cache
+
+
+def test_values_are_read_back_in_order_of_the_keys():
+    cache = redis_cache(FakeRedis())
+
+    async def run():
+        await cache.set_many([(key("a"), response("a")), (key("c"), response("c"))])
+        return await cache.get_many([key("a"), key("b"), key("c")])
+
+    a, b, c = asyncio.run(run())
+
+    assert (a, b, c) == (response("a"), None, response("c"))
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_unreadable_value_is_a_miss():
+    redis = FakeRedis()
+    cache = redis_cache(redis)
+    redis.values[redis_key(key("a"))] = b'{"engine": "fake"}'
+    redis.values[redis_key(key("b"))] = b"not json"
+
+    assert asyncio.run(cache.get_many([key("a"), key("b")])) == [None, None]
+    assert cache.stats()["errors"] == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_redis_being_down_is_a_miss():
+    redis = FakeRedis()
+    redis.down = True
+    cache = redis_cache(redis)
+
+    async def run():
+        await cache.set(key("a"), response("a"))
+        return await cache.get(key("a"))
+
+    assert asyncio.run(run()) is None
+    assert cache.stats()["errors"] == 2
+
+
+def breakers():
+    return CircuitBreakers(
+        failure_rate=0.5,
+        min_calls=2,
+        window_seconds=10.0,
+        open_seconds=30.0,
+        slow_call_seconds=None,
+        per_language_pair=False,
+    )
+
+
+def shared_state(redis, breakers):
+    state = RedisCircuitBreakerState(breakers, dsn="redis://fake", sync_seconds=60)
+    state._redis = redis
+    breakers.on_state_change = state._state_changed
+    return state
+
+
+def test_opened_breakers_are_shared_with_other_replicas():
+    redis = FakeRedis()
+    first, second = breakers(), breakers()
+    first_state = shared_state(redis, first)
+    second_state = shared_state(redis, second)
+
+    async def run():
+        for _ in range(2):
+            first.record("deepl", "en", "es", None, failed=True)
+        # let the write in the background finish
+        await asyncio.sleep(0)
+        await second_state.sync()
+
+    asyncio.run(run())
+
+    assert not first.available("deepl", "en", "es")
+    assert not second.available("deepl", "en", "es")
+    assert second.available("google", "en", "es")
+    assert first_state.stats()["published"] == 1
+    assert second_state.stats()["received"] == 1
+
+
+def test_closed_breakers_are_removed():
+    redis = FakeRedis()
+    first = breakers()
+    shared_state(redis, first)
+
+    async def run():
+        for _ in range(2):
+            first.record("deepl", "en", "es", None, failed=True)
+        await asyncio.sleep(0)
+        assert "deepl" in redis.hashes[CIRCUIT_BREAKERS_KEY]
+        first._breakers["deepl"].open_until = 0
+        assert first.acquire("deepl", "en", "es")
+        first.record("deepl", "en", "es", 0.1, failed=False)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    assert redis.hashes[CIRCUIT_BREAKERS_KEY] == {}
+
+
+def test_invalid_or_unreachable_shared_state_is_ignored():
+    redis = FakeRedis()
+    redis.hashes[CIRCUIT_BREAKERS_KEY] = {"deepl": "soon", "google": "2e9"}
+    local = breakers()
+    state = shared_state(redis, local)
+
+    asyncio.run(state.sync())
+    redis.down = True
+    asyncio.run(state.sync())
+
+    assert local.available("deepl", "en", "es")
+    assert not local.available("google", "en", "es")
+    assert state.stats()["errors"] == 2
+    assert state.stats()["received"] == 1
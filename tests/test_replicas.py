@@ -0,0 +1,144 @@
+import asyncio
+
+from replicas import ReplicaPool
+
+
+class FakeDatabase:
+    """Answers every query with records, reporting lag_seconds of replication lag"""
+
+    def __init__(self, records=(), lag_seconds=0.0, error=None, delay_seconds=0):
+        self.records = list(records)
+        self.lag_seconds = lag_seconds
+        self.error = error
+        self.delay_seconds = delay_seconds
+        self.is_connected = False
+        self.reads = 0
+
+    async def connect(self):
+        if self.error is not None:
+            raise self.error
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    async def fetch_val(self, query):
+        return self.lag_seconds
+
+    async def fetch_all(self, query):
+        self.reads += 1
+        await asyncio.sleep(self.delay_seconds)
+        if self.error is not None:
+            raise self.error
+        return self.records
+
+    def stats(self):
+        return {}
+
+
+def read(primary, replicas, reads=1, max_lag_seconds=10):
+    async def run():
+        pool = ReplicaPool(
+            primary=primary,
+            replicas=replicas,
+            health_check_seconds=60,
+            max_lag_seconds=max_lag_seconds,
+            miss_fallback_timeout_seconds=0.05,
+        )
+        await pool.connect()
+        results = [await pool.fetch_all("SELECT") for _ in range(reads)]
+        await pool.disconnect()
+        return results, pool.stats()
+
+    return asyncio.run(run())
+
+
+def test_reads_are_spread_over_the_replicas():
+    primary = FakeDatabase(["primary"])
+    replicas = [FakeDatabase(["replica 0"]), FakeDatabase(["replica 1"])]
+
+    results, stats = read(primary, replicas, reads=4)
+
+    assert results == [["replica 0"], ["replica 1"], ["replica 0"], ["replica 1"]]
+    assert primary.reads == 0
+    assert stats["replicas"]["replica-0"]["reads"] == 2
+    assert stats["replicas"]["replica-1"]["reads"] == 2
+
+
+def test_reads_go_to_the_primary_without_replicas():
+    primary = FakeDatabase(["primary"])
+
+    results, stats = read(primary, [])
+
+    assert results == [["primary"]]
+    assert stats["primary_reads"] == 1
+
+
+def test_a_miss_on_a_replica_is_read_again_from_the_primary():
+    primary = FakeDatabase(["primary"])
+    replica = FakeDatabase([])
+
+    results, stats = read(primary, [replica])
+
+    assert results == [["primary"]]
+    assert stats["miss_fallbacks"] == 1
+
+
+def test_a_miss_settles_for_the_replica_when_the_primary_is_slow():
+    primary = FakeDatabase(["primary"], delay_seconds=1)
+    replica = FakeDatabase([])
+
+    results, stats = read(primary, [replica])
+
+    assert results == [[]]
+    assert stats["miss_timeouts"] == 1
+
+
+def test_lagging_replicas_are_not_read_from():
+    primary = FakeDatabase(["primary"])
+    replica = FakeDatabase(["replica"], lag_seconds=30)
+
+    results, stats = read(primary, [replica], max_lag_seconds=10)
+
+    assert results == [["primary"]]
+    assert replica.reads == 0
+    assert stats["replicas"]["replica-0"]["healthy"] is False
+    assert stats["replicas"]["replica-0"]["lag_seconds"] == 30
+
+
+def test_unreachable_replicas_are_not_read_from():
+    primary = FakeDatabase(["primary"])
+    replica = FakeDatabase(["replica"], error=OSError("connection refused"))
+
+    results, stats = read(primary, [replica])
+
+    assert results == [["primary"]]
+    assert stats["primary_reads"] == 1
+    assert stats["replicas"]["replica-0"]["healthy"] is False
+
+
+def test_a_failed_replica_read_falls_back_to_the_primary():
+    primary = FakeDatabase(["primary"])
+    replica = FakeDatabase(["replica"])
+
+    async def run():
+        pool = ReplicaPool(
+            primary=primary,
+            replicas=[replica],
+            health_check_seconds=60,
+            max_lag_seconds=10,
+            miss_fallback_timeout_seconds=0.05,
+        )
+        await pool.connect()
+        replica.error = OSError("connection reset")
+        results = [await pool.fetch_all("SELECT") for _ in range(2)]
+        await pool.disconnect()
+        return results, pool.stats()
+
+    results, stats = asyncio.run(run())
+
+    assert results == [["primary"], ["primary"]]
+    # marked unhealthy by the failed read, so not tried again until the next health check
+    assert replica.reads == 1
+    assert stats["replicas"]["replica-0"]["errors"] == 1
+    assert stats["primary_reads"] == 2
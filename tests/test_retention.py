@@ -0,0 +1,56 @@
+import asyncio
+
+from retention import (
+    ARCHIVE_COLD_TRANSLATIONS,
+    DELETE_COLD_TRANSLATIONS,
+    remove_cold_translations,
+)
+
+
+class FakeDatabase:
+    """Partitions of cold translations, each removal statement removing up to the batch size from one"""
+
+    def __init__(self, cold):
+        self.cold = dict(cold)
+        self.statements = []
+
+    async def fetch_all(self, query):
+        return [{"name": partition} for partition in self.cold]
+
+    async def fetch_val(self, query, values):
+        self.statements.append(query)
+        partition = next(name for name in self.cold if f"FROM {name} " in query)
+        removed = min(self.cold[partition], values["batch_size"])
+        self.cold[partition] -= removed
+        return removed
+
+
+def test_removes_each_partition_in_batches():
+    database = FakeDatabase({"translation_p0": 25, "translation_p1": 0})
+
+    removed = asyncio.run(
+        remove_cold_translations(database, 30, archive=False, batch_size=10)
+    )
+
+    assert removed == {"translation_p0": 25, "translation_p1": 0}
+    assert database.cold == {"translation_p0": 0, "translation_p1": 0}
+    # 10, 10 and 5 from the first partition then one finding nothing in the second
+    assert len(database.statements) == 4
+
+
+def test_stops_once_a_batch_is_full_and_the_next_is_empty():
+    database = FakeDatabase({"translation_p0": 20})
+
+    removed = asyncio.run(
+        remove_cold_translations(database, 30, archive=True, batch_size=10)
+    )
+
+    assert removed == {"translation_p0": 20}
+    assert len(database.statements) == 3
+    assert all("translation_archive" in statement for statement in database.statements)
+
+
+def test_statements_are_limited_to_a_batch():
+    for statement in (ARCHIVE_COLD_TRANSLATIONS, DELETE_COLD_TRANSLATIONS):
+        assert "LIMIT :batch_size" in statement
+        assert "ctid IN" in statement
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from errors import EngineApiError
+from single_flight import SingleFlight
+
+
+class Call:
+    """Counts how many times the shared work was started, completing once released"""
+
+    def __init__(self, result="translated"):
+        self.result = result
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def run_concurrently(single_flight, call, callers=3, cancel=None):
+    async def run():
+        call.release = asyncio.Event()
+        tasks = [
+            asyncio.ensure_future(single_flight.do("key", call)) for _ in range(callers)
+        ]
+        await asyncio.sleep(0)
+        if cancel is not None:
+            tasks[cancel].cancel()
+            await asyncio.sleep(0)
+        in_flight = single_flight.stats()["in_flight"]
+        call.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return results, in_flight
+
+    return asyncio.run(run())
+
+
+def test_concurrent_callers_share_one_call():
+    single_flight = SingleFlight()
+    call = Call()
+
+    results, in_flight = run_concurrently(single_flight, call)
+
+    assert results == ["translated"] * 3
+    assert call.calls == 1
+    assert in_flight == 1
+    assert single_flight.stats() == {"leaders": 1, "followers": 2, "in_flight": 0}
+
+
+def test_error_reaches_every_caller():
+    single_flight = SingleFlight()
+    error = EngineApiError("upstream is down")
+    call = Call(error)
+
+    results, _ = run_concurrently(single_flight, call)
+
+    assert results == [error] * 3
+    assert call.calls == 1
+
+
+@pytest.mark.parametrize("cancelled", [0, 1])
+def test_cancelled_caller_does_not_cancel_the_call_for_the_others(cancelled):
+    single_flight = SingleFlight()
+    call = Call()
+
+    results, _ = run_concurrently(single_flight, call, cancel=cancelled)
+
+    assert isinstance(results[cancelled], asyncio.CancelledError)
+    assert [r for i, r in enumerate(results) if i != cancelled] == ["translated"] * 2
+    assert call.calls == 1
+
+
+def test_key_is_released_once_the_call_completes():
+    single_flight = SingleFlight()
+    first, second = Call("first"), Call("second")
+
+    assert run_concurrently(single_flight, first, callers=1)[0] == ["first"]
+    assert run_concurrently(single_flight, second, callers=1)[0] == ["second"]
+    assert single_flight.stats()["in_flight"] == 0
+    assert (first.calls, second.calls) == (1, 1)
+
+
+def test_key_is_released_after_an_error():
+    single_flight = SingleFlight()
+    failing, succeeding = Call(EngineApiError("down")), Call()
+
+    run_concurrently(single_flight, failing, callers=2)
+
+    assert run_concurrently(single_flight, succeeding, callers=1)[0] == ["translated"]
+    assert single_flight.stats()["in_flight"] == 0
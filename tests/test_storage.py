@@ -0,0 +1,191 @@
+import pytest
+
+from compact_storage import compact_translations, compacted
+from db import translations
+from models.response import TranslationResponse
+from storage import (
+    decode_translation,
+    encode_translation,
+    pack_alignment,
+    translation_row,
+    unpack_alignment,
+)
+from tests.test_persistence import with_store
+
+
+def section(src_start, src_end, source_text, dest_start, dest_end, translated_text):
+    return {
+        "src": {
+            "start": str(src_start),
+            "end": str(src_end),
+            "text": source_text[src_start : src_end + 1],
+        },
+        "dest": {
+            "start": str(dest_start),
+            "end": str(dest_end),
+            "text": translated_text[dest_start : dest_end + 1],
+        },
+    }
+
+
+def translation(source_text, translated_text, alignment=None):
+    return TranslationResponse(
+        engine="fake",
+        engine_version="1",
+        detected_language_confidence=None,
+        from_language="en",
+        to_language="ko",
+        source_text=source_text,
+        translated_text=translated_text,
+        alignment=alignment,
+    )
+
+
+def stored(row):
+    """The row as it is read back from the database, with every column present"""
+    return {
+        **{column.name: None for column in translations.columns},
+        "source_text_compressed": None,
+        "translated_text_compressed": None,
+        "alignment_packed": None,
+        **row,
+    }
+
+
+def round_trip(result, compress_min_bytes):
+    row = translation_row(result, True, compress_min_bytes=compress_min_bytes)
+    return row, decode_translation(stored(row))
+
+
+MULTI_BYTE = ("hello world", "안녕하세요 세계")
+MULTI_BYTE_ALIGNMENT = [
+    section(0, 4, MULTI_BYTE[0], 0, 4, MULTI_BYTE[1]),
+    section(6, 10, MULTI_BYTE[0], 6, 7, MULTI_BYTE[1]),
+]
+
+
+def test_alignment_offsets_are_characters_not_bytes():
+    packed = pack_alignment(MULTI_BYTE_ALIGNMENT, *MULTI_BYTE)
+
+    assert len(packed) == 2 * 16
+    assert unpack_alignment(packed, *MULTI_BYTE) == MULTI_BYTE_ALIGNMENT
+    assert unpack_alignment(packed, *MULTI_BYTE)[1]["dest"]["text"] == "세계"
+
+
+@pytest.mark.parametrize(
+    "alignment",
+    [
+        # sections whose text isn't the slice of the text at their offsets
+        [{**MULTI_BYTE_ALIGNMENT[0], "dest": {"start": "0", "end": "4", "text": "x"}}],
+        [{"src": {"start": "a", "end": "4", "text": "hello"}, "dest": {}}],
+        [{"src": {"start": "-1", "end": "4", "text": ""}, "dest": {}}],
+    ],
+)
+def test_alignments_which_cant_be_rebuilt_are_not_packed(alignment):
+    assert pack_alignment(alignment, *MULTI_BYTE) is None
+
+    row, decoded = round_trip(translation(*MULTI_BYTE, alignment=alignment), 0)
+
+    assert row["alignment_packed"] is None
+    assert decoded["alignment"] == alignment
+
+
+@pytest.mark.parametrize("alignment", [None, [], MULTI_BYTE_ALIGNMENT])
+def test_alignment_round_trips(alignment):
+    row, decoded = round_trip(translation(*MULTI_BYTE, alignment=alignment), 1000)
+
+    assert row["alignment"] is None
+    assert decoded["alignment"] == alignment
+    assert row["has_alignment_info"] is (alignment is not None)
+
+
+def test_texts_below_the_threshold_are_not_compressed():
+    # the threshold is in bytes, the korean text being 3 per character
+    source_text, translated_text = MULTI_BYTE
+    row, decoded = round_trip(translation(source_text, translated_text), 12)
+
+    assert row["source_text"] == source_text
+    assert row["source_text_compressed"] is None
+    assert row["translated_text"] is None
+    assert row["translated_text_compressed"] is not None
+    assert (decoded["source_text"], decoded["translated_text"]) == MULTI_BYTE
+
+
+def test_texts_above_the_threshold_are_compressed():
+    source_text = "the same sentence again. " * 40
+    translated_text = "la misma frase otra vez. " * 40
+    row, decoded = round_trip(translation(source_text, translated_text), 256)
+
+    assert row["source_text"] is None
+    assert len(row["source_text_compressed"]) < len(source_text) // 4
+    assert decoded["source_text"] == source_text
+    assert decoded["translated_text"] == translated_text
+
+
+def test_legacy_rows_are_decoded_as_they_are():
+    row = translation_row(
+        translation(*MULTI_BYTE, alignment=MULTI_BYTE_ALIGNMENT), True
+    )
+
+    decoded = decode_translation(stored(row))
+
+    assert decoded == stored(row)
+
+
+def test_compacted_rows_are_not_rewritten_again():
+    result = translation(*MULTI_BYTE, alignment=MULTI_BYTE_ALIGNMENT)
+    legacy = stored(translation_row(result, True))
+
+    values = compacted(legacy, 12)
+
+    assert values == encode_translation(
+        *MULTI_BYTE, MULTI_BYTE_ALIGNMENT, compress_min_bytes=12
+    )
+    assert compacted({**legacy, **values}, 12) is None
+
+
+def test_compact_storage_rewrites_legacy_rows(tmp_path):
+    long_text = "the same sentence again. " * 40
+    results = [
+        translation(*MULTI_BYTE, alignment=MULTI_BYTE_ALIGNMENT),
+        translation(long_text, long_text.upper()),
+        translation("hi", "안녕"),
+    ]
+    compact = translation("bye. " * 100, "안녕히. " * 100)
+
+    async def test(store):
+        await store.insert_translations(
+            [translation_row(result, True) for result in results]
+        )
+        # already in the compact format, inserted separately as the rows of a batch all have the same columns
+        await store.insert_translations(
+            [translation_row(compact, True, compress_min_bytes=256)]
+        )
+        rewritten = await compact_translations(store, compress_min_bytes=256)
+        rewritten_again = await compact_translations(store, compress_min_bytes=256)
+        records = await store.fetch_all(
+            translations.select().order_by(translations.c.id)
+        )
+        return rewritten, rewritten_again, records
+
+    rewritten, rewritten_again, records = with_store(
+        tmp_path / "translations.sqlite3", test
+    )
+
+    # the short texts without alignment and the translation stored compact are left as they are
+    assert rewritten == 2
+    assert rewritten_again == 0
+    assert records[0]["alignment"] is None
+    assert records[0]["alignment_packed"] is not None
+    assert records[1]["source_text"] is None
+    assert records[1]["source_text_compressed"] is not None
+    decoded = [decode_translation(record) for record in records]
+    assert [
+        (record["source_text"], record["translated_text"], record["alignment"])
+        for record in decoded
+    ] == [
+        (result.source_text, result.translated_text, result.alignment)
+        for result in results
+    ] + [
+        (compact.source_text, compact.translated_text, None)
+    ]
@@ -0,0 +1,205 @@
+import asyncio
+
+import pytest
+
+import translate
+from cache import TranslationCache
+from db import translations
+from engines.base import BaseTranslationEngine
+from engines.controller import EngineController
+from engines.hedging import Hedger
+from errors import EngineApiError
+from models.response import TranslationResponse
+from persistence import SQLiteTranslationStore
+from storage import decode_translation, translation_row
+from write_behind import TranslationWriter, UsageTracker
+
+
+class FakeEngine(BaseTranslationEngine):
+    VERSION = "1"
+
+    def __init__(self, name, delay_seconds=0, error=None):
+        self.NAME = name
+        self.delay_seconds = delay_seconds
+        self.error = error
+        self.calls = 0
+        super().__init__()
+
+    def get_supported_translations(self):
+        return {"en": ["es"]}
+
+    async def translate(
+        self, source_text, from_language, to_language, with_alignment=False
+    ):
+        self.calls += 1
+        await asyncio.sleep(self.delay_seconds)
+        if self.error is not None:
+            raise self.error
+        return translation(source_text, self.NAME)
+
+
+def translation(source_text, engine_name):
+    return TranslationResponse(
+        engine=engine_name,
+        engine_version="1",
+        detected_language_confidence=None,
+        from_language="en",
+        to_language="es",
+        source_text=source_text,
+        translated_text=f"{source_text} by {engine_name}",
+        alignment=None,
+    )
+
+
+class CountingStore(SQLiteTranslationStore):
+    lookups = 0
+
+    async def fetch_all(self, query, is_miss=lambda records: not records):
+        self.lookups += 1
+        return await super().fetch_all(query, is_miss)
+
+
+@pytest.fixture
+def lookup(tmp_path, monkeypatch):
+    """
+    Looks up "hello" with each of engines ("first" being preferred, the rest the fallback chain in order) after storing
+    translations by the stored_by engines, returning the translation, where it came from, the number of database
+    lookups and the engines of the stored translations afterwards
+    """
+    monkeypatch.setattr(translate.features, "enable_persistence", True)
+    monkeypatch.setattr(translate.features, "enable_coalescing", False)
+    monkeypatch.setattr(translate, "translation_cache", TranslationCache(0))
+    monkeypatch.setattr(translate, "hedger", Hedger(max_fraction=1.0))
+
+    def run(engines, stored_by=(), fallback=True, hedge_delay_seconds=None):
+        monkeypatch.setattr(
+            translate.features, "enable_hedging", hedge_delay_seconds is not None
+        )
+        controller = EngineController()
+        controller.available_engines = {engine.NAME: engine for engine in engines}
+        names = [engine.NAME for engine in engines]
+        controller.set_language_preferences({"xx": {"xx": names}}, names)
+        monkeypatch.setattr(
+            controller.health, "latency_percentile", lambda *args: hedge_delay_seconds
+        )
+        monkeypatch.setattr(translate, "controller", controller)
+
+        async def test():
+            store = CountingStore(tmp_path / "translations.sqlite3")
+            await store.connect()
+            writer = TranslationWriter(
+                store, max_queue_size=10, batch_size=10, flush_interval_seconds=0.01
+            )
+            monkeypatch.setattr(translate, "store", store)
+            monkeypatch.setattr(translate, "writer", writer)
+            monkeypatch.setattr(
+                translate,
+                "usage",
+                UsageTracker(store, flush_interval_seconds=60, max_pending=10),
+            )
+            await writer.start()
+            try:
+                # one at a time so the translations stored first have the lowest ids
+                for engine_name in stored_by:
+                    await store.insert_translations(
+                        [translation_row(translation("hello", engine_name), True)]
+                    )
+                result, source = await translate._lookup_or_translate(
+                    source_text="hello",
+                    to_language="es",
+                    from_language="en",
+                    preferred_engine="first",
+                    with_alignment=False,
+                    fallback=fallback,
+                )
+                lookups = store.lookups
+            finally:
+                await writer.stop()
+            records = await store.fetch_all(
+                translations.select().order_by(translations.c.id)
+            )
+            await store.disconnect()
+            stored = [
+                decode_translation(record)["translation_engine"] for record in records
+            ]
+            return result, source, lookups, stored
+
+        return asyncio.run(test())
+
+    return run
+
+
+def test_the_preferred_engines_stored_translation_is_used(lookup):
+    engines = [FakeEngine("first"), FakeEngine("second")]
+
+    result, source, lookups, _ = lookup(engines, stored_by=["second", "first"])
+
+    assert (result.engine, source) == ("first", "database")
+    assert lookups == 1
+    assert engines[0].calls == 0
+
+
+def test_the_best_ranked_stored_translation_in_the_chain_is_used(lookup):
+    engines = [FakeEngine("first"), FakeEngine("second"), FakeEngine("third")]
+
+    # stored by an engine outside the chain too
+    result, source, lookups, stored = lookup(
+        engines, stored_by=["other", "third", "second"]
+    )
+
+    assert (result.engine, source) == ("second", "database")
+    # one query for the whole chain
+    assert lookups == 1
+    assert [engine.calls for engine in engines] == [0, 0, 0]
+    assert stored == ["other", "third", "second"]
+
+
+def test_only_the_preferred_engine_is_looked_up_without_fallback(lookup):
+    engines = [FakeEngine("first"), FakeEngine("second")]
+
+    result, source, _, stored = lookup(engines, stored_by=["second"], fallback=False)
+
+    assert (result.engine, source) == ("first", "api")
+    assert stored == ["second", "first"]
+
+
+def test_a_failing_engine_falls_back_to_the_next_which_is_stored(lookup):
+    engines = [FakeEngine("first", error=EngineApiError("down")), FakeEngine("second")]
+
+    result, source, _, stored = lookup(engines)
+
+    assert (result.engine, source) == ("second", "api")
+    assert [engine.calls for engine in engines] == [1, 1]
+    assert stored == ["second"]
+
+
+def test_a_failing_engine_is_raised_without_fallback(lookup):
+    engines = [FakeEngine("first", error=EngineApiError("down")), FakeEngine("second")]
+
+    with pytest.raises(EngineApiError):
+        lookup(engines, fallback=False)
+
+    assert engines[1].calls == 0
+
+
+def test_a_slow_engine_is_hedged_with_the_next(lookup):
+    engines = [FakeEngine("first", delay_seconds=1), FakeEngine("second")]
+
+    result, source, _, stored = lookup(engines, hedge_delay_seconds=0.01)
+
+    assert (result.engine, source) == ("second", "api")
+    assert stored == ["second"]
+
+
+def test_an_engine_which_failed_as_a_hedge_is_not_tried_again(lookup):
+    engines = [
+        FakeEngine("first", delay_seconds=0.05, error=EngineApiError("down")),
+        FakeEngine("second", error=EngineApiError("down")),
+        FakeEngine("third"),
+    ]
+
+    result, source, _, stored = lookup(engines, hedge_delay_seconds=0.01)
+
+    assert (result.engine, source) == ("third", "api")
+    assert [engine.calls for engine in engines] == [1, 1, 1]
+    assert stored == ["third"]
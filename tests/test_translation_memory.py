@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from db import translations
+from errors import TranslationMemoryError
+from models.response import TranslationResponse
+from storage import translation_row
+from translation_memory import (
+    TranslationMemoryFormat,
+    _read_jsonl,
+    _read_tmx,
+    export_translation_memory,
+)
+
+
+def translation(source_text="hello", translated_text="hola", **fields):
+    return TranslationResponse(
+        **{
+            "engine": "fake",
+            "engine_version": "1",
+            "detected_language_confidence": None,
+            "from_language": "en",
+            "to_language": "es",
+            "source_text": source_text,
+            "translated_text": translated_text,
+            "alignment": None,
+            **fields,
+        }
+    )
+
+
+class FakeDatabase:
+    """Iterates over stored rows of the given translations"""
+
+    def __init__(self, entries):
+        self.records = [
+            {
+                **{column.name: None for column in translations.columns},
+                **translation_row(result, from_was_specified),
+            }
+            for result, from_was_specified in entries
+        ]
+
+    async def iterate(self, query):
+        for record in self.records:
+            yield record
+
+
+async def _chunks(data: bytes, chunk_size: int):
+    for start in range(0, len(data), chunk_size):
+        yield data[start : start + chunk_size]
+
+
+def round_trip(entries, format, chunk_size=7):
+    async def run():
+        exported = "".join(
+            [
+                chunk
+                async for chunk in export_translation_memory(
+                    FakeDatabase(entries), format
+                )
+            ]
+        )
+        read = _read_tmx if format == TranslationMemoryFormat.tmx else _read_jsonl
+        return [entry async for entry in read(_chunks(exported.encode(), chunk_size))]
+
+    return asyncio.run(run())
+
+
+ENTRIES = [
+    (translation(), True),
+    (
+        translation(
+            "a < b & c",
+            "a < b & c",
+            to_language="fr",
+            detected_language_confidence=0.75,
+        ),
+        False,
+    ),
+    (
+        translation(
+            "hello",
+            "안녕하세요",
+            to_language="ko",
+            alignment=[
+                {
+                    "src": {"start": "0", "end": "4", "text": "hello"},
+                    "dest": {"start": "0", "end": "4", "text": "안녕하세요"},
+                }
+            ],
+        ),
+        True,
+    ),
+]
+
+
+@pytest.mark.parametrize("format", list(TranslationMemoryFormat))
+def test_translations_round_trip(format):
+    assert round_trip(ENTRIES, format) == ENTRIES
+
+
+@pytest.mark.parametrize("format", list(TranslationMemoryFormat))
+def test_translations_into_the_language_they_are_from_round_trip(format):
+    entries = [(translation("Hello", "hello", to_language="en"), True)]
+
+    assert round_trip(entries, format) == entries
+
+
+def test_characters_xml_does_not_allow_are_left_out_of_tmx():
+    entries = [(translation("bell\x07 and\x1b escape", "tab\tand\x00 nul"), True)]
+
+    [(result, _)] = round_trip(entries, TranslationMemoryFormat.tmx)
+
+    assert result.source_text == "bell and escape"
+    assert result.translated_text == "tab\tand nul"
+
+
+def test_jsonl_keeps_control_characters():
+    entries = [(translation("bell\x07", "escape\x1b"), True)]
+
+    assert round_trip(entries, TranslationMemoryFormat.jsonl) == entries
+
+
+def test_invalid_tmx_unit_is_an_error():
+    tmx = b"""<tmx version="1.4"><body>
+<tu srclang="en"><prop type="x-engine">fake</prop>
+<tuv xml:lang="en"><seg>hello</seg></tuv>
+</tu></body></tmx>"""
+
+    async def run():
+        return [entry async for entry in _read_tmx(_chunks(tmx, 1024))]
+
+    with pytest.raises(TranslationMemoryError):
+        asyncio.run(run())
@@ -0,0 +1,198 @@
+import asyncio
+
+import sqlalchemy
+
+from db import translations
+from persistence import SQLiteTranslationStore, TranslationStore
+from tests.test_persistence import row as stored_row
+from write_behind import TranslationWriter, UsageTracker
+
+
+class FakeStore(TranslationStore):
+    """Keeps inserted rows, failing writes of rows whose text contains a NUL as postgres does"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+        self.rows = []
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def fetch_all(self, query, is_miss=None):
+        return []
+
+    async def execute(self, statement):
+        pass
+
+    async def insert_translations(self, rows):
+        self.batches.append([row["source_text"] for row in rows])
+        if self.error is not None:
+            raise self.error
+        if any("\x00" in row["source_text"] for row in rows):
+            raise sqlalchemy.exc.DataError("INSERT", {}, ValueError("NUL"))
+        new = [row for row in rows if row not in self.rows]
+        self.rows.extend(new)
+        return len(new)
+
+    def stats(self):
+        return {}
+
+
+def row(source_text):
+    return {"source_text": source_text, "translation_engine": "fake"}
+
+
+def write(store, source_texts, batch_size=500):
+    async def run():
+        writer = TranslationWriter(
+            store,
+            max_queue_size=100,
+            batch_size=batch_size,
+            flush_interval_seconds=0.01,
+        )
+        await writer.start()
+        for source_text in source_texts:
+            writer.submit(row(source_text))
+        await writer.stop()
+        return writer.stats()
+
+    return asyncio.run(run())
+
+
+def test_rows_are_written_in_batches_of_up_to_batch_size():
+    store = FakeStore()
+
+    stats = write(store, ["a", "b", "c", "d", "e"], batch_size=2)
+
+    assert store.batches == [["a", "b"], ["c", "d"], ["e"]]
+    assert stats["written"] == 5
+    assert stats["batches"] == 3
+    assert stats["queued"] == 0
+
+
+def test_a_partial_batch_is_written_once_the_flush_interval_has_passed():
+    async def run():
+        store = FakeStore()
+        writer = TranslationWriter(
+            store, max_queue_size=100, batch_size=500, flush_interval_seconds=0.01
+        )
+        await writer.start()
+        writer.submit(row("a"))
+        await asyncio.sleep(0.1)
+        batches = list(store.batches)
+        await writer.stop()
+        return batches
+
+    assert asyncio.run(run()) == [["a"]]
+
+
+def test_stop_writes_what_is_queued_without_waiting_for_the_flush_interval():
+    async def run():
+        store = FakeStore()
+        writer = TranslationWriter(
+            store, max_queue_size=100, batch_size=500, flush_interval_seconds=60
+        )
+        await writer.start()
+        for source_text in ["a", "b", "c"]:
+            writer.submit(row(source_text))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(writer.stop(), timeout=1)
+        return store
+
+    store = asyncio.run(run())
+
+    assert store.batches == [["a", "b", "c"]]
+
+
+def test_rows_are_dropped_while_the_queue_is_full():
+    async def run():
+        store = FakeStore()
+        writer = TranslationWriter(
+            store, max_queue_size=2, batch_size=500, flush_interval_seconds=0.01
+        )
+        await writer.start()
+        for source_text in ["a", "b", "c"]:
+            writer.submit(row(source_text))
+        await writer.stop()
+        return store, writer.stats()
+
+    store, stats = asyncio.run(run())
+
+    assert [r["source_text"] for r in store.rows] == ["a", "b"]
+    assert stats["dropped"] == 1
+
+
+def test_only_the_bad_row_of_a_batch_fails():
+    store = FakeStore()
+
+    stats = write(store, ["a", "b", "c\x00", "d", "e"])
+
+    assert [r["source_text"] for r in store.rows] == ["a", "b", "d", "e"]
+    assert stats["written"] == 4
+    assert stats["failed"] == 1
+    assert stats["batches"] == 1
+
+
+def test_batch_failing_because_of_the_store_is_not_retried():
+    store = FakeStore(error=OSError("connection refused"))
+
+    stats = write(store, ["a", "b", "c", "d"])
+
+    assert store.batches == [["a", "b", "c", "d"]]
+    assert stats["failed"] == 4
+    assert stats["written"] == 0
+
+
+def test_usage_is_recorded_by_id_and_by_key(tmp_path):
+    async def run():
+        store = SQLiteTranslationStore(tmp_path / "translations.sqlite3")
+        await store.connect()
+        await store.insert_translations(
+            [
+                stored_row("hello", "hola"),
+                stored_row("hello", "bonjour", to_language="fr"),
+                stored_row("bye", "adiós"),
+            ]
+        )
+        ids = {
+            (record["source_text"], record["to_language"]): record["id"]
+            for record in await store.fetch_all(translations.select())
+        }
+        usage = UsageTracker(store, flush_interval_seconds=60, max_pending=100)
+        usage.record(ids[("hello", "es")])
+        usage.record(ids[("hello", "es")])
+        # served from a cache tier
+        usage.record_key(("hello", "es", "fake", "1"))
+        usage.record_key(("hello", "fr", "fake", "1"))
+        usage.record_key(("hello", "fr", "fake", "1"))
+        usage.record_key(("hello", "fr", "other engine", "1"))
+        await usage.start()
+        await usage.stop()
+        hit_counts = {
+            (record["source_text"], record["to_language"]): record["hit_count"]
+            for record in await store.fetch_all(translations.select())
+        }
+        await store.disconnect()
+        return hit_counts, usage.stats()
+
+    hit_counts, stats = asyncio.run(run())
+
+    assert hit_counts == {("hello", "es"): 3, ("hello", "fr"): 2, ("bye", "es"): 0}
+    assert stats["touched"] == 4
+    assert stats["pending"] == 0
+
+
+def test_usage_is_dropped_once_too_much_is_pending():
+    usage = UsageTracker(FakeStore(), flush_interval_seconds=60, max_pending=2)
+    usage.record(1)
+    usage.record_key(("hello", "es", "fake", "1"))
+    usage.record(1)
+    usage.record(2)
+    usage.record_key(("bye", "es", "fake", "1"))
+
+    assert usage.stats()["dropped"] == 2
+    assert usage.stats()["pending"] == 2
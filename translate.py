@@ -1,15 +1,23 @@
 import logging
-from typing import Optional
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
-from databases.backends.postgres import Record
 from fastapi import BackgroundTasks, Query, Response
-from sqlalchemy.sql import and_
+from sqlalchemy.sql import and_, or_
 
-from db import database, translations
+from cache import CacheKey, TranslationCache, cache_key
+from db import database, read_database, source_text_hash, translations
+from engines.base import BaseTranslationEngine
+from engines.coalescer import TranslationCoalescer
 from engines.controller import BEST, ENGINE_NAME_MAP, EngineController
-from errors import BaseMultiTranslateError
+from engines.hedging import Hedger
+from errors import BaseMultiTranslateError, NoValidEngineConfiguredError
 from models.response import TranslationResponse
-from settings import FeaturesSettings
+from persistence import PostgresTranslationStore, SQLiteTranslationStore
+from redis_cache import RedisCircuitBreakerState, RedisTranslationCache
+from settings import FeaturesSettings, PersistenceBackendEnum
+from single_flight import SingleFlight
+from storage import decode_translation, translation_row
+from write_behind import TranslationWriter, UsageTracker
 
 
 features = FeaturesSettings()
@@ -17,25 +25,173 @@ features = FeaturesSettings()
 _logger = logging.getLogger(__name__)
 
 controller = EngineController()
+translation_cache = TranslationCache(
+    max_entries=features.translation_cache_max_entries,
+    max_bytes=features.translation_cache_max_bytes,
+    ttl_seconds=features.translation_cache_ttl_seconds,
+    store_serialized=features.translation_cache_store_serialized,
+)
+redis_cache = RedisTranslationCache(
+    dsn=features.redis_dsn, ttl_seconds=features.redis_cache_ttl_seconds
+)
+# engine circuit breakers shared by all replicas
+circuit_breaker_state = RedisCircuitBreakerState(
+    controller.breakers,
+    dsn=features.redis_dsn,
+    sync_seconds=features.circuit_breaker_sync_seconds,
+)
+# identical concurrent requests share one database lookup and upstream call
+single_flight = SingleFlight()
+# where previous translations are looked up and new ones written
+store = (
+    SQLiteTranslationStore(features.sqlite_path)
+    if features.persistence_backend == PersistenceBackendEnum.SQLITE
+    else PostgresTranslationStore(database, read_database)
+)
+# new translations are persisted in batches behind the responses
+writer = TranslationWriter(
+    store,
+    max_queue_size=features.write_behind_max_queue_size,
+    batch_size=features.write_behind_batch_size,
+    flush_interval_seconds=features.write_behind_flush_interval_seconds,
+)
+# when stored translations were last served, for the retention job
+usage = UsageTracker(
+    store,
+    flush_interval_seconds=features.last_used_flush_interval_seconds,
+    max_pending=features.last_used_max_pending,
+)
+coalescer = TranslationCoalescer(
+    window_seconds=features.coalesce_window_ms / 1000,
+    max_texts=features.coalesce_max_texts,
+    max_characters=features.coalesce_max_characters,
+)
+# slow upstream calls are also sent to the next engine in the fallback chain
+hedger = Hedger(max_fraction=features.hedge_max_fraction)
+# new translations are stored in the compact format when it is on, see storage.py
+compress_min_bytes = (
+    features.compact_storage_min_text_bytes if features.compact_storage else None
+)
 
 
-async def save_translation(
-    translation_result: TranslationResponse, from_was_specified: bool
-) -> None:
-    statement = translations.insert().values(
-        from_was_specified=from_was_specified,
-        from_language=translation_result.from_language,
-        to_language=translation_result.to_language,
-        source_text=translation_result.source_text,
-        translated_text=translation_result.translated_text,
-        translation_engine=translation_result.engine,
-        translation_engine_version=translation_result.engine_version,
-        has_alignment_info=translation_result.alignment is not None,
-        alignment=translation_result.alignment,
-        detection_confidence=translation_result.detected_language_confidence,
+def _record_served(translation_result: TranslationResponse) -> None:
+    """Count a translation served from one of the cache tiers towards the usage of the stored translation"""
+    if features.enable_persistence:
+        usage.record_key(
+            (
+                translation_result.source_text,
+                translation_result.to_language,
+                translation_result.engine,
+                translation_result.engine_version,
+            )
+        )
+
+
+async def _remember_many(items: List[Tuple[CacheKey, TranslationResponse]]) -> None:
+    """Write through to the cache tiers"""
+    for key, translation_result in items:
+        translation_cache.set(key, translation_result)
+    if redis_cache.enabled:
+        await redis_cache.set_many(items)
+
+
+def _lookup_conditions(
+    engines: List[BaseTranslationEngine],
+    to_language: str,
+    from_language: Optional[str],
+    with_alignment: bool,
+) -> list:
+    conditions = [
+        translations.c.to_language == to_language,
+        or_(
+            *(
+                and_(
+                    translations.c.translation_engine == engine.NAME,
+                    translations.c.translation_engine_version == engine.VERSION,
+                )
+                for engine in engines
+            )
+        ),
+    ]
+    if with_alignment:
+        conditions.append(translations.c.has_alignment_info == True)
+
+    if from_language is None:
+        # we need this since specifying a from language will influence which engine is used and the output if
+        # sentence is valid in multiple languages
+        conditions.append(translations.c.from_was_specified == False)
+    else:
+        conditions.append(translations.c.from_language == from_language)
+    return conditions
+
+
+def _record_to_response(
+    record: Mapping[str, Any], with_alignment: bool
+) -> TranslationResponse:
+    """From a record decoded by decode_translation"""
+    return TranslationResponse(
+        engine=record["translation_engine"],
+        engine_version=record["translation_engine_version"],
+        detected_language_confidence=record["detection_confidence"],
+        from_language=record["from_language"],
+        to_language=record["to_language"],
+        source_text=record["source_text"],
+        translated_text=record["translated_text"],
+        alignment=record["alignment"] if with_alignment else None,
     )
-    result = await database.execute(statement)
-    _logger.debug("insertion result %s", result)
+
+
+def _hottest(limit: int):
+    return translations.select().order_by(translations.c.hit_count.desc()).limit(limit)
+
+
+async def warm_up_cache(limit: int) -> int:
+    """
+    Preload the in-process cache with the most used stored translations, returning how many were loaded. Each is
+    loaded under the keys requests for it would use - with and without alignment info if it has any
+    """
+    records = [
+        decode_translation(record)
+        for record in await store.fetch_all(
+            _hottest(min(limit, translation_cache.max_entries))
+        )
+    ]
+    # least used first so the most used are the last to be evicted
+    for record in reversed(records):
+        requested_from_language = (
+            record["from_language"] if record["from_was_specified"] else None
+        )
+        for with_alignment in (
+            (False, True) if record["has_alignment_info"] else (False,)
+        ):
+            key = cache_key(
+                record["source_text"],
+                to_language=record["to_language"],
+                from_language=requested_from_language,
+                with_alignment=with_alignment,
+                engine_name=record["translation_engine"],
+                engine_version=record["translation_engine_version"],
+            )
+            translation_cache.set(key, _record_to_response(record, with_alignment))
+    return len(records)
+
+
+async def hot_translations(limit: int) -> List[Dict[str, Any]]:
+    records = [
+        decode_translation(record) for record in await store.fetch_all(_hottest(limit))
+    ]
+    return [
+        {
+            "source_text": record["source_text"],
+            "from_language": record["from_language"],
+            "to_language": record["to_language"],
+            "engine": record["translation_engine"],
+            "engine_version": record["translation_engine_version"],
+            "hit_count": record["hit_count"],
+            "last_used_at": record["last_used_at"],
+        }
+        for record in records
+    ]
 
 
 async def do_translation(
@@ -71,21 +227,234 @@ async def do_translation(
         "engine does not succeed",
     ),
 ) -> TranslationResponse:
-    additional_conditions = []
-    if with_alignment:
-        additional_conditions.append(translations.c.has_alignment_info == True)
+    translation_result, source = await single_flight.do(
+        (
+            source_text,
+            to_language,
+            from_language,
+            preferred_engine,
+            with_alignment,
+            fallback,
+        ),
+        lambda: _lookup_or_translate(
+            source_text=source_text,
+            to_language=to_language,
+            from_language=from_language,
+            preferred_engine=preferred_engine,
+            with_alignment=with_alignment,
+            fallback=fallback,
+        ),
+    )
+    response.headers["X-Translation-Source"] = source
+    return translation_result
+
+
+async def _lookup_or_translate(
+    source_text: str,
+    to_language: str,
+    from_language: Optional[str],
+    preferred_engine: str,
+    with_alignment: bool,
+    fallback: bool,
+) -> Tuple[TranslationResponse, str]:
+    """
+    Returns the translation along with where it came from - one of the cache tiers, the database or the api.
+
+    A previous translation by any engine in the fallback chain is used in preference to a new one, the best ranked
+    wins. Each tier is only asked about the engines ranked above the best hit so far so the database is queried at
+    most once, however long the chain.
+    """
+    engines = controller.get_fallback_chain(
+        name=preferred_engine,
+        needs_alignment=with_alignment,
+        needs_detection=from_language is None,
+        from_language=from_language,
+        to_language=to_language,
+        fallback=fallback,
+    )
+    keys = [
+        cache_key(
+            source_text,
+            to_language=to_language,
+            from_language=from_language,
+            with_alignment=with_alignment,
+            engine_name=engine.NAME,
+            engine_version=engine.VERSION,
+        )
+        for engine in engines
+    ]
+    # the position of the best ranked engine with a previous translation, the translation and where it came from
+    best: Optional[Tuple[int, TranslationResponse, str]] = None
+    served_record: Optional[Dict[str, Any]] = None
+
+    if translation_cache.enabled:
+        for position, key in enumerate(keys):
+            # only the key served is counted as requested, by get here or record_miss once served by another tier
+            if translation_cache.peek(key) is None:
+                continue
+            cached_result = translation_cache.get(key)
+            if position == 0:
+                _record_served(cached_result)
+                return cached_result, "cache"
+            best = (position, cached_result, "cache")
+            break
+
+    ranked_above = len(engines) if best is None else best[0]
+    if redis_cache.enabled and ranked_above:
+        cached_results = await redis_cache.get_many(keys[:ranked_above])
+        for position, cached_result in enumerate(cached_results):
+            if cached_result is not None:
+                best = (position, cached_result, "redis")
+                break
+
+    ranked_above = len(engines) if best is None else best[0]
+    if features.enable_persistence and ranked_above:
+        query = translations.select().where(
+            and_(
+                translations.c.source_text_hash == source_text_hash(source_text),
+                *_lookup_conditions(
+                    engines[:ranked_above],
+                    to_language=to_language,
+                    from_language=from_language,
+                    with_alignment=with_alignment,
+                ),
+            )
+        )
+        _logger.debug(
+            "querying database for previous translation results with %s", query
+        )
+        records = [
+            decode_translation(record) for record in await store.fetch_all(query)
+        ]
+        _logger.debug("Got results from database: %s", records)
+        positions = {
+            (engine.NAME, engine.VERSION): position
+            for position, engine in enumerate(engines[:ranked_above])
+        }
+        for record in records:
+            if record["source_text"] != source_text:
+                # a digest collision
+                continue
+            position = positions[
+                (record["translation_engine"], record["translation_engine_version"])
+            ]
+            if best is None or position < best[0]:
+                best = (
+                    position,
+                    _record_to_response(record, with_alignment),
+                    "database",
+                )
+                served_record = record
+
+    if best is not None:
+        position, translation_result, source = best
+        if source == "database":
+            usage.record(served_record["id"])
+            translation_cache.record_miss(keys[position])
+            await _remember_many([(keys[position], translation_result)])
+        else:
+            _record_served(translation_result)
+            if source == "redis":
+                translation_cache.record_miss(keys[position])
+                translation_cache.set(keys[position], translation_result)
+        return translation_result, source
+
+    async def call(engine: BaseTranslationEngine) -> TranslationResponse:
+        with controller.measure(engine.NAME, from_language, to_language):
+            if features.enable_coalescing:
+                return await coalescer.translate(
+                    engine,
+                    source_text=source_text,
+                    from_language=from_language,
+                    to_language=to_language,
+                    with_alignment=with_alignment,
+                )
+            return await engine.translate(
+                source_text=source_text,
+                from_language=from_language,
+                to_language=to_language,
+                with_alignment=with_alignment,
+            )
+
+    # engines which failed as the hedge of the engine before them, so aren't tried again
+    failed_engines = set()
+
+    async def call_failing_once(engine: BaseTranslationEngine) -> TranslationResponse:
+        try:
+            return await call(engine)
+        except BaseMultiTranslateError:
+            failed_engines.add(engine.NAME)
+            raise
+
+    for position, engine in enumerate(engines):
+        if engine.NAME in failed_engines:
+            continue
+        # the next engine in the chain, which a slow call is hedged with
+        hedge = (
+            engines[position + 1]
+            if features.enable_hedging and position + 1 < len(engines)
+            else None
+        )
+        try:
+            if hedge is None:
+                translation_result, hedge_won = await call(engine), False
+            else:
+                translation_result, hedge_won = await hedger.race(
+                    lambda: call(engine),
+                    lambda: call_failing_once(hedge),
+                    delay=controller.health.latency_percentile(
+                        engine.NAME,
+                        from_language,
+                        to_language,
+                        features.hedge_latency_percentile,
+                    ),
+                )
+        except BaseMultiTranslateError as e:
+            _logger.debug("%s", e.detail, exc_info=True)
+            if fallback:
+                # if an engine was specified we switch to fallback if the preferred failed
+                continue
+            raise e
+
+        served_key = keys[position + 1 if hedge_won else position]
+        translation_cache.record_miss(served_key)
+        await _remember_many([(served_key, translation_result)])
+        # save translation_result
+        if features.enable_persistence:
+            writer.submit(
+                translation_row(
+                    translation_result, from_language is not None, compress_min_bytes
+                )
+            )
+        return translation_result, "api"
+
+    raise NoValidEngineConfiguredError(
+        "no configured engine could carry out the request"
+    )
 
-    if from_language is None:
-        # we need this since specifying a from language will influence which engine is used and the output if
-        # sentence is valid in multiple languages
-        additional_conditions.append(translations.c.from_was_specified == False)
-    else:
-        additional_conditions.append(translations.c.from_language == from_language)
+
+async def do_batch_translation(
+    background_tasks: BackgroundTasks,
+    response: Response,
+    source_texts: List[str],
+    to_language: str,
+    from_language: Optional[str] = None,
+    preferred_engine: str = BEST,
+    with_alignment: bool = False,
+    fallback: bool = False,
+) -> List[TranslationResponse]:
+    """
+    Translate many texts for one language pair. Previously stored translations are looked up in a single query and
+    only the misses are sent upstream, in as few requests as the engine allows. Results are in the order of
+    source_texts.
+    """
+    found: Dict[str, TranslationResponse] = {}
+    sources = set()
+    pending = list(dict.fromkeys(source_texts))  # unique, order preserving
 
     excluded_engines = []
     use_engine = preferred_engine
-    translation_result = None
-    while True:
+    while pending:
         engine = controller.get_engine(
             name=use_engine,
             needs_alignment=with_alignment,
@@ -93,67 +462,133 @@ async def do_translation(
             from_language=from_language,
             to_language=to_language,
             exclude_engines=excluded_engines,
+            fallback=fallback,
         )
-        additional_conditions.append(translations.c.translation_engine == engine.NAME)
-        additional_conditions.append(
-            translations.c.translation_engine_version == engine.VERSION
-        )
+        keys = {
+            source_text: cache_key(
+                source_text,
+                to_language=to_language,
+                from_language=from_language,
+                with_alignment=with_alignment,
+                engine_name=engine.NAME,
+                engine_version=engine.VERSION,
+            )
+            for source_text in pending
+        }
+
+        if translation_cache.enabled:
+            for source_text in pending:
+                cached_result = translation_cache.get(keys[source_text])
+                if cached_result is not None:
+                    found[source_text] = cached_result
+                    _record_served(cached_result)
+                    sources.add("cache")
+            pending = [text for text in pending if text not in found]
+            if not pending:
+                break
+
+        if redis_cache.enabled:
+            cached_results = await redis_cache.get_many(
+                [keys[source_text] for source_text in pending]
+            )
+            for source_text, cached_result in zip(pending, cached_results):
+                if cached_result is not None:
+                    found[source_text] = cached_result
+                    translation_cache.set(keys[source_text], cached_result)
+                    _record_served(cached_result)
+                    sources.add("redis")
+            pending = [text for text in pending if text not in found]
+            if not pending:
+                break
 
         if features.enable_persistence:
             query = translations.select().where(
                 and_(
-                    translations.c.to_language == to_language,
-                    translations.c.source_text == source_text,
-                    *additional_conditions,
+                    translations.c.source_text_hash.in_(
+                        [source_text_hash(source_text) for source_text in pending]
+                    ),
+                    *_lookup_conditions(
+                        [engine],
+                        to_language=to_language,
+                        from_language=from_language,
+                        with_alignment=with_alignment,
+                    ),
                 )
             )
             _logger.debug(
-                "querying database for previous translation result with %s", query
+                "querying database for previous translation results with %s", query
             )
-            result: Optional[Record] = await database.fetch_one(query)
-            _logger.debug("Got result from database: %s", result)
-        else:
-            result = None
 
-        if result is None:
-            try:
-                translation_result = await engine.translate(
-                    source_text=source_text,
+            def missing_any(records: List[Mapping[str, Any]]) -> bool:
+                return len({record["source_text_hash"] for record in records}) < len(
+                    pending
+                )
+
+            records = [
+                record
+                for record in map(
+                    decode_translation, await store.fetch_all(query, missing_any),
+                )
+                # in case of a digest collision
+                if record["source_text"] in keys
+            ]
+            for record in records:
+                found[record["source_text"]] = _record_to_response(
+                    record, with_alignment
+                )
+                usage.record(record["id"])
+            await _remember_many(
+                [
+                    (keys[source_text], found[source_text])
+                    for source_text in {record["source_text"] for record in records}
+                ]
+            )
+            if records:
+                sources.add("database")
+            pending = [text for text in pending if text not in found]
+            if not pending:
+                break
+
+        try:
+            # a whole batch takes longer than a single text, so only counts towards the engine's error rate
+            with controller.measure(
+                engine.NAME, from_language, to_language, timed=False
+            ):
+                translation_results = await engine.translate_batch(
+                    source_texts=pending,
                     from_language=from_language,
                     to_language=to_language,
                     with_alignment=with_alignment,
                 )
-            except BaseMultiTranslateError as e:
-                _logger.debug("%s", e.detail, exc_info=True)
-                if fallback:
-                    # if an engine was specified we switch to fallback if the preferred failed
-                    use_engine = BEST
-                    excluded_engines.append(engine.NAME)
-                    continue
-                raise e
-            break
-        else:
-            response.headers["X-Translation-Source"] = "database"
-            return TranslationResponse(
-                engine=result["translation_engine"],
-                engine_version=result["translation_engine_version"],
-                detection_confidence=result["detection_confidence"],
-                from_language=result["from_language"],
-                to_language=result["to_language"],
-                source_text=result["source_text"],
-                translated_text=result["translated_text"],
-                alignment=result["alignment"] if with_alignment else None,
-            )
+        except BaseMultiTranslateError as e:
+            _logger.debug("%s", e.detail, exc_info=True)
+            if fallback:
+                # if an engine was specified we switch to fallback if the preferred failed
+                use_engine = BEST
+                excluded_engines.append(engine.NAME)
+                continue
+            raise e
 
-    if translation_result:
-        # save translation_result
-        if features.enable_persistence:
-            background_tasks.add_task(
-                save_translation, translation_result, from_language is not None
-            )
-        response.headers["X-Translation-Source"] = "api"
-        return translation_result
+        sources.add("api")
+        await _remember_many(
+            [
+                (keys[source_text], translation_result)
+                for source_text, translation_result in zip(pending, translation_results)
+            ]
+        )
+        for source_text, translation_result in zip(pending, translation_results):
+            found[source_text] = translation_result
+            if features.enable_persistence:
+                writer.submit(
+                    translation_row(
+                        translation_result,
+                        from_language is not None,
+                        compress_min_bytes,
+                    )
+                )
+        pending = []
 
-    raise Exception(
-        "no translation result or exception raised - this should never happen"
+    response.headers["X-Translation-Source"] = (
+        sources.pop() if len(sources) == 1 else "mixed"
     )
+    return [found[source_text] for source_text in source_texts]
@@ -0,0 +1,389 @@
+"""
+Export and import of the stored translations as a translation memory, either as JSON lines or TMX 1.4.
+
+Exports stream the table through a server side cursor and imports are loaded a batch at a time with COPY, so neither
+holds more than a batch in memory however many translations there are. Imported translations which are already stored
+are skipped. Characters XML doesn't allow (most control characters) are left out of TMX exports, JSON lines
+keeps texts exactly as they are stored.
+
+    python translation_memory.py export translations.jsonl [--to-language ko]
+    python translation_memory.py import translations.tmx
+
+The same is available over http at /admin/translation-memory.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+from enum import Enum
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from databases import Database
+
+from db import require_postgres, translations
+from errors import TranslationMemoryError
+from models.response import TranslationResponse
+from settings import FeaturesSettings
+from storage import decode_translation, translation_row
+
+
+_logger = logging.getLogger(__name__)
+
+features = FeaturesSettings()
+
+# a translation and whether its from language was specified when it was requested
+Entry = Tuple[TranslationResponse, bool]
+
+
+class TranslationMemoryFormat(str, Enum):
+    jsonl = "jsonl"
+    tmx = "tmx"
+
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+IMPORT_BATCH_SIZE = 10000
+# the columns loaded on import, the rest take their defaults
+IMPORTED_COLUMNS = [
+    column.name
+    for column in translations.columns
+    if column.name not in ("id", "created_at", "last_used_at", "hit_count")
+]
+CREATE_IMPORT_TABLE = """
+CREATE TEMPORARY TABLE translation_import ON COMMIT DROP AS
+SELECT {columns} FROM translation WITH NO DATA
+""".format(
+    columns=", ".join(IMPORTED_COLUMNS)
+)
+# returns the number of translations inserted
+INSERT_IMPORTED = """
+WITH imported AS (
+    INSERT INTO translation ({columns}) SELECT {columns} FROM translation_import
+    ON CONFLICT ON CONSTRAINT unique_translation_constraint DO NOTHING
+    RETURNING 1
+)
+SELECT count(*) FROM imported
+""".format(
+    columns=", ".join(IMPORTED_COLUMNS)
+)
+
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+TMX_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<tmx version="1.4">
+<header creationtool="multi-translate" creationtoolversion={version} datatype="plaintext" segtype="block" \
+adminlang="en" srclang="*all*" o-tmf="multi-translate"/>
+<body>
+""".format(
+    version=quoteattr((Path(__file__).parent / "VERSION").read_text().strip())
+)
+TMX_FOOTER = "</body>\n</tmx>\n"
+# anything outside the characters XML 1.0 allows in a document
+NOT_XML_CHARACTERS = re.compile(
+    "[^\u0009\u000a\u000d\u0020-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]"
+)
+
+
+def _xml_text(text: str) -> str:
+    return escape(NOT_XML_CHARACTERS.sub("", text))
+
+
+def _entry(record: Dict[str, Any]) -> Entry:
+    return (
+        TranslationResponse(
+            engine=record["translation_engine"],
+            engine_version=record["translation_engine_version"],
+            detected_language_confidence=record["detection_confidence"],
+            from_language=record["from_language"],
+            to_language=record["to_language"],
+            source_text=record["source_text"],
+            translated_text=record["translated_text"],
+            alignment=record["alignment"] if record["has_alignment_info"] else None,
+        ),
+        record["from_was_specified"],
+    )
+
+
+def _jsonl_line(entry: Entry) -> str:
+    translation, from_was_specified = entry
+    return (
+        json.dumps(
+            {**translation.dict(), "from_was_specified": from_was_specified},
+            ensure_ascii=False,
+        )
+        + "\n"
+    )
+
+
+def _tmx_unit(entry: Entry) -> str:
+    translation, from_was_specified = entry
+    props = {
+        "x-engine": translation.engine,
+        "x-engine-version": translation.engine_version,
+        "x-from-was-specified": "true" if from_was_specified else "false",
+    }
+    if translation.detected_language_confidence is not None:
+        props["x-detection-confidence"] = repr(translation.detected_language_confidence)
+    if translation.alignment is not None:
+        props["x-alignment"] = json.dumps(translation.alignment, ensure_ascii=False)
+    lines = [f"<tu srclang={quoteattr(translation.from_language)}>"]
+    lines.extend(
+        f"  <prop type={quoteattr(name)}>{_xml_text(value)}</prop>"
+        for name, value in props.items()
+    )
+    lines.extend(
+        f"  <tuv xml:lang={quoteattr(language)}><seg>{_xml_text(text)}</seg></tuv>"
+        for language, text in (
+            (translation.from_language, translation.source_text),
+            (translation.to_language, translation.translated_text),
+        )
+    )
+    lines.append("</tu>\n")
+    return "\n".join(lines)
+
+
+async def export_translation_memory(
+    database: Database,
+    format: TranslationMemoryFormat,
+    to_language: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """The stored translations (optionally only those into to_language) in the format, in chunks"""
+    query = translations.select()
+    if to_language is not None:
+        query = query.where(translations.c.to_language == to_language)
+    to_text = _tmx_unit if format == TranslationMemoryFormat.tmx else _jsonl_line
+
+    chunk: List[str] = [TMX_HEADER] if format == TranslationMemoryFormat.tmx else []
+    chunk_size = 0
+    async for record in database.iterate(query):
+        text = to_text(_entry(decode_translation(record)))
+        chunk.append(text)
+        chunk_size += len(text)
+        if chunk_size >= EXPORT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk, chunk_size = [], 0
+    if format == TranslationMemoryFormat.tmx:
+        chunk.append(TMX_FOOTER)
+    if chunk:
+        yield "".join(chunk)
+
+
+def _parse_json_line(line: bytes) -> Entry:
+    try:
+        fields = json.loads(line)
+        from_was_specified = bool(fields.pop("from_was_specified"))
+        return TranslationResponse(**fields), from_was_specified
+    except (ValueError, KeyError, TypeError) as e:
+        raise TranslationMemoryError(f"invalid translation {line[:100]!r}") from e
+
+
+async def _read_jsonl(chunks: AsyncIterator[bytes]) -> AsyncIterator[Entry]:
+    remainder = b""
+    async for chunk in chunks:
+        *lines, remainder = (remainder + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_json_line(line)
+    if remainder.strip():
+        yield _parse_json_line(remainder)
+
+
+def _parse_tmx_unit(unit: ElementTree.Element) -> Entry:
+    props = {prop.get("type"): prop.text or "" for prop in unit.findall("prop")}
+    # a list rather than keyed by language, as a translation into the language it is from has two variants in it
+    segments = [
+        (variant.get(XML_LANG), "".join(variant.find("seg").itertext()))
+        for variant in unit.findall("tuv")
+        if variant.find("seg") is not None
+    ]
+    from_language = unit.get("srclang")
+    if (
+        "x-engine" not in props
+        or len(segments) != 2
+        or from_language not in (language for language, _ in segments)
+    ):
+        raise TranslationMemoryError(
+            "each translation unit needs an x-engine prop, a srclang and two segments, one of them in the srclang"
+        )
+    # the source is the first variant in the srclang, the translation the other one
+    source = next(segment for segment in segments if segment[0] == from_language)
+    to_language, translated_text = next(
+        segment for segment in segments if segment is not source
+    )
+    confidence = props.get("x-detection-confidence")
+    alignment = props.get("x-alignment")
+    return (
+        TranslationResponse(
+            engine=props["x-engine"],
+            engine_version=props.get("x-engine-version", ""),
+            detected_language_confidence=None
+            if confidence is None
+            else float(confidence),
+            from_language=from_language,
+            to_language=to_language,
+            source_text=source[1],
+            translated_text=translated_text,
+            alignment=None if alignment is None else json.loads(alignment),
+        ),
+        props.get("x-from-was-specified", "true") == "true",
+    )
+
+
+class _TmxReader:
+    """Parses TMX fed to it a chunk at a time, dropping each translation unit once read so memory stays bounded"""
+
+    def __init__(self):
+        self._parser = ElementTree.XMLPullParser(events=("start", "end"))
+        self._body: Optional[ElementTree.Element] = None
+
+    def feed(self, chunk: bytes) -> List[Entry]:
+        self._parser.feed(chunk)
+        return self._read_units()
+
+    def close(self) -> List[Entry]:
+        self._parser.close()
+        return self._read_units()
+
+    def _read_units(self) -> List[Entry]:
+        entries = []
+        for event, element in self._parser.read_events():
+            if event == "start" and element.tag == "body":
+                self._body = element
+            elif event == "end" and element.tag == "tu":
+                entries.append(_parse_tmx_unit(element))
+                self._body.remove(element)
+        return entries
+
+
+async def _read_tmx(chunks: AsyncIterator[bytes]) -> AsyncIterator[Entry]:
+    reader = _TmxReader()
+    try:
+        async for chunk in chunks:
+            for entry in reader.feed(chunk):
+                yield entry
+        for entry in reader.close():
+            yield entry
+    except (ElementTree.ParseError, ValueError) as e:
+        raise TranslationMemoryError(f"invalid tmx: {e}") from e
+
+
+def _copy_value(name: str, value: Any) -> Any:
+    # COPY takes json as text
+    if name == "alignment" and value is not None:
+        return json.dumps(value)
+    return value
+
+
+async def _load(database: Database, rows: List[Dict[str, Any]]) -> int:
+    """Returns the number of translations inserted"""
+    records = [
+        tuple(_copy_value(name, row.get(name)) for name in IMPORTED_COLUMNS)
+        for row in rows
+    ]
+    async with database.connection() as connection:
+        raw_connection = connection.raw_connection
+        async with raw_connection.transaction():
+            await raw_connection.execute(CREATE_IMPORT_TABLE)
+            await raw_connection.copy_records_to_table(
+                "translation_import", records=records, columns=IMPORTED_COLUMNS
+            )
+            return await raw_connection.fetchval(INSERT_IMPORTED)
+
+
+async def import_translation_memory(
+    database: Database,
+    format: TranslationMemoryFormat,
+    chunks: AsyncIterator[bytes],
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> Dict[str, int]:
+    """Load the translations in the format read from chunks, returning how many were read and imported"""
+    read = _read_tmx if format == TranslationMemoryFormat.tmx else _read_jsonl
+    stats = {"read": 0, "imported": 0, "duplicates": 0}
+    rows: List[Dict[str, Any]] = []
+
+    async def load_rows() -> None:
+        imported = await _load(database, rows)
+        stats["imported"] += imported
+        stats["duplicates"] += len(rows) - imported
+        rows.clear()
+        _logger.info("imported %s of %s translations", stats["imported"], stats["read"])
+
+    async for translation, from_was_specified in read(chunks):
+        stats["read"] += 1
+        rows.append(
+            translation_row(
+                translation,
+                from_was_specified,
+                features.compact_storage_min_text_bytes
+                if features.compact_storage
+                else None,
+            )
+        )
+        if len(rows) >= batch_size:
+            await load_rows()
+    if rows:
+        await load_rows()
+    return stats
+
+
+async def _file_chunks(
+    path: Path, chunk_size: int = 1024 * 1024
+) -> AsyncIterator[bytes]:
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _format(path: Path, format: Optional[str]) -> TranslationMemoryFormat:
+    try:
+        return TranslationMemoryFormat(format or path.suffix.lstrip("."))
+    except ValueError:
+        raise TranslationMemoryError(
+            f"can't tell the format of {path}, pass --format jsonl or --format tmx"
+        )
+
+
+async def main(args: argparse.Namespace):
+    format = _format(args.path, args.format)
+    database = require_postgres()
+    await database.connect()
+    try:
+        if args.command == "export":
+            with args.path.open("w", encoding="utf-8") as f:
+                async for chunk in export_translation_memory(
+                    database, format, to_language=args.to_language
+                ):
+                    f.write(chunk)
+        else:
+            stats = await import_translation_memory(
+                database, format, _file_chunks(args.path)
+            )
+            _logger.info(
+                "read %s translations, imported %s, %s were already stored",
+                stats["read"],
+                stats["imported"],
+                stats["duplicates"],
+            )
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", type=Path)
+    parser.add_argument(
+        "--format",
+        choices=[format.value for format in TranslationMemoryFormat],
+        help="defaults to the file's extension",
+    )
+    parser.add_argument(
+        "--to-language", help="only export translations into this language"
+    )
+    asyncio.run(main(parser.parse_args()))
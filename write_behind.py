@@ -0,0 +1,254 @@
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, tuple_
+from sqlalchemy.sql import ClauseElement
+
+from db import source_text_hash, translations
+from persistence import ROW_ERRORS, Row, TranslationStore
+
+
+_logger = logging.getLogger(__name__)
+
+# a translation served from one of the cache tiers, which don't know its id - the source text, the language translated
+# to and the engine and its version
+ServedKey = Tuple[str, str, str, str]
+# queued by TranslationWriter.stop, behind everything still to be written
+_STOP = object()
+
+
+class TranslationWriter:
+    """
+    Persists new translations behind the response - rows are queued in memory and written in multi-row inserts once
+    batch_size rows are waiting or flush_interval_seconds has passed. The queue is bounded, rows arriving while it is
+    full are dropped (and counted) since the translation has already been returned and can be fetched again. A batch
+    failing because of a bad row is split in half and each half written again, so only the bad rows are lost
+    """
+
+    def __init__(
+        self,
+        store: TranslationStore,
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval_seconds: float,
+    ):
+        self.store = store
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Future] = None
+        self._stats = {
+            "written": 0,
+            "duplicates": 0,
+            "dropped": 0,
+            "batches": 0,
+            "failed": 0,
+        }
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Write everything still queued then stop, without waiting for the flush interval"""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def submit(self, row: Row) -> None:
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            _logger.warning(
+                "persistence queue is full, dropping translation for %s",
+                row["translation_engine"],
+            )
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            batch = [row]
+            flush_at = loop.time() + self.flush_interval_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    row = await asyncio.wait_for(
+                        self._queue.get(), timeout=flush_at - loop.time()
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Row]) -> None:
+        await self._insert(batch)
+        self._stats["batches"] += 1
+
+    async def _insert(self, rows: List[Row]) -> None:
+        try:
+            inserted = await self.store.insert_translations(rows)
+        except ROW_ERRORS:
+            if len(rows) == 1:
+                self._stats["failed"] += 1
+                _logger.warning(
+                    "could not write a translation from %s",
+                    rows[0]["translation_engine"],
+                    exc_info=True,
+                )
+                return
+            middle = len(rows) // 2
+            await self._insert(rows[:middle])
+            await self._insert(rows[middle:])
+        except Exception:
+            # the store rather than a row, which retrying row by row would only make slower to give up on
+            self._stats["failed"] += len(rows)
+            _logger.warning("could not write %s translations", len(rows), exc_info=True)
+        else:
+            self._stats["written"] += inserted
+            self._stats["duplicates"] += len(rows) - inserted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "queued": 0 if self._queue is None else self._queue.qsize(),
+        }
+
+
+class UsageTracker:
+    """
+    Records when stored translations are served, for the retention job and to find the hottest translations - hits
+    are counted in memory and last_used_at and hit_count updated for all of them once every flush_interval_seconds
+    rather than on every lookup. Translations served from the database are counted by id, those served from a cache
+    tier by what they are a translation of, which counts the hit for each stored translation of the text by the
+    engine into the language (there is usually one)
+    """
+
+    # each id is 3 query parameters and each key 4, well within the limits of asyncpg (32767) and sqlite (32766)
+    FLUSH_CHUNK_SIZE = 5000
+
+    def __init__(
+        self, store: TranslationStore, flush_interval_seconds: float, max_pending: int
+    ):
+        self.store = store
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+        self._pending: Counter = Counter()
+        self._pending_keys: Counter = Counter()
+        self._task: Optional[asyncio.Future] = None
+        self._stats = {"touched": 0, "dropped": 0, "failed": 0}
+
+    async def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._flush()
+
+    def _full(self) -> bool:
+        return len(self._pending) + len(self._pending_keys) >= self.max_pending
+
+    def record(self, translation_id: int) -> None:
+        if self._full() and translation_id not in self._pending:
+            self._stats["dropped"] += 1
+            return
+        self._pending[translation_id] += 1
+
+    def record_key(self, key: ServedKey) -> None:
+        if self._full() and key not in self._pending_keys:
+            self._stats["dropped"] += 1
+            return
+        self._pending_keys[key] += 1
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            await self._flush()
+
+    async def _flush(self) -> None:
+        await self._flush_ids()
+        await self._flush_keys()
+
+    async def _execute(self, statement: ClauseElement, translations_count: int) -> None:
+        try:
+            await self.store.execute(statement)
+        except Exception:
+            self._stats["failed"] += translations_count
+            _logger.warning("could not record translation usage", exc_info=True)
+        else:
+            self._stats["touched"] += translations_count
+
+    async def _flush_ids(self) -> None:
+        hits, self._pending = self._pending, Counter()
+        # sorted so concurrent updates from other replicas lock rows in the same order
+        translation_ids = sorted(hits)
+        for start in range(0, len(translation_ids), self.FLUSH_CHUNK_SIZE):
+            chunk = translation_ids[start : start + self.FLUSH_CHUNK_SIZE]
+            statement = (
+                translations.update()
+                .where(translations.c.id.in_(chunk))
+                .values(
+                    last_used_at=func.now(),
+                    hit_count=translations.c.hit_count
+                    + case(
+                        {
+                            translation_id: hits[translation_id]
+                            for translation_id in chunk
+                        },
+                        value=translations.c.id,
+                        else_=0,
+                    ),
+                )
+            )
+            await self._execute(statement, len(chunk))
+
+    async def _flush_keys(self) -> None:
+        hits, self._pending_keys = self._pending_keys, Counter()
+        # without ids to key a case on, one update for each distinct number of hits - few, as most are 1
+        by_hits: Dict[int, List[Tuple[bytes, str, str, str]]] = defaultdict(list)
+        for (source_text, *rest), count in hits.items():
+            by_hits[count].append((source_text_hash(source_text), *rest))
+        for count, keys in by_hits.items():
+            keys.sort()
+            for start in range(0, len(keys), self.FLUSH_CHUNK_SIZE):
+                chunk = keys[start : start + self.FLUSH_CHUNK_SIZE]
+                statement = (
+                    translations.update()
+                    .where(
+                        tuple_(
+                            translations.c.source_text_hash,
+                            translations.c.to_language,
+                            translations.c.translation_engine,
+                            translations.c.translation_engine_version,
+                        ).in_(chunk)
+                    )
+                    .values(
+                        last_used_at=func.now(),
+                        hit_count=translations.c.hit_count + count,
+                    )
+                )
+                await self._execute(statement, len(chunk))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "pending": len(self._pending) + len(self._pending_keys),
+        }